@@ -1,15 +1,19 @@
 # -*- coding: utf-8 -*-
+import multiprocessing
 import sys
 
-from .logger import log, exception_hook, log_file_location
-from .mod import bw2data
-from .application import application
-from .signals import signals
-from .settings import ab_settings, project_settings
-from .controllers import *
-from .info import __version__ as version
-from .layouts.main import MainWindow
-from .plugin import Plugin
+# Worker processes (see bwutils.workers) only import the modules they run,
+# they must not start the application.
+if multiprocessing.current_process().name == "MainProcess":
+    from .logger import log, exception_hook, log_file_location
+    from .mod import bw2data
+    from .application import application
+    from .signals import signals
+    from .settings import ab_settings, project_settings
+    from .controllers import *
+    from .info import __version__ as version
+    from .layouts.main import MainWindow
+    from .plugin import Plugin
 
 
 def load_settings() -> None:
@@ -21,6 +25,7 @@ def load_settings() -> None:
 
 
 def run_activity_browser(splash=None):
+    multiprocessing.freeze_support()
     log.info(f"Activity Browser version: {version}")
     if log_file_location:
         log.info(f"The log file can be found at {log_file_location}")
@@ -3,16 +3,20 @@
 bwutils is a collection of methods that build upon brightway2 and are generic enough to provide here so that we avoid
 re-typing the same code in different parts of the Activity Browser.
 """
-from .commontasks import cleanup_deleted_bw_projects as cleanup
-from .metadata import AB_metadata
-from .montecarlo import MonteCarloLCA
-from .multilca import MLCA, Contributions
-from .pedigree import PedigreeMatrix
-from .sensitivity_analysis import GlobalSensitivityAnalysis
-from .superstructure import SuperstructureContributions, SuperstructureMLCA
-from .uncertainty import (
-    CFUncertaintyInterface,
-    ExchangeUncertaintyInterface,
-    ParameterUncertaintyInterface,
-    get_uncertainty_interface,
-)
+import multiprocessing
+
+# Worker processes only import the workers module, see activity_browser
+if multiprocessing.current_process().name == "MainProcess":
+    from .commontasks import cleanup_deleted_bw_projects as cleanup
+    from .metadata import AB_metadata
+    from .montecarlo import MonteCarloLCA
+    from .multilca import MLCA, Contributions
+    from .pedigree import PedigreeMatrix
+    from .sensitivity_analysis import GlobalSensitivityAnalysis
+    from .superstructure import SuperstructureContributions, SuperstructureMLCA
+    from .uncertainty import (
+        CFUncertaintyInterface,
+        ExchangeUncertaintyInterface,
+        ParameterUncertaintyInterface,
+        get_uncertainty_interface,
+    )
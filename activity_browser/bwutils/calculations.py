@@ -2,7 +2,7 @@
 from bw2calc.errors import BW2CalcError
 from PySide2.QtWidgets import QApplication
 
-from activity_browser import log
+from activity_browser import ab_settings, log
 
 from ..bwutils import (
     MLCA,
@@ -12,6 +12,7 @@ from ..bwutils import (
     SuperstructureMLCA,
 )
 from .errors import CriticalCalculationError, ScenarioExchangeNotFoundError
+from .result_cache import ResultCache
 
 
 def do_LCA_calculations(data: dict):
@@ -21,6 +22,7 @@ def do_LCA_calculations(data: dict):
 
     if calculation_type == "simple":
         try:
+            fingerprint = MLCA.fingerprint(cs_name)
             mlca = MLCA(cs_name)
             contributions = Contributions(mlca)
         except KeyError as e:
@@ -28,7 +30,10 @@ def do_LCA_calculations(data: dict):
     elif calculation_type == "scenario":
         try:
             df = data.get("data")
-            mlca = SuperstructureMLCA(cs_name, df)
+            fingerprint = SuperstructureMLCA.fingerprint(cs_name, df)
+            mlca = SuperstructureMLCA(
+                cs_name, df, workers=ab_settings.scenario_workers
+            )
             contributions = SuperstructureContributions(mlca)
         except AssertionError as e:
             # This occurs if the superstructure itself detects something is wrong.
@@ -57,7 +62,14 @@ def do_LCA_calculations(data: dict):
         log.error("Calculation type must be: simple or scenario. Given:", cs_name)
         raise ValueError
 
-    mlca.calculate()
+    # Reuse the stored results if nothing changed since the last calculation
+    if not ab_settings.cache_results:
+        mlca.calculate()
+    else:
+        cache = ResultCache()
+        if not cache.load(mlca, fingerprint):
+            mlca.calculate()
+            cache.store(mlca, fingerprint)
     mc = MonteCarloLCA(cs_name)
 
     return mlca, contributions, mc
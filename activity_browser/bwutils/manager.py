@@ -283,6 +283,147 @@ class ParameterManager(object):
         return schema
 
 
+class ParameterEvaluator(object):
+    """Evaluates all of the parameters and ParameterizedExchange formulas of
+    a project for many samples at once.
+
+    The project -> database -> activity -> exchange dependencies are
+    resolved once into a single topologically ordered list of formulas,
+    which are parsed once. Every evaluation then runs the parsed formulas
+    on NumPy arrays holding a value per sample, the same way
+    `ParameterSet.evaluate_monte_carlo` does. Formulas that do not work on
+    arrays are evaluated sample by sample.
+    """
+
+    def __init__(self, initial: StaticParameters, parameters: Parameters):
+        self.interpreter = Interpreter()
+        self.keys = {}
+        self.formulas = {}
+        self.references = {}
+
+        self.add_scope(("project",), initial.project())
+        for db in initial.databases:
+            self.add_scope(
+                ("database", db), initial.by_database(db), ("database", db), ("project",)
+            )
+        self.exchanges = []
+        for p in initial.act_by_group_db:
+            scope = (("activity", p.group), ("database", p.database), ("project",))
+            self.add_scope(("activity", p.group), initial.act_by_group(p.group), *scope)
+            for exc, formula in initial.exc_by_group(p.group).items():
+                node = self.add_node(("exchange", p.group, exc))
+                self.add_formula(node, formula, scope)
+                self.exchanges.append(node)
+        self.exchanges = np.array(self.exchanges, dtype=int)
+
+        # The (sampled) input values are given in the order of the Parameters
+        self.inputs = np.array(
+            [
+                self.keys[
+                    ("project",) if p.param_type == "project" else (p.param_type, p.group)
+                ][p.name]
+                for p in parameters
+            ],
+            dtype=int,
+        )
+        self.order = self.get_order()
+
+    def add_node(self, key) -> int:
+        node = len(self.formulas)
+        self.formulas[node] = None
+        self.references[node] = {}
+        return node
+
+    def add_scope(self, scope: tuple, data: dict, *lookup: tuple) -> None:
+        """Add the parameters of a group, resolving their formulas within the
+        given lookup order of scopes.
+        """
+        nodes = self.keys.setdefault(scope, {})
+        for name in data:
+            nodes[name] = self.add_node(scope + (name,))
+        for name, values in data.items():
+            if values.get("formula"):
+                self.add_formula(nodes[name], values["formula"], lookup or (scope,))
+
+    def add_formula(self, node: int, formula: str, lookup: tuple) -> None:
+        """Parse the formula and link the names in it to the nodes they refer to."""
+        for name in get_new_symbols([formula]):
+            target = next(
+                (
+                    self.keys[scope][name]
+                    for scope in lookup
+                    if name in self.keys.get(scope, {})
+                ),
+                None,
+            )
+            if target is None:
+                raise MissingName(
+                    "The following variables aren't defined:\n{}".format(name)
+                )
+            self.references[node][name] = target
+        self.formulas[node] = (formula, self.interpreter.parse(formula))
+
+    def get_order(self) -> list:
+        """Return the nodes with a formula in an order that allows evaluating
+        them one after the other.
+        """
+        order, done, visiting = [], set(), set()
+        for start in self.formulas:
+            stack = [(start, iter(self.references[start].values()))]
+            while stack:
+                node, children = stack[-1]
+                if node in done:
+                    stack.pop()
+                    continue
+                visiting.add(node)
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    visiting.discard(node)
+                    done.add(node)
+                    if self.formulas[node] is not None:
+                        order.append(node)
+                elif child in visiting:
+                    raise ValueError("Circular reference in parameter formulas.")
+                elif child not in done:
+                    stack.append((child, iter(self.references[child].values())))
+        return order
+
+    def evaluate(self, samples: np.ndarray) -> np.ndarray:
+        """Evaluate the exchange amounts for the given parameter values.
+
+        `samples` holds a column of values per sample, with a row for every
+        parameter in the order of the `Parameters`. Returns an array with
+        a row for every exchange in the order of the `Indices`.
+        """
+        samples = np.asarray(samples, dtype=np.float64).reshape(len(self.inputs), -1)
+        size = samples.shape[1]
+        values = np.zeros((len(self.formulas), size))
+        values[self.inputs] = samples
+        for node in self.order:
+            names = {name: values[ref] for name, ref in self.references[node].items()}
+            values[node] = self.run(node, names, size)
+        return values[self.exchanges]
+
+    def run(self, node: int, names: dict, size: int) -> np.ndarray:
+        """Run a parsed formula on arrays, or sample by sample if that fails."""
+        formula, parsed = self.formulas[node]
+        self.interpreter.symtable.update(names)
+        self.interpreter.error = []
+        try:
+            result = self.interpreter.run(parsed, expr=formula)
+            if not self.interpreter.error and result is not None:
+                return np.broadcast_to(np.asarray(result, dtype=np.float64), (size,))
+        except Exception:
+            pass
+
+        result = np.zeros(size)
+        for i in range(size):
+            self.interpreter.symtable.update({k: v[i] for k, v in names.items()})
+            result[i] = self.interpreter(formula)
+        return result
+
+
 class MonteCarloParameterManager(ParameterManager, Iterator):
     """Use to sample the uncertainty of parameter values, mostly for use in
     Monte Carlo calculations.
@@ -309,6 +450,11 @@ class MonteCarloParameterManager(ParameterManager, Iterator):
             *[getattr(p, "data", {}) for p in parameters]
         )
         self.mc_generator = MCRandomNumberGenerator(self.uncertainties, seed=seed)
+        self.evaluator = ParameterEvaluator(self.initial, self.parameters)
+
+    def reset_generator(self, seed: Optional[int] = None) -> None:
+        """Restart sampling of the parameter uncertainty with the given seed."""
+        self.mc_generator = MCRandomNumberGenerator(self.uncertainties, seed=seed)
 
     def __iter__(self):
         return self
@@ -323,40 +469,60 @@ class MonteCarloParameterManager(ParameterManager, Iterator):
         # Construct indices, prepare sized array and sample parameter
         # uncertainty distributions `interations` times.
         all_data = np.empty((iterations, len(self.indices)), dtype=Indices.array_dtype)
-        random_bounded_values = self.mc_generator.generate(iterations)
-
-        # Now, repeatedly replace parameter amounts with sampled data and
-        # recalculate. Every processed row is added to the sized array.
+        _, data = self.next_chunk(iterations)
         for i in range(iterations):
-            values = random_bounded_values.take(i, axis=1)
-            self.parameters.update(values)
-            data = self.calculate()
-            all_data[i] = self.indices.mock_params(data)
-
+            all_data[i] = self.indices.mock_params(data[:, i])
         return all_data
 
+    def next_chunk(self, iterations: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Sample the parameter uncertainty `iterations` times at once and
+        recalculate all of the iterations in a single evaluation.
+
+        Returns the parameter amounts (a row per parameter) and the exchange
+        amounts in the order of `indices` (a row per exchange), both with a
+        column per iteration. The parameters are left at the amounts of the
+        last iteration.
+        """
+        samples = self.mc_generator.generate(iterations)
+        # Parameters without a sampled value keep their current amount
+        current = np.array([p.amount for p in self.parameters], dtype=np.float64)
+        amounts = np.where(np.isnan(samples), current[:, None], samples)
+        values = self.evaluator.evaluate(amounts)
+        self.parameters.update(samples.take(iterations - 1, axis=1))
+        return amounts, values
+
     def next(self) -> np.ndarray:
         """Similar to `recalculate` but only performs a single sampling and
         recalculation.
         """
+        return self.indices.mock_params(self.next_values())
+
+    def next_values(self) -> np.ndarray:
+        """Sample and recalculate once, returning only the exchange amounts
+        in the order of `indices`.
+        """
         values = self.mc_generator.next()
         self.parameters.update(values)
-        data = self.calculate()
-        return self.indices.mock_params(data)
+        amounts = np.array([p.amount for p in self.parameters], dtype=np.float64)
+        return self.evaluator.evaluate(amounts)[:, 0]
 
-    def retrieve_sampled_values(self, data: dict):
+    def retrieve_sampled_values(
+        self, data: dict, amounts: Optional[np.ndarray] = None
+    ) -> None:
         """Enters the sampled values into the 'exchanges' list in the 'data'
         dictionary.
+
+        The current parameter amounts are entered, or, if given, every column
+        of the `amounts` returned by `next_chunk`.
         """
+        positions = {}
+        for i, p in enumerate(self.parameters):
+            positions.setdefault((p.name, p.group), i)
         for name, vals in data.items():
-            param = next(
-                (
-                    p
-                    for p in self.parameters
-                    if p.name == vals.get("name") and p.group == vals.get("group")
-                ),
-                None,
-            )
-            if param is None:
+            i = positions.get((vals.get("name"), vals.get("group")))
+            if i is None:
                 continue
-            data[name]["values"].append(param.amount)
+            if amounts is None:
+                data[name]["values"].append(self.parameters[i].amount)
+            else:
+                data[name]["values"].extend(amounts[i])
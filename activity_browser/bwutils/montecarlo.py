@@ -1,20 +1,51 @@
+import os
+import shutil
+import tempfile
+import weakref
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import islice
 from time import time
-from typing import Optional, Union
+from typing import Optional
 
 import bw2calc as bc
 import numpy as np
 import pandas as pd
-from stats_arrays import MCRandomNumberGenerator
+from scipy import sparse
 
 from activity_browser import log
 from activity_browser.mod import bw2data as bd
 
 from .manager import MonteCarloParameterManager
+from .workers import (
+    MonteCarloSampler,
+    calculate_monte_carlo_chunk,
+    init_monte_carlo_worker,
+    process_pool,
+)
 
 
-class MonteCarloLCA(object):
-    """A Monte Carlo LCA for multiple reference flows and methods loaded from a calculation setup."""
+class MonteCarloLCA(MonteCarloSampler):
+    """A Monte Carlo LCA for multiple reference flows and methods loaded from a calculation setup.
+
+    Iterations are calculated in chunks of `CHUNK_SIZE`, each of which samples
+    from its own random number generators. The seed of every chunk is derived
+    from the user seed, so a run gives the same results for a given seed
+    regardless of how many worker processes calculate the chunks.
+
+    With the 'iterative' solver the sampled technosphere matrices are solved
+    with BiCGSTAB, preconditioned by the factorization of the static
+    technosphere matrix and warm started from the supply of the previous
+    iteration. Solves that do not reach the `tolerance` fall back to a direct
+    solve. The convergence of every solve is kept in `solver_stats`.
+
+    The sampling and solving itself is done by the `MonteCarloSampler`, which
+    does not depend on the Activity Browser so it can run in worker processes.
+    The parameters are sampled and recalculated here.
+    """
+
+    CHUNK_SIZE = 50
+    SOLVERS = ("direct", "iterative")
 
     def __init__(self, cs_name):
         if cs_name not in bd.calculation_setups:
@@ -23,22 +54,14 @@ class MonteCarloLCA(object):
         self.cs_name = cs_name
         self.cs = bd.calculation_setups[cs_name]
         self.seed = None
-        self.cf_rngs = {}
         self.CF_rng_vectors = {}
-        self.include_technosphere = True
-        self.include_biosphere = True
-        self.include_cfs = True
         self.include_parameters = True
         self.param_rng = None
         self.param_cols = ["row", "col", "type"]
+        self.solver_stats = list()
 
-        self.tech_rng: Optional[Union[MCRandomNumberGenerator, np.ndarray]] = None
-        self.bio_rng: Optional[Union[MCRandomNumberGenerator, np.ndarray]] = None
-        self.cf_rng: Optional[Union[MCRandomNumberGenerator, np.ndarray]] = None
-
-        # reference flows
-        self.func_units = self.cs["inv"]
-        self.rev_fu_index = {i: fu for i, fu in enumerate(self.func_units)}
+        # reference flows and methods
+        super().__init__(self.cs["inv"], self.cs["ia"])
 
         # activities
         self.activity_keys = [list(fu.keys())[0] for fu in self.func_units]
@@ -50,21 +73,30 @@ class MonteCarloLCA(object):
         }
 
         # methods
-        self.methods = self.cs["ia"]
         self.method_index = {m: i for i, m in enumerate(self.methods)}
-        self.rev_method_index = {i: m for i, m in enumerate(self.methods)}
 
         # GSA calculation variables
-        self.A_matrices = list()
-        self.B_matrices = list()
-        self.CF_dict = defaultdict(list)
+        self.samples: Optional[SampleStore] = None
         self.parameter_exchanges = list()
         self.parameters = list()
         self.parameter_data = defaultdict(dict)
 
         self.results = list()
 
-        self.lca = bc.LCA(demand=self.func_units_dict, method=self.methods[0])
+    def param_rowcol(self, x) -> Optional[tuple]:
+        """Convert a parameterized exchange from input/output keys into
+        row/col values, returns None if the exchange is not in the matrices.
+        """
+        if x["type"] in [0, 1]:
+            row = self.lca.activity_dict.get(x["input"], None)
+            col = self.lca.product_dict.get(x["output"], None)
+        else:
+            row = self.lca.biosphere_dict.get(x["input"], None)
+            col = self.lca.activity_dict.get(x["output"], None)
+        # if either the row or the column is None, return None.
+        if row is None or col is None:
+            return None
+        return row, col, x["type"], x["amount"]
 
     def unify_param_exchanges(self, data: np.ndarray) -> np.ndarray:
         """Convert an array of parameterized exchanges from input/output keys
@@ -73,77 +105,111 @@ class MonteCarloLCA(object):
         If any given exchange does not exist in the current LCA matrix,
         it will be dropped from the returned array.
         """
-
-        def key_to_rowcol(x) -> Optional[tuple]:
-            if x["type"] in [0, 1]:
-                row = self.lca.activity_dict.get(x["input"], None)
-                col = self.lca.product_dict.get(x["output"], None)
-            else:
-                row = self.lca.biosphere_dict.get(x["input"], None)
-                col = self.lca.activity_dict.get(x["output"], None)
-            # if either the row or the column is None, return np.NaN.
-            if row is None or col is None:
-                return None
-            return row, col, x["type"], x["amount"]
-
         # Convert the data and store in a new array, dropping Nones.
-        converted = (key_to_rowcol(d) for d in data)
+        converted = (self.param_rowcol(d) for d in data)
         unified = np.array(
             [x for x in converted if x is not None],
             dtype=[("row", "<u4"), ("col", "<u4"), ("type", "u1"), ("amount", "<f4")],
         )
         return unified
 
-    def load_data(self) -> None:
-        """Constructs the random number generators for all of the matrices that
-        can be altered by uncertainty.
+    def build_injection_plan(self) -> None:
+        """Map the parameterized exchanges of the parameter manager once onto
+        their positions in the `tech_params` and `bio_params` arrays.
 
-        If any of these uncertain calculations are not included, the initial
-        amounts of the 'params' matrices are used in place of generating
-        a vector
+        Sampled parameter exchange amounts can then be inserted into the
+        sampled vectors with a single fancy-index assignment.
         """
-        self.lca.load_lci_data()
+        data = self.param_rng.indices.mock_params(
+            np.zeros(len(self.param_rng.indices))
+        )
+        converted = [(i, self.param_rowcol(d)) for i, d in enumerate(data)]
+        converted = [(i, x) for i, x in converted if x is not None]
+        sources = np.array([i for i, _ in converted], dtype=np.int64)
+        exchanges = np.array(
+            [x for _, x in converted],
+            dtype=[("row", "<u4"), ("col", "<u4"), ("type", "u1"), ("amount", "<f4")],
+        )
+
+        def targets(params: np.ndarray, mask: np.ndarray) -> tuple:
+            """Return the positions in params and the matching value sources."""
+            width = max(params["col"].max(initial=0), exchanges["col"].max(initial=0))
+            width = int(width) + 1
+
+            def keys(array: np.ndarray) -> np.ndarray:
+                rowcol = array["row"].astype(np.int64) * width + array["col"]
+                return rowcol * 256 + array["type"]
 
-        self.tech_rng = (
-            MCRandomNumberGenerator(self.lca.tech_params, seed=self.seed)
-            if self.include_technosphere
-            else self.lca.tech_params["amount"].copy()
+            wanted = keys(exchanges[mask])
+            found = keys(params)
+            hits = np.flatnonzero(np.isin(found, wanted))
+            order = np.argsort(wanted, kind="stable")
+            positions = order[np.searchsorted(wanted, found[hits], sorter=order)]
+            return hits, sources[mask][positions]
+
+        tech_targets, tech_sources = targets(
+            self.lca.tech_params, np.isin(exchanges["type"], [0, 1])
         )
-        self.bio_rng = (
-            MCRandomNumberGenerator(self.lca.bio_params, seed=self.seed)
-            if self.include_biosphere
-            else self.lca.bio_params["amount"].copy()
+        bio_targets, bio_sources = targets(
+            self.lca.bio_params, exchanges["type"] == 2
         )
+        self.param_plan = {
+            "exchanges": exchanges,
+            "sources": sources,
+            "tech_targets": tech_targets,
+            "tech_sources": tech_sources,
+            "bio_targets": bio_targets,
+            "bio_sources": bio_sources,
+        }
 
-        if self.lca.lcia:
-            self.cf_rngs = (
-                {}
-            )  # we need as many cf_rng as impact categories, because they are of different size
-            for m in self.methods:
-                self.lca.switch_method(m)
-                self.lca.load_lcia_data()
-                self.cf_rngs[m] = (
-                    MCRandomNumberGenerator(self.lca.cf_params, seed=self.seed)
-                    if self.include_cfs
-                    else self.lca.cf_params["amount"].copy()
-                )
+    def load_data(self) -> None:
+        """Constructs the matrices and parameter arrays for all of the matrices
+        that can be altered by uncertainty, and the parameter manager.
+        """
+        super().load_data()
         # Construct the MC parameter manager
         if self.include_parameters:
             self.param_rng = MonteCarloParameterManager(seed=self.seed)
+            self.build_injection_plan()
+
+    def iteration_chunks(self, iterations: int) -> list:
+        """Split the iterations into chunks of (first iteration, iterations, seed).
 
-        (
-            self.lca.activity_dict_rev,
-            self.lca.product_dict_rev,
-            self.lca.biosphere_dict_rev,
-        ) = self.lca.reverse_dict()
+        The chunk seeds only depend on the user seed and the chunk position.
+        """
+        starts = range(0, iterations, self.CHUNK_SIZE)
+        seeds = np.random.SeedSequence(self.seed).generate_state(len(starts))
+        return [
+            (start, min(self.CHUNK_SIZE, iterations - start), int(seed))
+            for start, seed in zip(starts, seeds)
+        ]
 
-    def calculate(self, iterations=10, seed: int = None, **kwargs):
+    def calculate(
+        self,
+        iterations=10,
+        seed: int = None,
+        workers: int = 1,
+        solver: str = "direct",
+        tolerance: float = 1e-6,
+        **kwargs,
+    ):
         """Main calculate method for the MC LCA class, allows fine-grained control
         over which uncertainties are included when running MC sampling.
+
+        With `workers` > 1 the chunks of iterations are divided over that many
+        worker processes, each of which builds its own LCA. The `solver` is
+        either 'direct' or 'iterative', the latter solves up to the relative
+        residual `tolerance`.
         """
+        if solver not in self.SOLVERS:
+            raise ValueError(
+                "Unknown solver '{}', choose one of {}.".format(solver, self.SOLVERS)
+            )
         start = time()
         self.iterations = iterations
         self.seed = seed or bc.utils.get_seed()
+        self.solver = solver
+        self.tolerance = tolerance
         self.include_technosphere = kwargs.get("technosphere", True)
         self.include_biosphere = kwargs.get("biosphere", True)
         self.include_cfs = kwargs.get("cf", True)
@@ -154,11 +220,21 @@ class MonteCarloLCA(object):
         self.results = np.zeros((iterations, len(self.func_units), len(self.methods)))
 
         # Reset GSA variables to empty.
-        self.A_matrices = list()
-        self.B_matrices = list()
-        self.CF_dict = defaultdict(list)
+        if self.samples is not None:
+            self.samples.close()
+        self.samples = SampleStore(
+            iterations, bd.projects.request_directory("monte_carlo")
+        )
+        if self.include_technosphere:
+            self.samples.create("technosphere", len(self.lca.tech_params))
+        if self.include_biosphere:
+            self.samples.create("biosphere", len(self.lca.bio_params))
+        if self.include_cfs:
+            for m, params in self.cf_params.items():
+                self.samples.create(m, len(params))
         self.parameter_exchanges = list()
         self.parameters = list()
+        self.solver_stats = list()
 
         # Prepare GSA parameter schema:
         if self.include_parameters:
@@ -167,100 +243,157 @@ class MonteCarloLCA(object):
             for k in self.parameter_data:
                 self.parameter_data[k]["values"] = []
 
-        for iteration in range(iterations):
-            tech_vector = (
-                self.tech_rng.next() if self.include_technosphere else self.tech_rng
-            )
-            bio_vector = self.bio_rng.next() if self.include_biosphere else self.bio_rng
-            if self.include_parameters:
-                # Convert the input/output keys into row/col keys, and then match them against
-                # the tech_ and bio_params
-                data = self.param_rng.next()
-                param_exchanges = self.unify_param_exchanges(data)
-
-                # Select technosphere subset from param_exchanges.
-                subset = param_exchanges[np.isin(param_exchanges["type"], [0, 1])]
-                # Create index of where to insert new values from tech_params array.
-                idx = np.argwhere(
-                    np.isin(
-                        self.lca.tech_params[self.param_cols], subset[self.param_cols]
-                    )
-                ).flatten()
-                # Construct unique array of row+col+type combinations
-                uniq = np.unique(self.lca.tech_params[idx][self.param_cols])
-                # Use the unique array to sort the subset (ensures values
-                # are inserted at the correct index)
-                sort_idx = np.searchsorted(uniq, subset[self.param_cols])
-                # Finally, insert the sorted subset amounts into the tech_vector
-                # at the correct indexes.
-                tech_vector[idx] = subset[sort_idx]["amount"]
-                # Repeat the above, but for the biosphere array.
-                subset = param_exchanges[param_exchanges["type"] == 2]
-                idx = np.argwhere(
-                    np.isin(
-                        self.lca.bio_params[self.param_cols], subset[self.param_cols]
-                    )
-                ).flatten()
-                uniq = np.unique(self.lca.bio_params[idx][self.param_cols])
-                sort_idx = np.searchsorted(uniq, subset[self.param_cols])
-                bio_vector[idx] = subset[sort_idx]["amount"]
-
-                # Store parameter data for GSA
-                self.parameter_exchanges.append(param_exchanges)
-                self.parameters.append(self.param_rng.parameters.to_gsa())
-                # Extract sampled values for parameters, store.
-                self.param_rng.retrieve_sampled_values(self.parameter_data)
-
-            self.lca.rebuild_technosphere_matrix(tech_vector)
-            self.lca.rebuild_biosphere_matrix(bio_vector)
-
-            # store matrices for GSA
-            self.A_matrices.append(self.lca.technosphere_matrix)
-            self.B_matrices.append(self.lca.biosphere_matrix)
-
-            if not hasattr(self.lca, "demand_array"):
-                self.lca.build_demand_array()
-            self.lca.lci_calculation()
-
-            # pre-calculating CF vectors enables the use of the SAME CF vector for each FU in a given run
-            cf_vectors = {}
-            for m in self.methods:
-                cf_vectors[m] = (
-                    self.cf_rngs[m].next() if self.include_cfs else self.cf_rngs[m]
-                )
-                # store CFs for GSA (in a list defaultdict)
-                self.CF_dict[m].append(cf_vectors[m])
-
-            # iterate over FUs
-            for row, func_unit in self.rev_fu_index.items():
-                self.lca.redo_lci(func_unit)  # lca calculation
-
-                # iterate over methods
-                for col, m in self.rev_method_index.items():
-                    self.lca.switch_method(m)
-                    self.lca.rebuild_characterization_matrix(cf_vectors[m])
-                    self.lca.lcia_calculation()
-                    self.results[iteration, row, col] = self.lca.score
+        chunks = self.iteration_chunks(iterations)
+        if workers > 1 and len(chunks) > 1:
+            self._calculate_parallel(chunks, workers)
+        else:
+            for first, size, chunk_seed in chunks:
+                values = self.sample_parameters(size, chunk_seed)
+                self.merge_chunk(first, self.calculate_chunk(size, chunk_seed, values))
 
         log.info(
-            "Monte Carlo LCA: finished {} iterations for {} reference flows and {} methods in {} seconds.".format(
+            "Monte Carlo LCA: finished {} iterations for {} reference flows and "
+            "{} methods in {} seconds.".format(
                 iterations,
                 len(self.func_units),
                 len(self.methods),
                 np.round(time() - start, 2),
             )
         )
+        if self.solver == "iterative":
+            stats = self.solver_statistics()
+            log.info(
+                "Monte Carlo LCA: iterative solves took {} iterations on average, "
+                "{} of {} solves fell back to a direct solve.".format(
+                    np.round(stats["krylov iterations"].mean(), 1),
+                    int((~stats["converged"]).sum()),
+                    len(stats),
+                )
+            )
 
-    @property
-    def func_units_dict(self) -> dict:
-        """Return a dictionary of reference flows (key, demand)."""
-        return {key: 1 for func_unit in self.func_units for key in func_unit}
+    def _calculate_parallel(self, chunks: list, workers: int) -> None:
+        """Calculate the chunks in worker processes, a task per chunk.
+
+        Every chunk is merged as soon as it is done. At most two chunks per
+        worker are submitted ahead, so no more than those are kept in memory.
+        The parameters of a chunk are sampled here when it is submitted, the
+        workers only insert the recalculated exchange amounts.
+        """
+        workers = min(workers, len(chunks))
+        queue = iter(chunks)
+        pending = {}
+        with process_pool(
+            workers,
+            initializer=init_monte_carlo_worker,
+            initargs=(
+                bd.projects.base_dir,
+                bd.projects.current,
+                self.func_units,
+                self.methods,
+                self.settings(),
+                self.param_plan,
+            ),
+        ) as executor:
+            while True:
+                for first, size, seed in islice(queue, 2 * workers - len(pending)):
+                    values = self.sample_parameters(size, seed)
+                    future = executor.submit(
+                        calculate_monte_carlo_chunk, size, seed, values
+                    )
+                    pending[future] = first
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.merge_chunk(pending.pop(future), future.result())
+        # the chunks are not merged in order
+        self.solver_stats.sort(
+            key=lambda stats: (stats["iteration"], stats["reference flow"])
+        )
+
+    def sample_parameters(self, iterations: int, seed: int) -> Optional[np.ndarray]:
+        """Sample and recalculate the parameters for a chunk of iterations
+        with the generator seeded by the given seed, and store the sampled
+        parameters for the GSA.
+
+        Returns the recalculated amounts of the parameterized exchanges with
+        a column per iteration, or None if parameters are not included.
+        """
+        if not self.include_parameters:
+            return None
+        self.param_rng.reset_generator(seed)
+        plan = self.param_plan
+        amounts, values = self.param_rng.next_chunk(iterations)
+
+        # Store parameter data for GSA, the parameters are formatted once
+        # and only their amounts differ between the iterations.
+        gsa = [t[:3] for t in self.param_rng.parameters.to_gsa()]
+        for i in range(iterations):
+            param_exchanges = plan["exchanges"].copy()
+            param_exchanges["amount"] = values[plan["sources"], i]
+            self.parameter_exchanges.append(param_exchanges)
+            self.parameters.append(
+                [t + (amount,) for t, amount in zip(gsa, amounts[:, i])]
+            )
+        # Extract sampled values for parameters, store.
+        self.param_rng.retrieve_sampled_values(self.parameter_data, amounts)
+        return values
+
+    def solver_statistics(self) -> pd.DataFrame:
+        """Return the convergence statistics of the iterative solves."""
+        return pd.DataFrame(
+            self.solver_stats,
+            columns=[
+                "iteration",
+                "reference flow",
+                "krylov iterations",
+                "residual",
+                "converged",
+            ],
+        )
+
+    def merge_chunk(self, first: int, chunk: dict) -> None:
+        """Place the results and sampled vectors of a calculated chunk in this object."""
+        self.results[first : first + len(chunk["results"])] = chunk["results"]
+        for name, sampled in chunk["samples"].items():
+            self.samples.write(name, first, sampled)
+        self.solver_stats.extend(
+            dict(stats, iteration=stats["iteration"] + first)
+            for stats in chunk["solver_stats"]
+        )
+
+    def sampled_exchange_values(self, matrix: str, indices: list) -> np.ndarray:
+        """Return the sampled values of the technosphere or biosphere matrix
+        at the given (row, col) indices, with a row for every iteration.
+
+        Only the sampled columns of the exchanges at these indices are read
+        from the sample store.
+        """
+        params = self.lca.tech_params if matrix == "technosphere" else self.lca.bio_params
+        width = int(params["col"].max()) + 1
+        keys = params["row"].astype(np.int64) * width + params["col"]
+        wanted = np.array([row * width + col for row, col in indices], dtype=np.int64)
+
+        # multiple exchanges can add up to a single matrix value
+        hits = np.flatnonzero(np.isin(keys, wanted))
+        order = np.argsort(wanted)
+        positions = order[np.searchsorted(wanted, keys[hits], sorter=order)]
+        signs = np.ones(len(hits))
+        if matrix == "technosphere":
+            # technosphere inputs enter the matrix as negative values
+            signs[params["type"][hits] == 1] = -1
+        selection = sparse.csr_matrix(
+            (signs, (np.arange(len(hits)), positions)),
+            shape=(len(hits), len(indices)),
+        )
+        return np.asarray(selection.T @ self.samples.columns(matrix, hits).T).T
 
     def get_results_by(self, act_key=None, method=None):
         """Get a slice or all of the results.
         - if a method is provided, results will be given for all reference flows and runs
         - if a reference flow is provided, results will be given for all impact categories and runs
-        - if a reference flow and impact category is provided, results will be given for all runs of that combination
+        - if a reference flow and impact category is provided, results will be given
+          for all runs of that combination
         - if nothing is given, all results are returned
         """
 
@@ -330,6 +463,48 @@ class MonteCarloLCA(object):
         return translated_keys
 
 
+class SampleStore(object):
+    """Stores the sampled vectors of a Monte Carlo LCA in memory-mapped files,
+    so the samples of many iterations do not have to be kept in memory.
+
+    Every vector is stored column-major with a row per iteration, reading the
+    samples of a few exchanges only touches the data of those exchanges.
+    The files are removed when the store is closed or garbage collected.
+    """
+
+    def __init__(self, iterations: int, directory: Optional[str] = None):
+        self.iterations = iterations
+        self.path = tempfile.mkdtemp(prefix="samples_", dir=directory)
+        self.arrays = {}
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+    def __contains__(self, name) -> bool:
+        return name in self.arrays
+
+    def create(self, name, length: int) -> None:
+        """Create the on-disk array for a sampled vector of the given length."""
+        self.arrays[name] = np.lib.format.open_memmap(
+            os.path.join(self.path, "{}.npy".format(len(self.arrays))),
+            mode="w+",
+            dtype=np.float64,
+            shape=(self.iterations, length),
+            fortran_order=True,
+        )
+
+    def write(self, name, first: int, vectors: np.ndarray) -> None:
+        """Write the sampled vectors of consecutive iterations."""
+        self.arrays[name][first : first + len(vectors)] = vectors
+
+    def columns(self, name, columns) -> np.ndarray:
+        """Read the samples of the given vector positions for all iterations."""
+        return np.asarray(self.arrays[name][:, columns])
+
+    def close(self) -> None:
+        """Release the arrays and remove their files."""
+        self.arrays.clear()
+        self._finalizer()
+
+
 def perform_MonteCarlo_LCA(project="default", cs_name=None, iterations=10):
     """Performs Monte Carlo LCA based on a calculation setup and returns the
     Monte Carlo LCA object."""
@@ -1,11 +1,12 @@
+import hashlib
 from collections import OrderedDict
-from typing import Iterable, Optional, Union
+from typing import Callable, Hashable, Iterable, Optional, Union
 
-import bw2analyzer as ba
 import bw2calc as bc
 import numpy as np
 import pandas as pd
 from PySide2.QtWidgets import QApplication, QMessageBox
+from scipy import sparse
 
 from activity_browser import log
 from activity_browser.mod import bw2data as bd
@@ -14,8 +15,12 @@ from activity_browser.mod.bw2data.backends import ActivityDataset
 from .commontasks import wrap_text
 from .errors import ReferenceFlowValueError
 from .metadata import AB_metadata
+from .workers import pack_vectors, solve_with_factorization, sparse_vectors
 
-ca = ba.ContributionAnalysis()
+try:
+    from bw2calc import spsolve
+except ImportError:
+    from scipy.sparse.linalg import spsolve
 
 
 class MLCA(object):
@@ -38,6 +43,13 @@ class MLCA(object):
     ----------
     cs_name : str
         Name of the calculation setup
+    batch_solve : bool
+        Solve all reference flows at once against a single factorization of
+        the technosphere matrix instead of one `redo_lci` per reference flow
+    batch_lcia : bool
+        Calculate the scores and contributions of all impact categories at
+        once from the stacked characterization factors instead of one
+        `lcia_calculation` per impact category
 
     Attributes
     ----------
@@ -64,6 +76,9 @@ class MLCA(object):
         calculations
     method_matrices: list
         Contains the characterization matrix for each impact category.
+    cf_vectors: `numpy.ndarray`
+        2-dimensional array of shape (`methods`, `biosphere`) holding the
+        diagonal of each characterization matrix in `method_matrices`
     lca_scores: `numpy.ndarray`
         2-dimensional array of shape (`func_units`, `methods`) holding the
         calculated LCA scores of each combination of reference flow and
@@ -80,19 +95,21 @@ class MLCA(object):
         Contains the calculated technosphere flows per reference flow
     inventory: dict
         Life cycle inventory (biosphere flows) per reference flow
-    inventories: dict
-        Biosphere flows per reference flow and impact category combination
-    characterized_inventories: dict
+    inventories: `InventoryCache`
+        Biosphere flows per reference flow and technosphere activity, built
+        on request from the scaling factors
+    characterized_inventories: `InventoryCache`
         Inventory multiplied by scaling (relative impact on environment) per
-        reference flow and impact category combination
-    elementary_flow_contributions: `numpy.ndarray`
-        3-dimensional array of shape (`func_units`, `methods`, `biosphere`)
-        which holds the characterized inventory results summed along the
-        technosphere axis
-    process_contributions: `numpy.ndarray`
-        3-dimensional array of shape (`func_units`, `methods`, `technosphere`)
-        which holds the characterized inventory results summed along the
-        biosphere axis
+        reference flow and impact category combination, built on request
+        from the scaling factors and `cf_vectors`
+    elementary_flow_contributions: `ContributionCube`
+        3-dimensional sparse array of shape (`func_units`, `methods`,
+        `biosphere`) which holds the characterized inventory results summed
+        along the technosphere axis
+    process_contributions: `ContributionCube`
+        3-dimensional sparse array of shape (`func_units`, `methods`,
+        `technosphere`) which holds the characterized inventory results
+        summed along the biosphere axis
     func_unit_translation_dict: dict
         Contains the reference flow key and its expected output linked to
         the brightway activity label.
@@ -108,7 +125,13 @@ class MLCA(object):
 
     """
 
-    def __init__(self, cs_name: str):
+    RESULT_ARRAYS = ("lca_scores",)
+    RESULT_CUBES = ("elementary_flow_contributions", "process_contributions")
+    RESULT_DICTS = ("scaling_factors", "technosphere_flows", "inventory")
+
+    def __init__(
+        self, cs_name: str, batch_solve: bool = True, batch_lcia: bool = True
+    ):
         try:
             cs = bd.calculation_setups[cs_name]
         except KeyError:
@@ -140,13 +163,20 @@ class MLCA(object):
         self.method_index = {m: i for i, m in enumerate(self.methods)}
         self.rev_method_index = {v: k for k, v in self.method_index.items()}
 
-        # initial LCA and prepare method matrices
+        self.batch_solve = batch_solve
+        self.batch_lcia = batch_lcia
+
+        # initial LCA and prepare method matrices, the technosphere matrix is
+        # only factorized once it is solved (results may be loaded instead).
         self.lca = self._construct_lca()
-        self.lca.lci(factorize=True)
+        self.lca.load_lci_data()
         self.method_matrices = []
         for method in self.methods:
             self.lca.switch_method(method)
             self.method_matrices.append(self.lca.characterization_matrix)
+        self.cf_vectors = np.vstack(
+            [np.asarray(m.diagonal()).ravel() for m in self.method_matrices]
+        )
 
         self.lca_scores = np.zeros((len(self.func_units), len(self.methods)))
 
@@ -165,19 +195,22 @@ class MLCA(object):
         # Life cycle inventory (biosphere flows) by reference flow
         self.inventory = dict()
         # Inventory (biosphere flows) for specific reference flow (e.g. 2000x15000) and impact category.
-        self.inventories = dict()
+        # These matrices are large, so they are only built when requested.
+        self.inventories = InventoryCache(self.build_inventory)
         # Inventory multiplied by scaling (relative impact on environment) per impact category.
-        self.characterized_inventories = dict()
+        self.characterized_inventories = InventoryCache(
+            self.build_characterized_inventory
+        )
 
         # Summarized contributions for EF and processes.
-        self.elementary_flow_contributions = np.zeros(
+        self.elementary_flow_contributions = ContributionCube(
             (
                 len(self.func_units),
                 len(self.methods),
                 self.lca.biosphere_matrix.shape[0],
             )
         )
-        self.process_contributions = np.zeros(
+        self.process_contributions = ContributionCube(
             (
                 len(self.func_units),
                 len(self.methods),
@@ -207,18 +240,142 @@ class MLCA(object):
     def _construct_lca(self):
         return bc.LCA(demand=self.func_units_dict, method=self.methods[0])
 
+    def _demand_index(self, key: tuple) -> int:
+        """Return the row of the given reference flow in the technosphere matrix."""
+        try:
+            return self.lca.product_dict[key]
+        except KeyError:
+            # bw25 compatibility
+            return self.lca.product_dict[bd.get_activity(key).id]
+
+    def demand_matrix(self) -> np.ndarray:
+        """Build a dense demand matrix of shape (`products`, `func_units`)
+        holding the demand vector of each reference flow as a column.
+        """
+        demand = np.zeros((self.lca.technosphere_matrix.shape[0], len(self.func_units)))
+        for col, func_unit in enumerate(self.func_units):
+            for key, amount in func_unit.items():
+                demand[self._demand_index(key), col] = amount
+        return demand
+
+    def solve_demand_matrix(self, demand: np.ndarray) -> np.ndarray:
+        """Solve the technosphere system for every column of `demand` using a
+        single factorization of the technosphere matrix.
+
+        The factorization is created if the LCA object does not hold one
+        (e.g. after the technosphere matrix was changed).
+        """
+        if not hasattr(self.lca, "solver"):
+            self.lca.decompose_technosphere()
+        solver = getattr(self.lca, "solver", None)
+        if solver is None:
+            # pypardiso does not expose a solver, but caches the factorization itself
+            return np.asarray(spsolve(self.lca.technosphere_matrix, demand)).reshape(
+                demand.shape
+            )
+        return solve_with_factorization(solver, demand)
+
+    def traversal_lca(self, func_unit_index: int, method_index: int) -> "TraversalLCA":
+        """Return the LCA of a single reference flow and impact category for
+        graph traversal, sharing the matrices and factorization of this MLCA.
+        """
+        if not hasattr(self.lca, "solver"):
+            self.lca.decompose_technosphere()
+        func_unit = self.func_units[func_unit_index]
+        return TraversalLCA(
+            self.lca,
+            {bd.get_activity(key).id: amount for key, amount in func_unit.items()},
+            self.method_matrices[method_index],
+        )
+
+    def _redo_lci(self, func_unit: dict) -> None:
+        try:
+            self.lca.redo_lci(func_unit)
+        except:
+            # bw25 compatibility
+            key = list(func_unit.keys())[0]
+            self.lca.redo_lci({bd.get_activity(key).id: func_unit[key]})
+
+    def _load_supply_array(self, supply_array: np.ndarray) -> None:
+        """Place a pre-solved supply array on the LCA object, building the
+        inventory from it exactly like `lci_calculation` would.
+        """
+        self.lca.supply_array = supply_array
+        self.lca.inventory = self.lca.biosphere_matrix @ sparse.diags(supply_array)
+
+    def characterized_biosphere(self) -> np.ndarray:
+        """Multiply the stacked characterization factors through the biosphere
+        matrix, returning an array of shape (`methods`, `technosphere`) which
+        holds the characterized direct emissions per unit of each activity.
+        """
+        return np.asarray(self.lca.biosphere_matrix.T @ self.cf_vectors.T).T
+
+    def batch_lcia_calculation(self, cf_biosphere: np.ndarray) -> tuple:
+        """Calculate the scores and contributions of all impact categories
+        for the supply array currently loaded in the LCA object.
+
+        Parameters
+        ----------
+        cf_biosphere : Output of `characterized_biosphere` for the current
+            biosphere matrix
+
+        Returns
+        -------
+        Arrays of LCA scores (`methods`), elementary flow contributions
+        (`methods`, `biosphere`) and process contributions (`methods`,
+        `technosphere`)
+
+        """
+        inventory = self.lca.biosphere_matrix @ self.lca.supply_array
+        return (
+            self.cf_vectors @ inventory,
+            self.cf_vectors * inventory,
+            cf_biosphere * self.lca.supply_array,
+        )
+
+    def build_inventory(self, key: str) -> sparse.spmatrix:
+        """Rebuild the inventory matrix of a reference flow from its scaling factors.
+
+        Parameters
+        ----------
+        key : Key of the reference flow in `scaling_factors`
+
+        """
+        return self.lca.biosphere_matrix @ sparse.diags(self.scaling_factors[key])
+
+    def _inventory_key(self, index: tuple) -> str:
+        """Return the `scaling_factors` key matching a characterized inventory index."""
+        return str(self.func_units[index[0]])
+
+    def build_characterized_inventory(self, index: tuple) -> sparse.spmatrix:
+        """Rebuild the characterized inventory matrix of a reference flow and
+        impact category combination.
+
+        Parameters
+        ----------
+        index : Tuple of the reference flow and impact category indexes
+
+        """
+        inventory = self.inventories[self._inventory_key(index)]
+        return sparse.diags(self.cf_vectors[index[1]]) @ inventory
+
     def _perform_calculations(self):
         """Isolates the code which performs calculations to allow subclasses
         to either alter the code or redo calculations after matrix substitution.
         """
+        if self.batch_solve:
+            supply = self.solve_demand_matrix(self.demand_matrix())
+        elif not hasattr(self.lca, "solver"):
+            self.lca.decompose_technosphere()
+        if self.batch_lcia:
+            cf_biosphere = self.characterized_biosphere()
+
         for row, func_unit in enumerate(self.func_units):
             # Do the LCA for the current reference flow
-            try:
-                self.lca.redo_lci(func_unit)
-            except:
-                # bw25 compatibility
-                key = list(func_unit.keys())[0]
-                self.lca.redo_lci({bd.get_activity(key).id: func_unit[key]})
+            if self.batch_solve:
+                self._load_supply_array(supply[:, row])
+            else:
+                self._redo_lci(func_unit)
 
             # Now update the:
             # - Scaling factors
@@ -237,16 +394,20 @@ class MLCA(object):
             self.inventory.update(
                 {str(func_unit): np.array(self.lca.inventory.sum(axis=1)).ravel()}
             )
-            self.inventories.update({str(func_unit): self.lca.inventory})
+
+            if self.batch_lcia:
+                (
+                    self.lca_scores[row],
+                    self.elementary_flow_contributions[row],
+                    self.process_contributions[row],
+                ) = self.batch_lcia_calculation(cf_biosphere)
+                continue
 
             # Now, for each method, take the current reference flow and do inventory analysis
             for col, cf_matrix in enumerate(self.method_matrices):
                 self.lca.characterization_matrix = cf_matrix
                 self.lca.lcia_calculation()
                 self.lca_scores[row, col] = self.lca.score
-                self.characterized_inventories[
-                    row, col
-                ] = self.lca.characterized_inventory.copy()
                 self.elementary_flow_contributions[row, col] = np.array(
                     self.lca.characterized_inventory.sum(axis=1)
                 ).ravel()
@@ -255,8 +416,79 @@ class MLCA(object):
                 ] = self.lca.characterized_inventory.sum(axis=0)
 
     def calculate(self):
+        self.inventories.clear()
+        self.characterized_inventories.clear()
         self._perform_calculations()
 
+    def result_keys(self) -> list:
+        """Return the keys of the per reference flow result dictionaries in
+        a fixed order.
+        """
+        return [str(fu) for fu in self.func_units]
+
+    @classmethod
+    def fingerprint(cls, cs_name: str) -> str:
+        """Return a hash of everything the results of a calculation of the
+        calculation setup depend on: the setup itself and the state of the
+        databases and impact categories it uses.
+
+        Only the metadata is read, so this is cheap enough to be done before
+        the matrices of the calculation are built.
+        """
+        cs = bd.calculation_setups[cs_name]
+        keys = [key for func_unit in cs["inv"] for key in func_unit]
+        digest = hashlib.sha256()
+        digest.update(repr((cls.__name__, cs["inv"], cs["ia"])).encode())
+        for db in sorted(cls.linked_databases(keys)):
+            digest.update(repr((db, sorted(bd.databases[db].items()))).encode())
+        for method in cs["ia"]:
+            metadata = bd.methods.get(tuple(method), {})
+            digest.update(repr((method, sorted(metadata.items()))).encode())
+        return digest.hexdigest()
+
+    def result_arrays(self) -> dict:
+        """Return the results of the calculation as a dictionary of arrays."""
+        keys = self.result_keys()
+        arrays = {name: getattr(self, name) for name in self.RESULT_ARRAYS}
+        for name in self.RESULT_CUBES:
+            arrays.update(
+                {
+                    "{}_{}".format(name, part): array
+                    for part, array in getattr(self, name).to_arrays().items()
+                }
+            )
+        arrays.update(
+            {
+                name: np.array([getattr(self, name)[key] for key in keys])
+                for name in self.RESULT_DICTS
+            }
+        )
+        return arrays
+
+    def load_result_arrays(self, arrays: dict) -> None:
+        """Load the results of an earlier calculation from `result_arrays`,
+        in place of `calculate`.
+
+        The results are loaded into the existing arrays and dictionaries, as
+        these may already be referenced elsewhere (e.g. by `Contributions`).
+        """
+        self.inventories.clear()
+        self.characterized_inventories.clear()
+        for name in self.RESULT_ARRAYS:
+            getattr(self, name)[...] = arrays[name]
+        for name in self.RESULT_CUBES:
+            getattr(self, name).load_arrays(
+                **{
+                    part: arrays["{}_{}".format(name, part)]
+                    for part in ContributionCube.PARTS
+                }
+            )
+        keys = self.result_keys()
+        for name in self.RESULT_DICTS:
+            results = getattr(self, name)
+            results.clear()
+            results.update(zip(keys, arrays[name]))
+
     @property
     def func_units_dict(self) -> dict:
         """Return a dictionary of reference flow (key, demand)."""
@@ -265,6 +497,13 @@ class MLCA(object):
     @property
     def all_databases(self) -> set:
         """Get all databases linked to the reference flows."""
+        return self.linked_databases(self.fu_activity_keys)
+
+    @staticmethod
+    def linked_databases(keys: Iterable[tuple]) -> set:
+        """Get the databases of the given activity keys and all of the
+        databases they depend on.
+        """
 
         def get_dependents(dbs: set, dependents: list) -> set:
             for dep in (bd.databases[db].get("depends", []) for db in dependents):
@@ -272,7 +511,7 @@ class MLCA(object):
                     dbs = get_dependents(dbs.union(dep), dep)
             return dbs
 
-        dbs = set(f[0] for f in self.fu_activity_keys)
+        dbs = set(f[0] for f in keys)
         dbs = get_dependents(dbs, list(dbs))
         # In rare cases, the default biosphere is not found as a dependency, see:
         # https://github.com/LCA-ActivityBrowser/activity-browser/issues/298
@@ -313,6 +552,205 @@ class MLCA(object):
         AB_metadata.add_metadata(self.all_databases)
 
 
+class InventoryCache(object):
+    """Bounded least-recently-used cache of inventory matrices.
+
+    Storing a full biosphere x technosphere matrix for every reference flow,
+    impact category (and scenario) combination takes up gigabytes of memory
+    for large databases, while only a few of them are ever looked at. Instead,
+    a matrix is built by calling `build` the first time it is requested and
+    only the `maxsize` most recently used matrices are kept.
+
+    Parameters
+    ----------
+    build : Callable that (re)builds the matrix for a given key
+    maxsize : Maximum number of matrices to keep in memory
+
+    """
+
+    def __init__(self, build: Callable, maxsize: int = 16):
+        self.build = build
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def __getitem__(self, key: Hashable):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        matrix = self.build(key)
+        self._cache[key] = matrix
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return matrix
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._cache
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class TraversalLCA(object):
+    """LCA of a single reference flow and impact category built on top of the
+    matrices and the factorized technosphere of an existing LCA object.
+
+    Provides everything `bw_graph_tools` needs to traverse the supply chain
+    graph, without building the matrices or factorizing the technosphere
+    matrix again. Another `TraversalLCA` can be passed as `lca`, to share its
+    matrices with a different reference flow or impact category.
+
+    Parameters
+    ----------
+    lca : LCA object holding the matrices (and factorization) to share
+    demand : Reference flow as a dictionary of activity ids and amounts
+    characterization_matrix : Characterization matrix of the impact category
+
+    """
+
+    def __init__(
+        self,
+        lca: Union[bc.LCA, "TraversalLCA"],
+        demand: dict,
+        characterization_matrix: sparse.spmatrix,
+    ):
+        self.technosphere_matrix = lca.technosphere_matrix
+        self.technosphere_mm = lca.technosphere_mm
+        self.biosphere_matrix = lca.biosphere_matrix
+        self.dicts = lca.dicts
+        # pypardiso does not expose a solver, but caches the factorization itself
+        self.solver = getattr(lca, "solver", None)
+        self.characterization_matrix = characterization_matrix
+        self.demand = demand
+        self.demand_array = np.zeros(self.technosphere_matrix.shape[0])
+        for key, amount in demand.items():
+            self.demand_array[self.dicts.product[key]] = amount
+        self.supply_array = self.solve_linear_system()
+        self.score = float(
+            characterization_matrix.diagonal()
+            @ (self.biosphere_matrix @ self.supply_array)
+        )
+
+    def solve_linear_system(self) -> np.ndarray:
+        if self.solver is None:
+            return spsolve(self.technosphere_matrix, self.demand_array)
+        return self.solver(self.demand_array)
+
+
+class ContributionCube(object):
+    """Sparse array of contribution results.
+
+    The contributions of every reference flow and impact category (and
+    scenario) combination are mostly zero, so a dense array of them takes up
+    far more memory than needed. Instead, only the non-zero values of every
+    vector along the last axis are stored.
+
+    The cube is indexed like a numpy array on all but the last axis, reading
+    returns dense arrays and assigning takes (broadcastable) dense arrays.
+    Reads slice a CSR matrix of all vectors, which is built on the first read
+    after a change.
+
+    Parameters
+    ----------
+    shape : Shape of the equivalent dense array
+    threshold : Values smaller than this fraction of the largest (absolute)
+        value of their vector are dropped, by default only zeros are dropped
+
+    """
+
+    PARTS = ("indptr", "indices", "data")
+
+    def __init__(self, shape: tuple, threshold: float = 0.0):
+        self.shape = tuple(shape)
+        self.threshold = threshold
+        self._vectors = {}
+        self._csr = None
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def nnz(self) -> int:
+        """Number of stored values."""
+        return sum(len(data) for _, data in self._vectors.values())
+
+    def _rows(self, index) -> np.ndarray:
+        """Return the numbers of the vectors selected by the index."""
+        index = index if isinstance(index, tuple) else (index,)
+        if len([i for i in index if i is not Ellipsis]) >= self.ndim:
+            raise IndexError("The last axis of a contribution cube cannot be indexed")
+        rows = np.arange(int(np.prod(self.shape[:-1]))).reshape(self.shape[:-1])
+        return np.asarray(rows[index])
+
+    def _matrix(self) -> sparse.csr_matrix:
+        """Return all vectors as a CSR matrix with a row per vector."""
+        if self._csr is None:
+            arrays = self.to_arrays()
+            self._csr = sparse.csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]),
+                shape=(int(np.prod(self.shape[:-1])), self.shape[-1]),
+            )
+        return self._csr
+
+    def __getitem__(self, index) -> np.ndarray:
+        rows = self._rows(index)
+        dense = self._matrix()[rows.ravel()].toarray()
+        return dense.reshape(rows.shape + self.shape[-1:])
+
+    def __setitem__(self, index, values) -> None:
+        rows = self._rows(index)
+        n = self.shape[-1]
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == rows.size * n:
+            values = values.reshape(rows.size, n)
+        else:
+            values = np.broadcast_to(values, rows.shape + (n,)).reshape(rows.size, n)
+        vectors = sparse_vectors(values, self.threshold)
+        for row, vector in zip(rows.ravel().tolist(), vectors):
+            self._vectors[row] = vector
+        self._csr = None
+
+    def toarray(self) -> np.ndarray:
+        """Return the cube as a dense array."""
+        return self[...]
+
+    def to_arrays(self) -> dict:
+        """Return the cube as the arrays of a CSR matrix of all vectors."""
+        count = int(np.prod(self.shape[:-1]))
+        empty = (np.empty(0, np.int32), np.empty(0))
+        return pack_vectors([self._vectors.get(row, empty) for row in range(count)])
+
+    def set_arrays(
+        self, index, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray
+    ) -> None:
+        """Assign the vectors selected by the index from CSR arrays with a
+        row per selected vector (see `pack_vectors`), in the order in which
+        `__getitem__` returns them.
+        """
+        rows = self._rows(index).ravel()
+        if len(indptr) != rows.size + 1:
+            raise ValueError("Contributions do not match the selected vectors")
+        for row, start, end in zip(rows.tolist(), indptr[:-1], indptr[1:]):
+            self._vectors[row] = (indices[start:end], data[start:end])
+        self._csr = None
+
+    def load_arrays(
+        self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray
+    ) -> None:
+        """Replace the contents of the cube with those of `to_arrays`."""
+        if len(indptr) != int(np.prod(self.shape[:-1])) + 1:
+            raise ValueError("Stored contributions do not match the cube shape")
+        self._vectors = {
+            row: (indices[start:end], data[start:end])
+            for row, (start, end) in enumerate(zip(indptr[:-1], indptr[1:]))
+            if end > start
+        }
+        self._csr = None
+
+
 class Contributions(object):
     """Contribution Analysis built on top of the Multi-LCA class.
 
@@ -426,29 +864,27 @@ class Contributions(object):
         FU_M_index : Dictionary which maps the reference flows or methods to their matching columns
         rev_dict : 'reverse' dictionary used to map correct activity/method to its value
         limit : Number of top-contributing items to include
-        limit_type : Either "number" or "percent", ContributionAnalysis.sort_array for complete explanation
+        limit_type : Either "number" or "percent", see `top_contributions`
 
         Returns
         -------
         Top-contributing flows per method or activity
 
         """
-        topcontribution_dict = dict()
+        indices, selected = top_contributions(contributions, limit, limit_type)
+        values = np.take_along_axis(contributions, indices, axis=1)
+        totals = contributions.sum(axis=1)
+        rests = totals - np.where(selected, values, 0).sum(axis=1)
+
+        topcontribution_dict = {}
         for fu_or_method, col in FU_M_index.items():
-            top_contribution = ca.sort_array(
-                contributions[col, :], limit=limit, limit_type=limit_type
-            )
-            cont_per = OrderedDict()
-            cont_per.update(
-                {
-                    ("Total", ""): contributions[col, :].sum(),
-                    ("Rest", ""): contributions[col, :].sum()
-                    - top_contribution[:, 0].sum(),
-                }
-            )
-            for value, index in top_contribution:
-                cont_per.update({rev_dict[index]: value})
-            topcontribution_dict.update({fu_or_method: cont_per})
+            top = selected[col]
+            keys = map(rev_dict.__getitem__, indices[col, top].tolist())
+            topcontribution_dict[fu_or_method] = {
+                ("Total", ""): totals[col],
+                ("Rest", ""): rests[col],
+                **dict(zip(keys, values[col, top].tolist())),
+            }
         return topcontribution_dict
 
     @staticmethod
@@ -481,21 +917,17 @@ class Contributions(object):
         fields = (
             fields if fields else ["name", "reference product", "location", "database"]
         )
-        keys = (
-            k for k in key_list
-        )  # need to do this as the keys come from a pd.Multiindex
+        keys = list(key_list)  # need to do this as the keys come from a pd.Multiindex
+        mask = set(mask) if mask else set()
+        # look up the labels of all metadata keys at once
+        lookup = [k for k in keys if not isinstance(k, str) and k not in mask]
+        labels = dict(zip(lookup, AB_metadata.get_labels(lookup, fields, separator)))
         translated_keys = []
         for k in keys:
-            if mask and k in mask:
+            if k in mask or isinstance(k, str):
                 translated_keys.append(k)
-            elif isinstance(k, str):
-                translated_keys.append(k)
-            elif k in AB_metadata.index:
-                translated_keys.append(
-                    separator.join(
-                        [str(l) for l in list(AB_metadata.get_metadata(k, fields))]
-                    )
-                )
+            elif labels[k] is not None:
+                translated_keys.append(labels[k])
             else:
                 translated_keys.append(separator.join([i for i in k if i != ""]))
         if max_length:
@@ -687,8 +1119,12 @@ class Contributions(object):
         return self._build_lca_scores_df(scores)
 
     @staticmethod
-    def _build_contributions(data: np.ndarray, index: int, axis: int) -> np.ndarray:
-        return data.take(index, axis=axis)
+    def _build_contributions(
+        data: Union[np.ndarray, ContributionCube], index: int, axis: int
+    ) -> np.ndarray:
+        selection = [slice(None)] * (data.ndim - 1)
+        selection[axis] = index
+        return data[tuple(selection)]
 
     def get_contributions(
         self, contribution, functional_unit=None, method=None, **kwargs
@@ -896,5 +1332,73 @@ class Contributions(object):
         return labelled_df
 
 
+def top_contributions(
+    contributions: np.ndarray, limit: Union[int, float], limit_type: str = "number"
+) -> (np.ndarray, np.ndarray):
+    """Select the largest contributions (in absolute terms) along the last
+    axis of the array, for all other axes at once.
+
+    With limit_type "number" the `limit` largest contributions are selected,
+    with "percent" those that are at least `limit` (a fraction between 0
+    and 1) of the total absolute contribution.
+
+    Returns the indices of the candidates, sorted from the largest to the
+    smallest contribution, and a boolean array of the same shape that tells
+    which candidates were selected (the number can differ for "percent").
+    Equal contributions are ordered from the highest to the lowest index,
+    like `ContributionAnalysis.sort_array` does.
+    """
+    contributions = np.asarray(contributions)
+    absolute = np.abs(contributions)
+    n = contributions.shape[-1]
+    if limit_type == "number":
+        k = max(min(int(limit), n), 0)
+        selected = None
+    elif limit_type == "percent":
+        if not 0 < limit <= 1:
+            raise ValueError("Percentage limits > 0 and <= 1.")
+        threshold = absolute.sum(axis=-1, keepdims=True) * limit
+        selected = absolute >= threshold
+        k = int(selected.sum(axis=-1).max(initial=0))
+    else:
+        raise ValueError("limit_type must be either 'number' or 'percent'")
+
+    if k == 0:
+        indices = np.empty(contributions.shape[:-1] + (0,), dtype=int)
+    elif k < n:
+        # Take all values larger than the k-th largest, and of the values equal
+        # to it only those with the highest indices.
+        kth = np.argpartition(-absolute, k - 1, axis=-1)[..., k - 1 : k]
+        kth = np.take_along_axis(absolute, kth, axis=-1)
+        larger = absolute > kth
+        ties = absolute == kth
+        needed = k - larger.sum(axis=-1, keepdims=True)
+        from_end = np.cumsum(ties[..., ::-1], axis=-1)[..., ::-1]
+        chosen = larger | (ties & (from_end <= needed))
+        indices = np.nonzero(chosen.reshape(-1, n))[1]
+        indices = indices.reshape(contributions.shape[:-1] + (k,))
+    else:
+        indices = np.broadcast_to(np.arange(n), contributions.shape).copy()
+    if selected is None:
+        selected = np.ones(indices.shape, dtype=bool)
+    else:
+        selected = np.take_along_axis(selected, indices, axis=-1)
+
+    # sort the candidates, ties by index, with those not selected last
+    values = np.where(selected, np.take_along_axis(absolute, indices, axis=-1), -1)
+    order = np.lexsort((-indices, -values), axis=-1)
+    return (
+        np.take_along_axis(indices, order, axis=-1),
+        np.take_along_axis(selected, order, axis=-1),
+    )
+
+
 def ids_to_keys(index_list):
-    return [bd.get_activity(i).key if isinstance(i, int) else i for i in index_list]
+    index_list = list(index_list)
+    ids = [i for i in index_list if isinstance(i, int)]
+    # look the ids up in the metadata first, only unknown ids hit the database
+    known = dict(zip(ids, AB_metadata.keys_from_ids(ids))) if ids else {}
+    return [
+        (known.get(i) or bd.get_activity(i).key) if isinstance(i, int) else i
+        for i in index_list
+    ]
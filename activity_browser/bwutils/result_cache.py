@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import os
+import zipfile
+from typing import Optional
+
+import numpy as np
+
+from activity_browser import log
+from activity_browser.mod import bw2data as bd
+
+from .multilca import MLCA
+
+
+class ResultCache(object):
+    """Stores the results of `MLCA` calculations on disk, in the 'results'
+    directory of the current project.
+
+    Results are stored as compressed `.npz` files named after the
+    `MLCA.fingerprint`, so a calculation of an unchanged setup on unchanged
+    data can load its results instead of solving again. Only the most
+    recently used results are kept, up to `maxbytes` on disk.
+    """
+
+    MAXBYTES = 2**30
+
+    def __init__(self, directory: Optional[str] = None, maxbytes: int = MAXBYTES):
+        self.directory = directory or bd.projects.request_directory("results")
+        self.maxbytes = maxbytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, "{}.npz".format(key))
+
+    def load(self, mlca: MLCA, key: str) -> bool:
+        """Load the stored results for the key into the MLCA, returns False
+        if there are none.
+
+        Results that cannot be read (e.g. a truncated file, or results stored
+        by an older version) are removed.
+        """
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return False
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+            mlca.load_result_arrays(arrays)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile, EOFError) as e:
+            log.warning("Could not load stored LCA results, recalculating:", e)
+            self.remove(key)
+            return False
+        # Mark the results as recently used.
+        os.utime(path)
+        log.info("Loaded stored LCA results:", key)
+        return True
+
+    def store(self, mlca: MLCA, key: str) -> None:
+        """Store the results of the MLCA under the key."""
+        path = self.path(key)
+        partial = path + ".partial"
+        try:
+            with open(partial, "wb") as f:
+                np.savez_compressed(f, **mlca.result_arrays())
+            os.replace(partial, path)
+        except OSError as e:
+            log.warning("Could not store LCA results:", e)
+            return
+        self.prune()
+
+    def remove(self, key: str) -> None:
+        """Remove the stored results for the key, if any."""
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def prune(self) -> None:
+        """Remove the least recently used results beyond `maxbytes`."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort(reverse=True)
+        total = 0
+        for _, size, path in files:
+            total += size
+            if total <= self.maxbytes:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -233,33 +233,21 @@ def get_parameters_DF(mc):
         return pd.DataFrame()  # return emtpy df
 
 
-def get_exchange_values(matrix, indices):
-    """Get technosphere exchanges values from a list of exchanges
-    (row and column information)"""
-    return [matrix[i] for i in indices]
-
-
-def get_X(matrix_list, indices):
+def get_X(mc, matrix, indices):
     """Get the input data to the GSA, i.e. A and B matrix values for each
     model run."""
-    X = np.zeros((len(matrix_list), len(indices)))
-    for row, M in enumerate(matrix_list):
-        X[row, :] = get_exchange_values(M, indices)
-    return X
+    return mc.sampled_exchange_values(matrix, indices)
 
 
 def get_X_CF(mc, dfcf, method):
     """Get the characterization factors used for each model run. Only those CFs
     that are in the dfcf dataframe will be returned (i.e. by default only the
     CFs that have uncertainties."""
-    # get all CF inputs
-    CF_data = np.array(mc.CF_dict[method])  # has the same shape as the Xa and Xb below
-
-    # reduce this to uncertain CFs only (if this was done for the dfcf)
-    params_indices = dfcf.index.values
+    # reduce the CF inputs to uncertain CFs only (if this was done for the dfcf)
+    params_indices = dfcf.index.values.astype(int)
 
-    # if params_indices:
-    return CF_data[:, params_indices]
+    # has the same shape as the Xa and Xb below
+    return mc.samples.columns(method, params_indices)
 
 
 def get_X_P(dfp):
@@ -396,10 +384,10 @@ class GlobalSensitivityAnalysis(object):
         # Get X (Technosphere, Biosphere and CF values)
         X_list = list()
         if self.mc.include_technosphere and self.t_indices:
-            self.Xa = get_X(self.mc.A_matrices, self.t_indices)
+            self.Xa = get_X(self.mc, "technosphere", self.t_indices)
             X_list.append(self.Xa)
         if self.mc.include_biosphere and self.b_indices:
-            self.Xb = get_X(self.mc.B_matrices, self.b_indices)
+            self.Xb = get_X(self.mc, "biosphere", self.b_indices)
             X_list.append(self.Xb)
         if self.mc.include_cfs and not self.dfcf.empty:
             self.Xc = get_X_CF(self.mc, self.dfcf, self.method)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from .dataframe import (
+    scenario_dtype,
     scenario_names_from_df,
     scenario_replace_databases,
     superstructure_from_arrays,
@@ -9,4 +10,5 @@ from .file_dialogs import ABPopup
 from .file_imports import ABCSVImporter, ABFeatherImporter, ABFileImporter
 from .manager import SuperstructureManager
 from .mlca import SuperstructureContributions, SuperstructureMLCA
+from .package import ScenarioPackage
 from .utils import SUPERSTRUCTURE, _time_it_, edit_superstructure_for_string
@@ -45,12 +45,16 @@ def superstructure_from_arrays(
 def arrays_from_indexed_superstructure(
     df: pd.DataFrame,
 ) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the indexes and the scenario values of a superstructure, the
+    values are kept as float32 if they were read as such (see
+    `scenario_dtype`).
+    """
     result = np.zeros(df.shape[0], dtype=object)
     for i, data in enumerate(df.index.to_flat_index()):
         result[i] = Index.build_from_dict(
             {"input": data[0], "output": data[1], "flow type": data[2]}
         )
-    return result, df.to_numpy(dtype=float)
+    return result, df.to_numpy(dtype=scenario_dtype(df))
 
 
 def filter_databases_indexed_superstructure(
@@ -58,8 +62,14 @@ def filter_databases_indexed_superstructure(
 ) -> pd.DataFrame:
     """Filters the given superstructure so that only indexes where the output
     database is in the `include` set are valid.
+
+    The dataframe itself is returned if all of the indexes are valid, which
+    keeps memory-mapped scenario values (see `ScenarioPackage`) on disk.
     """
-    return df.loc[[x[1][0] in include for x in df.index.to_flat_index()], :]
+    valid = [x[1][0] in include for x in df.index.to_flat_index()]
+    if all(valid):
+        return df
+    return df.loc[valid, :]
 
 
 def scenario_columns(df: pd.DataFrame) -> pd.Index:
@@ -67,6 +77,17 @@ def scenario_columns(df: pd.DataFrame) -> pd.Index:
     return df.columns.difference(SUPERSTRUCTURE, sort=False)
 
 
+def scenario_dtype(*dfs: pd.DataFrame) -> np.dtype:
+    """Return float32 if the scenario columns of all of the given dataframes
+    are float32 (e.g. read with `downcast`), float64 otherwise.
+    """
+    for df in dfs:
+        dtypes = df.dtypes[~df.columns.isin(SUPERSTRUCTURE)]
+        if dtypes.empty or not (dtypes == np.float32).all():
+            return np.dtype(np.float64)
+    return np.dtype(np.float32)
+
+
 def scenario_names_from_df(df: pd.DataFrame) -> List[str]:
     """Returns the list of scenario names from a given superstructure.
 
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-from ast import literal_eval
 from pathlib import Path
 from typing import List, Union
 
@@ -8,14 +7,7 @@ import pandas as pd
 
 from activity_browser import log
 
-from .utils import SUPERSTRUCTURE
-
-
-def convert_tuple_str(x):
-    try:
-        return literal_eval(x)
-    except (ValueError, SyntaxError) as e:
-        return x
+from .utils import SUPERSTRUCTURE, downcast_scenario_values, parse_tuple_strings
 
 
 def get_sheet_names(document_path: Union[str, Path]) -> List[str]:
@@ -55,7 +47,7 @@ def valid_cols(name: str) -> bool:
 
 
 def import_from_excel(
-    document_path: Union[str, Path], import_sheet: int = 1
+    document_path: Union[str, Path], import_sheet: int = 1, downcast: bool = False
 ) -> pd.DataFrame:
     """Import all of the exchanges and their scenario amounts from a given
     document and sheet index.
@@ -70,6 +62,8 @@ def import_from_excel(
 
     'usecols' is used to exclude specific columns from the excel document.
     'comment' is used to exclude specific rows from the excel document.
+
+    With `downcast` the scenario columns are stored as float32.
     """
     data = pd.DataFrame({})
     try:
@@ -94,7 +88,10 @@ def import_from_excel(
 
         # Convert specific columns that may have tuples as strings
         columns = ["from categories", "from key", "to categories", "to key"]
-        data.loc[:, columns] = data[columns].map(convert_tuple_str)
+        for column in columns:
+            data[column] = parse_tuple_strings(data[column])
+        if downcast:
+            data = downcast_scenario_values(data)
     except:
         # skip the error checks here, these now occur in the calling layout.tabs.LCA_setup module
         pass
@@ -1,13 +1,16 @@
-import ast
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
+from pandas.io.common import infer_compression
 
 from activity_browser import log
 
 from ..errors import *
+from .utils import downcast_scenario_values, parse_tuple_strings
 
 
 class ABFileImporter(ABC):
@@ -40,6 +43,16 @@ class ABFileImporter(ABC):
 
     ABScenarioColumnsErrorIfNA = {"from key", "flow type", "to key"}
     ABStandardBiosphereColumns = {"from categories", "to categories"}
+    ABKeyColumns = ["from key", "to key"]
+    ABReportColumns = ["from activity name", "to activity name"]
+    ABCalculationErrors = ["#DIV/0!", "#VALUE!"]
+    ABIssueErrors = {
+        "database mismatch": IncompatibleDatabaseNamingError,
+        "missing value": InvalidSDFEntryValue,
+        "zero production": ActivityProductionValueError,
+        "calculation error": ExchangeErrorValues,
+        "non-numeric value": ScenarioExchangeDataNonNumericError,
+    }
 
     def __init__(self):
         pass
@@ -49,6 +62,138 @@ class ABFileImporter(ABC):
         """Abstract method must be implemented in child classes."""
         return NotImplemented
 
+    @staticmethod
+    def issue_report(
+        data: pd.DataFrame, mask: np.ndarray, columns: list, issue: str
+    ) -> pd.DataFrame:
+        """Build a report frame for the True values of a (rows x columns)
+        boolean mask. The report holds a row for every problem found, with the
+        names of the activities of the exchange, the column and the issue.
+        """
+        rows, cols = np.nonzero(np.asarray(mask).reshape(len(data), -1))
+        # Missing name columns are reported as NaN
+        report = data.reindex(columns=ABFileImporter.ABReportColumns).iloc[rows]
+        report.insert(len(report.columns), "column", np.asarray(columns)[cols])
+        report.insert(len(report.columns), "issue", issue)
+        return report
+
+    @staticmethod
+    def database_issues(data: pd.DataFrame) -> pd.DataFrame:
+        """Report the exchanges for which the database in the 'xxxx database'
+        field does not match the database of the 'xxxx key' field.
+        """
+        columns = ["from key", "to key"]
+        mask = np.column_stack(
+            [
+                (
+                    parse_tuple_strings(data[f"{side} key"]).str[0]
+                    != data[f"{side} database"]
+                )
+                & data[f"{side} key"].notna()
+                for side in ("from", "to")
+            ]
+        )
+        return ABFileImporter.issue_report(data, mask, columns, "database mismatch")
+
+    @staticmethod
+    def na_issues(data: pd.DataFrame, fields: list) -> pd.DataFrame:
+        """Report the NaNs in the given fields."""
+        return ABFileImporter.issue_report(
+            data, data.loc[:, fields].isna(), fields, "missing value"
+        )
+
+    @staticmethod
+    def value_masks(data: pd.DataFrame, scenario_names: list) -> tuple:
+        """Return the scenario columns which are not numeric and the
+        (rows x columns) masks of their calculation errors ('#DIV/0!',
+        '#VALUE!') and of their other non-numeric values.
+        """
+        columns = [
+            c for c in scenario_names if not is_numeric_dtype(data.loc[:, c].dtype)
+        ]
+        if not columns:
+            empty = np.zeros((len(data), 0), dtype=bool)
+            return columns, empty, empty
+        values = data.loc[:, columns]
+        errors = values.isin(ABFileImporter.ABCalculationErrors).to_numpy()
+        numeric = values.apply(pd.to_numeric, errors="coerce")
+        invalid = (numeric.isna() & values.notna()).to_numpy() & ~errors
+        return columns, errors, invalid
+
+    @staticmethod
+    def value_issues(data: pd.DataFrame, scenario_names: list) -> pd.DataFrame:
+        """Report calculation errors ('#DIV/0!', '#VALUE!') and other
+        non-numeric values in the scenario columns. Only the columns which
+        are not numeric are inspected.
+        """
+        columns, errors, invalid = ABFileImporter.value_masks(data, scenario_names)
+        return pd.concat(
+            [
+                ABFileImporter.issue_report(data, errors, columns, "calculation error"),
+                ABFileImporter.issue_report(data, invalid, columns, "non-numeric value"),
+            ]
+        )
+
+    @staticmethod
+    def value_issue_rows(data: pd.DataFrame, scenario_names: list) -> np.ndarray:
+        """Return a positional boolean mask of the rows with a value issue,
+        see `value_issues`. Unlike the index of the report, the mask also
+        works for a dataframe with duplicate index labels.
+        """
+        _, errors, invalid = ABFileImporter.value_masks(data, scenario_names)
+        return (errors | invalid).any(axis=1)
+
+    @staticmethod
+    def production_issues(data: pd.DataFrame, scenario_names: list) -> pd.DataFrame:
+        """Report the production exchanges with a value of 0 in a scenario."""
+        values = data.loc[:, scenario_names].apply(pd.to_numeric, errors="coerce")
+        production = (data.loc[:, "flow type"] == "production").to_numpy()
+        mask = (values.to_numpy() == 0) & production[:, np.newaxis]
+        return ABFileImporter.issue_report(data, mask, scenario_names, "zero production")
+
+    @staticmethod
+    def validate(
+        data: pd.DataFrame, fields: list = None, scenario_names: list = None
+    ) -> pd.DataFrame:
+        """Run all of the checks over the dataframe in one pass and return a
+        single report frame with every problem found, see `issue_report`.
+        An empty report means the data is valid.
+        """
+        if fields is None:
+            fields = list(ABFileImporter.ABScenarioColumnsErrorIfNA)
+        if scenario_names is None:
+            scenario_names = ABFileImporter.scenario_names(data)
+        return pd.concat(
+            [
+                ABFileImporter.database_issues(data),
+                ABFileImporter.na_issues(data, list(fields) + list(scenario_names)),
+                ABFileImporter.production_issues(data, scenario_names),
+                ABFileImporter.value_issues(data, scenario_names),
+            ]
+        )
+
+    @staticmethod
+    def raise_for_issues(report: pd.DataFrame) -> None:
+        """Log every issue in the report and raise the error of the first."""
+        if report.empty:
+            return
+        for issue, issues in report.groupby("issue", sort=False):
+            first = issues.iloc[0]
+            log.error(
+                "{} exchange(s) with a {} in the scenario file, the first is the "
+                "exchange between activity {} and {} ({})".format(
+                    len(issues),
+                    issue,
+                    first["from activity name"],
+                    first["to activity name"],
+                    first["column"],
+                )
+            )
+        issue = report["issue"].iat[0]
+        raise ABFileImporter.ABIssueErrors[issue](
+            "Invalid scenario file: {} found".format(issue)
+        )
+
     @staticmethod
     def database_and_key_check(data: pd.DataFrame) -> None:
         """Will check the values in the 'xxxx database' and the 'xxxx key' fields.
@@ -56,26 +201,7 @@ class ABFileImporter(ABC):
         The source and destination keys are provided for the first exchange where
         this error occurs.
         """
-        try:
-            for ds in zip(
-                data["from database"],
-                data["from key"],
-                data["to database"],
-                data["to key"],
-                data["from activity name"],
-                data["to activity name"],
-            ):
-                if (
-                    ds[0] != ds[1].split(",")[0][2:-1]
-                    or ds[2] != ds[3].split(",")[0][2:-1]
-                ):
-                    msg = "Error in importing file with activity {} and {}".format(
-                        ds[4], ds[5]
-                    )
-                    raise IncompatibleDatabaseNamingError()
-        except IncompatibleDatabaseNamingError as e:
-            log.error(msg)
-            raise e
+        ABFileImporter.raise_for_issues(ABFileImporter.database_issues(data))
 
     @staticmethod
     def production_process_check(data: pd.DataFrame, scenario_names: list) -> None:
@@ -84,49 +210,18 @@ class ABFileImporter(ABC):
         ActivityProductionValueError is thrown with the source and destination activity names of the
         exchanges being provided
         """
-        failed = pd.DataFrame({})
-        try:
-            for scenario in scenario_names:
-                failed = pd.concat(
-                    [
-                        data.loc[
-                            (data.loc[:, "flow type"] == "production")
-                            & (data.loc[:, scenario] == 0.0)
-                        ],
-                        failed,
-                    ]
-                )
-            if not failed.empty:
-                msg = "Error with the production value in the exchange between activity {} and {}".format(
-                    failed["from activity name"], failed["to activity name"]
-                )
-                raise ActivityProductionValueError()
-        except ActivityProductionValueError as e:
-            log.error(msg)
-            raise e
+        ABFileImporter.raise_for_issues(
+            ABFileImporter.production_issues(data, scenario_names)
+        )
 
     @staticmethod
     def na_value_check(data: pd.DataFrame, fields: list) -> None:
         """Runs checks on the dataframe to ensure that those fields specified by the field argument do not
         contain NaNs.
-        If an NaN is discovered an InvalidSDFEntryValue Error is thrown that contains two lists:
-        The first contains the list of the source activity names, the second the destination activity names
-        of the exchange
+        If an NaN is discovered an InvalidSDFEntryValue Error is thrown, the source and destination
+        activity names of the exchanges are logged
         """
-        hasNA = pd.DataFrame({})
-        try:
-            for field in fields:
-                hasNA = pd.concat([data.loc[data[field].isna()], hasNA])
-            if not hasNA.empty:
-                msg = (
-                    "Error with NA's in the exchange between activity {} and {}".format(
-                        hasNA["from activity name"], hasNA["to activity name"]
-                    )
-                )
-                raise InvalidSDFEntryValue()
-        except InvalidSDFEntryValue as e:
-            log.error(msg)
-            raise e
+        ABFileImporter.raise_for_issues(ABFileImporter.na_issues(data, fields))
 
     @staticmethod
     def check_for_calculation_errors(data: pd.DataFrame) -> None:
@@ -134,18 +229,8 @@ class ABFileImporter(ABC):
         Will check for calculation errors in the scenario exchanges columns indicate the first elements in the
         scenario difference file that contain an ERROR value (only deals with divide by zero and NaN manipulations).
         """
-        scen_cols = set(data.columns).difference(
-            ABFileImporter.ABStandardProcessColumns.union(
-                ABFileImporter.ABStandardBiosphereColumns
-            )
-        )
-        for scen in scen_cols:
-            error = data.loc[(data[scen] == "#DIV/0!") | (data[scen] == "#VALUE!")]
-            if not error.empty:
-                msg = "Error with values for the exchanges between {} and {}".format(
-                    data.loc[0, "from activity name"], data.loc[0, "to activity name"]
-                )
-                raise ExchangeErrorValues(msg)
+        report = ABFileImporter.value_issues(data, ABFileImporter.scenario_names(data))
+        ABFileImporter.raise_for_issues(report[report["issue"] == "calculation error"])
 
     @staticmethod
     def fill_nas(data: pd.DataFrame) -> pd.DataFrame:
@@ -179,11 +264,20 @@ class ABFileImporter(ABC):
         if scenario_names == None:
             scenario_names = ABFeatherImporter.scenario_names(data)
         ABFileImporter.fill_nas(data)
-        ABFileImporter.database_and_key_check(data)
-        # Check all following uses of fields has the same requirements
-        ABFileImporter.na_value_check(data, list(fields) + scenario_names)
-        ABFileImporter.production_process_check(data, scenario_names)
-        ABFileImporter.check_for_calculation_errors(data)
+        report = ABFileImporter.validate(data, list(fields), scenario_names)
+        ABFileImporter.raise_for_issues(report)
+
+    @staticmethod
+    def column_dtypes(columns: pd.Index) -> dict:
+        """Return explicit dtypes for the exchange fields of a scenario file,
+        these are read as strings. The dtypes of the other (scenario) columns
+        are inferred, so that columns holding text are read as they are and
+        can be reported by the scenario checks.
+        """
+        fields = ABFileImporter.ABStandardProcessColumns.union(
+            ABFileImporter.ABStandardBiosphereColumns
+        )
+        return {c: object for c in columns if c in fields}
 
     @staticmethod
     def scenario_names(data: pd.DataFrame) -> list:
@@ -202,29 +296,78 @@ class ABFeatherImporter(ABFileImporter):
 
     @staticmethod
     def read_file(path: Optional[Union[str, Path]], **kwargs):
+        """Read a scenario file stored in the feather format.
+
+        Passing `downcast=True` stores the scenario columns as float32.
+        """
         df = pd.read_feather(path)
-        # ... execute code
-        df.loc[:, "from key"] = df.loc[:, "from key"].apply(tuple)
-        df.loc[:, "to key"] = df.loc[:, "to key"].apply(tuple)
+        for column in ABFileImporter.ABKeyColumns:
+            keys = df[column].to_numpy()
+            try:
+                keys = np.stack(keys).astype(object)
+                df[column] = pd.Series(list(zip(*keys.T)), index=df.index)
+            except ValueError:
+                # Keys of different lengths
+                df[column] = pd.Series(list(map(tuple, keys)), index=df.index)
+        if kwargs.get("downcast", False):
+            df = downcast_scenario_values(df)
         return df
 
 
 class ABCSVImporter(ABFileImporter):
+    """Reads (compressed) csv scenario files in chunks of `CHUNKSIZE` rows
+    with explicit dtypes for the exchange fields, keeping the memory used
+    while reading close to the size of the resulting dataframe.
+    """
+
+    CHUNKSIZE = 100_000
+
     def __init__(self):
         super(ABCSVImporter, self).__init__(self)
 
     @staticmethod
     def read_file(path: Optional[Union[str, Path]], **kwargs):
-        if "separator" in kwargs:
-            separator = kwargs["separator"]
-        else:
-            separator = ";"
-        df = pd.read_csv(
-            path,
-            compression="infer",
-            sep=separator,
-            index_col=False,
-            converters={"from key": ast.literal_eval, "to key": ast.literal_eval},
-        )
-        # ... execute code
-        return df
+        """Read a csv scenario file.
+
+        Keyword arguments
+        -----------------
+        separator: the field separator, ';' by default
+        progress: a callable receiving the percentage of the file read after
+            every chunk
+        downcast: store the scenario columns as float32, False by default
+        """
+        separator = kwargs.get("separator", ";")
+        progress: Optional[Callable[[int], None]] = kwargs.get("progress")
+        downcast = kwargs.get("downcast", False)
+        path = Path(path)
+        # All suffixes count, e.g. '.tar.gz' is a tar archive
+        compression = infer_compression(str(path), "infer")
+        size = max(path.stat().st_size, 1)
+
+        columns = pd.read_csv(
+            path, compression=compression, sep=separator, index_col=False, nrows=0
+        ).columns
+        dtypes = ABFileImporter.column_dtypes(columns)
+
+        chunks = []
+        with open(path, "rb") as handle:
+            reader = pd.read_csv(
+                handle,
+                compression=compression,
+                sep=separator,
+                index_col=False,
+                dtype=dtypes,
+                chunksize=ABCSVImporter.CHUNKSIZE,
+            )
+            with reader:
+                for chunk in reader:
+                    for column in columns.intersection(ABFileImporter.ABKeyColumns):
+                        chunk[column] = parse_tuple_strings(chunk[column])
+                    if downcast:
+                        chunk = downcast_scenario_values(chunk)
+                    chunks.append(chunk)
+                    if progress is not None:
+                        progress(min(100, int(100 * handle.tell() / size)))
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(chunks, ignore_index=True, copy=False)
@@ -4,7 +4,6 @@ from typing import List, Optional, Union
 
 import numpy as np
 import pandas as pd
-from pandas.api.types import is_numeric_dtype
 from PySide2.QtCore import Qt
 from PySide2.QtWidgets import QApplication, QPushButton
 
@@ -20,9 +19,15 @@ from ..errors import (
     UnalignableScenarioColumnsWarning,
 )
 from .activities import fill_df_keys_with_fields, get_activities_from_keys
-from .dataframe import scenario_columns
+from .dataframe import scenario_columns, scenario_dtype
 from .file_dialogs import ABPopup
-from .utils import SUPERSTRUCTURE, _time_it_, guess_flow_type
+from .file_imports import ABFileImporter
+from .utils import (
+    SUPERSTRUCTURE,
+    _time_it_,
+    edit_superstructure_for_string,
+    guess_flow_type,
+)
 
 EXCHANGE_KEYS = pd.Index(["from key", "to key"])
 INDEX_KEYS = pd.Index(["from key", "to key", "flow type"])
@@ -72,7 +77,9 @@ class SuperstructureManager(object):
             cols = scenario_columns(df)
             SuperstructureManager.check_scenario_exchange_values(df, cols)
             df = SuperstructureManager.merge_flows_to_self(df)
-            return pd.DataFrame(data=df.loc[:, cols], index=df.index, columns=cols)
+            return self.downcast_combined(
+                pd.DataFrame(data=df.loc[:, cols], index=df.index, columns=cols)
+            )
         combo_idx = self._combine_indexes()
 
         if kind == "product":
@@ -93,7 +100,18 @@ class SuperstructureManager(object):
         else:
             df = pd.DataFrame([], index=combo_idx)
         cols = scenario_columns(df)
-        return pd.DataFrame(data=df.loc[:, cols], index=df.index, columns=cols)
+        return self.downcast_combined(
+            pd.DataFrame(data=df.loc[:, cols], index=df.index, columns=cols)
+        )
+
+    def downcast_combined(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Store the combined scenario values as float32 if all of the frames
+        were read with `downcast`. The combinations are built as objects or
+        float64, which would otherwise double the memory used again.
+        """
+        if scenario_dtype(*self.frames) == np.float32:
+            return df.astype(np.float32)
+        return df
 
     def _combine_columns(self) -> pd.MultiIndex:
         """
@@ -277,15 +295,9 @@ class SuperstructureManager(object):
         -------
         A pandas dataframe with the changes made to the scenario dataframe for these self referential flows
         """
-        self_referential_production_flows = df.loc[
-            df.apply(
-                lambda x: True
-                if x["from key"] == x["to key"] and x["flow type"] == "technosphere"
-                else False,
-                axis=1,
-            ),
-            :,
-        ].copy()
+        to_self = df.loc[:, "from key"].to_numpy() == df.loc[:, "to key"].to_numpy()
+        technosphere = (df.loc[:, "flow type"] == "technosphere").to_numpy()
+        self_referential_production_flows = df.loc[to_self & technosphere, :].copy()
         self_referential_production_flows.index = pd.MultiIndex.from_arrays(
             [
                 self_referential_production_flows.index.get_level_values(0),
@@ -490,15 +502,14 @@ class SuperstructureManager(object):
         cols: a pandas index that indicates the scenario columns holding the 'amounts' to be used in the scenario
         calculations
         """
-        _df = df.copy()
         assert len(cols) > 0
-        nas = _df.loc[:, cols].isna()
-        if nas.all(axis=0).all():
+        nas = df.loc[:, cols].isna().to_numpy()
+        if nas.all():
             msg = (
                 "<p>No exchange values could be observed in the last loaded scenario file. "
                 + "Exchange values must be recorded in a labelled scenario column with a name distinguishable from the"
                 + " default (required) columns, which are:</p>"
-                + SuperstructureManager.edit_superstructure_for_string()
+                + edit_superstructure_for_string()
                 + "<p>Please check the file contents for the scenario columns and the exchange amounts before loading again.</p>"
             )
             critical = ABPopup.abCritical(
@@ -506,18 +517,12 @@ class SuperstructureManager(object):
             )
             critical.exec_()
             raise ScenarioExchangeDataNotFoundError
-        elif nas.any(axis=0).any():
+        elif nas.any():
             log.warning(
                 "Replacing empty values from the last loaded scenario difference file"
             )
-        if not is_numeric_dtype(np.array(_df.loc[:, cols])):
-            # converting to numeric only works on lists and with the coercive option
-            # any errors convert to np.nan and can then only be excluded if previous
-            # NaNs are masked by conversion to numeric values
-            _df.loc[:, cols].fillna(0, inplace=True)
-            bad_entries = pd.DataFrame(index=_df.index)
-            for col in cols:
-                bad_entries[col] = pd.to_numeric(df.loc[:, col], errors="coerce")
+        bad_entries = ABFileImporter.value_issue_rows(df, cols)
+        if bad_entries.any():
             msg = (
                 "<p>Non-numeric data is present in the scenario exchange columns.</p><p> The Activity-Browser can "
                 "only deal with numeric data for the calculations. To resolve this corrections will need to be made "
@@ -530,9 +535,9 @@ class SuperstructureManager(object):
                 QPushButton("Cancel"),
             )
             QApplication.restoreOverrideCursor()
-            critical.dataframe(df[bad_entries.isna().any(axis=1)], SUPERSTRUCTURE)
+            critical.dataframe(df[bad_entries], SUPERSTRUCTURE)
             critical.save_options()
-            critical.dataframe_to_file(df, bad_entries.isna().any(axis=1))
+            critical.dataframe_to_file(df, bad_entries)
             critical.exec_()
             raise ScenarioExchangeDataNonNumericError()
 
@@ -1,16 +1,19 @@
 # -*- coding: utf-8 -*-
+import hashlib
 from typing import Iterable, Optional
 
 import numpy as np
 import pandas as pd
 from PySide2.QtWidgets import QPushButton
+from scipy import sparse
 
 from activity_browser.mod import bw2data as bd
 
 from ..commontasks import format_activity_label
 from ..errors import ScenarioExchangeNotFoundError
-from ..multilca import MLCA, Contributions
+from ..multilca import MLCA, ContributionCube, Contributions, TraversalLCA
 from ..utils import Index
+from ..workers import calculate_scenarios, process_pool
 from .dataframe import (
     arrays_from_indexed_superstructure,
     filter_databases_indexed_superstructure,
@@ -18,15 +21,15 @@ from .dataframe import (
 )
 from .file_dialogs import ABPopup
 
-try:
-    from bw2calc.matrices import TechnosphereBiosphereMatrixBuilder as MB
-except ModuleNotFoundError:
-    pass  # removed in bw25
-
 
 class SuperstructureMLCA(MLCA):
     """Subclass of the `MLCA` class which adds another dimension in the form
     of scenarios.
+
+    Scenarios are calculated one after another by default. Passing
+    ``workers`` > 1 splits the scenarios over that many worker processes,
+    each of which patches, factorizes and solves its own copy of the
+    matrices and only sends the resulting arrays back.
     """
 
     matrices = {
@@ -35,17 +38,19 @@ class SuperstructureMLCA(MLCA):
         "production": "technosphere_matrix",
     }
 
-    def __init__(self, cs_name: str, df: pd.DataFrame):
-        assert isinstance(df, pd.DataFrame), (
-            "Check if you have provided at least 1 reference flow, 1 impact category "
-            "and 1 scenario file. "
-        )
-        assert not df.empty, "Cannot run analysis without data."
-        self.scenario_names = scenario_names_from_df(df)
+    def __init__(
+        self,
+        cs_name: str,
+        df: pd.DataFrame,
+        batch_solve: bool = True,
+        batch_lcia: bool = True,
+        workers: int = 1,
+    ):
+        self.scenario_names = self.check_data(df)
         self.total = len(self.scenario_names)
-        assert self.total > 0, "Cannot run analysis without scenarios"
 
-        super().__init__(cs_name)
+        super().__init__(cs_name, batch_solve=batch_solve, batch_lcia=batch_lcia)
+        self.workers = workers
 
         # Scenarios overwrite the lca.xxx_matrix. For supporting absent values
         # in scenario files defaults are required, to prevent these from being
@@ -80,16 +85,19 @@ class SuperstructureMLCA(MLCA):
             ],
         )
         self.indices_to_matrix()
+        self.prepare_scenario_slots()
 
         # Construct an index dictionary similar to fu_index and method_index
         self._current_index = 0
+        # The scenario applied to the matrices of the LCA object, if any
+        self._matrices_scenario = None
         self.scenario_index = {k: i for i, k in enumerate(self.scenario_names)}
 
         # Rebuild numpy arrays with scenario dimension included.
         self.lca_scores = np.zeros(
             (len(self.func_units), len(self.methods), self.total)
         )
-        self.elementary_flow_contributions = np.zeros(
+        self.elementary_flow_contributions = ContributionCube(
             (
                 len(self.func_units),
                 len(self.methods),
@@ -97,7 +105,7 @@ class SuperstructureMLCA(MLCA):
                 self.lca.biosphere_matrix.shape[0],
             )
         )
-        self.process_contributions = np.zeros(
+        self.process_contributions = ContributionCube(
             (
                 len(self.func_units),
                 len(self.methods),
@@ -120,11 +128,19 @@ class SuperstructureMLCA(MLCA):
         self.current += 1
 
     def set_scenario(self, index: int) -> None:
-        """Set the current scenario index given a new index to go to"""
-        steps = self._get_steps_to_index(index)
-        # self.current = steps[-1] + 1  # Walk the steps to the new index
-        for _ in steps:
-            self.next_scenario()
+        """Set the current scenario index and apply that scenario to the
+        matrices, unless they already hold it.
+
+        The matrices are patched once, straight to the given scenario, the
+        technosphere matrix is only factorized again when it is next solved.
+        """
+        if index < 0:
+            raise ValueError("Negative indexes are not allowed")
+        elif index >= self.total:
+            raise ValueError("Given index is not possible for current scenario dataset")
+        self.current = index
+        if self._matrices_scenario != index:
+            self.update_matrices()
 
     def indices_to_matrix(self) -> None:
         def convert(idx: Index) -> tuple:
@@ -162,66 +178,182 @@ class SuperstructureMLCA(MLCA):
             except Exception as e:
                 continue
 
+    def prepare_scenario_slots(self) -> None:
+        """Resolve once where the scenario exchanges are stored in the `data`
+        arrays of the matrices of the LCA object, so a scenario is applied
+        with a single write per matrix.
+
+        Exchanges that are not in a matrix yet are added as explicit zeros.
+        The values that replace absent scenario values (the defaults from
+        the databases) and the signs of the exchanges are prepared as well.
+        """
+        self.exchange_types = np.array([idx[2] for idx in self.indices])
+        self.scenario_slots = {}
+        for name in set(self.matrices.values()):
+            mask = np.isin(
+                self.exchange_types, [k for k, m in self.matrices.items() if m == name]
+            )
+            matrix = getattr(self.lca, name, None)
+            if matrix is None or not mask.any():
+                # This LCA doesn't have this matrix
+                continue
+            idx = self.matrix_indices[mask]
+            matrix, slots = matrix_slots(matrix, idx["row"], idx["col"])
+            setattr(self.lca, name, matrix)
+            self.scenario_slots[name] = (mask, slots)
+
+        self.scenario_defaults = np.zeros(len(self.indices))
+        for kind, default in self.defaults.items():
+            mask = self.exchange_types == kind
+            if mask.any():
+                idx = self.matrix_indices[mask]
+                matrix = getattr(self, default)
+                self.scenario_defaults[mask] = np.asarray(
+                    matrix[idx["row"], idx["col"]]
+                ).ravel()
+        # Technosphere inputs are stored as negative values in the matrix
+        self.scenario_signs = np.where(
+            (self.exchange_types == "technosphere") & (self.matrix_indices["type"] == 1),
+            -1.0,
+            1.0,
+        )
+
+    def scenario_values(self, scenarios) -> np.ndarray:
+        """Return the matrix values of the scenario exchanges for the given
+        scenario(s), with the defaults from the databases for absent values.
+        """
+        values = self.values[:, scenarios]
+        signs, defaults = self.scenario_signs, self.scenario_defaults
+        if values.ndim == 2:
+            signs, defaults = signs[:, np.newaxis], defaults[:, np.newaxis]
+        return np.where(np.isnan(values), defaults, values * signs)
+
     def update_matrices(self) -> None:
         """A Simplified version of the `PackagesDataLoader.update_matrices` method.
         In this case, we expect to only replace technosphere and biosphere
         values, leaving out characterization factor values.
-        """
-        kinds = set([idx[2] for idx in self.indices])
-        types = np.array([idx[2] for idx in self.indices])
-        for kind in kinds:
-            idx = self.matrix_indices[types == kind]
-            sample = self.values[types == kind, self.current]
-            # Previously filtered sample and idx for NaN values in samples.
-            # Currently replaces sample NaN values with defaults from the databases
-            if np.isnan(sample).any():
-                default = getattr(self, self.defaults[kind])
-                na_idx = idx[np.isnan(sample)]
-                if kind == "technosphere":
-                    sample[np.isnan(sample)] = np.multiply(
-                        default[na_idx["row"], na_idx["col"]].tolist()[0], -1
-                    )
-                else:
-                    sample[np.isnan(sample)] = default[
-                        na_idx["row"], na_idx["col"]
-                    ].tolist()[0]
-            try:
-                matrix = getattr(self.lca, self.matrices[kind])
-            except AttributeError:
-                # This LCA doesn't have this matrix
-                continue
 
-            if self.matrices[kind] == "technosphere_matrix":
+        The values of the current scenario are written straight into the
+        `data` arrays of the matrices, see `prepare_scenario_slots`.
+        """
+        values = self.scenario_values(self.current)
+        for name, (mask, slots) in self.scenario_slots.items():
+            if name == "technosphere_matrix" and hasattr(self.lca, "solver"):
                 # Remove existing matrix factorization
                 # because changing technosphere
-                if hasattr(self.lca, "solver"):
-                    delattr(self.lca, "solver")
+                delattr(self.lca, "solver")
+            getattr(self.lca, name).data[slots] = values[mask]
+        self._matrices_scenario = self.current
 
-            # TODO: Check if this doesnt break stuff
-            # TODO: Update: It does..
-            try:
-                if kind == "technosphere":
-                    MB.fix_supply_use(idx, sample)
-            except:
-                # removed in BW25
-                mask = np.where(idx["type"] == 1)
-                sample[mask] = -1 * sample[mask]
-            matrix[
-                idx["row"],
-                idx["col"],
-            ] = sample
+    def scenario_matrix(self, name: str, scenario: int):
+        """Return a copy of a matrix of the LCA object with the exchanges of
+        the given scenario applied.
+        """
+        matrix = getattr(self.lca, name).copy()
+        if name in self.scenario_slots:
+            mask, slots = self.scenario_slots[name]
+            matrix.data[slots] = self.scenario_values(scenario)[mask]
+        return matrix
+
+    def scenario_biosphere_matrix(self, scenario: int):
+        """Return a copy of the biosphere matrix with the biosphere exchanges
+        of the given scenario applied.
+        """
+        return self.scenario_matrix("biosphere_matrix", scenario)
+
+    def build_inventory(self, key: tuple):
+        """Rebuild the inventory matrix of a reference flow and scenario from
+        its scaling factors and the biosphere matrix of that scenario.
+        """
+        biosphere = self.scenario_biosphere_matrix(key[1])
+        return biosphere @ sparse.diags(self.scaling_factors[key])
+
+    def _inventory_key(self, index: tuple) -> tuple:
+        return str(self.func_units[index[0]]), index[2]
+
+    def _perform_parallel_calculations(self):
+        """Split the scenarios over worker processes and collect the results
+        in the same structures as `_perform_calculations`.
+
+        The workers get the matrices of the LCA object with the positions
+        of the scenario exchanges in their `data` arrays (see
+        `prepare_scenario_slots`) and the values of their scenarios. Only
+        the scores, contributions and supply arrays come back, the
+        technosphere flows and inventories are derived from the supply
+        arrays here.
+        """
+        empty = (np.zeros(len(self.indices), dtype=bool), np.empty(0, dtype=np.int64))
+        tech_mask, tech_slots = self.scenario_slots.get("technosphere_matrix", empty)
+        bio_mask, bio_slots = self.scenario_slots.get("biosphere_matrix", empty)
+        demand = self.demand_matrix()
+        blocks = np.array_split(np.arange(self.total), min(self.workers, self.total))
+
+        with process_pool(len(blocks)) as executor:
+            futures = []
+            for columns in blocks:
+                values = self.scenario_values(columns)
+                futures.append(
+                    executor.submit(
+                        calculate_scenarios,
+                        self.lca.technosphere_matrix,
+                        self.lca.biosphere_matrix,
+                        tech_slots,
+                        values[tech_mask],
+                        bio_slots,
+                        values[bio_mask],
+                        demand,
+                        self.cf_vectors,
+                        self.process_contributions.threshold,
+                    )
+                )
+            for columns, future in zip(blocks, futures):
+                scores, ef, pc, supply = future.result()
+                self.lca_scores[:, :, columns] = scores
+                self.elementary_flow_contributions.set_arrays(
+                    (slice(None), slice(None), columns), **ef
+                )
+                self.process_contributions.set_arrays(
+                    (slice(None), slice(None), columns), **pc
+                )
+                for i, ps_col in enumerate(columns):
+                    technosphere = self.scenario_matrix("technosphere_matrix", ps_col)
+                    diagonal = technosphere.diagonal()
+                    inventory = self.scenario_biosphere_matrix(ps_col) @ supply[:, :, i]
+                    for row, func_unit in enumerate(self.func_units):
+                        key = (str(func_unit), int(ps_col))
+                        self.scaling_factors[key] = supply[:, row, i]
+                        self.technosphere_flows[key] = supply[:, row, i] * diagonal
+                        self.inventory[key] = inventory[:, row]
+
+        # Leave the LCA object in the state of the current scenario.
+        self.update_matrices()
+
+    def calculate(self):
+        if self.workers > 1 and self.total > 1:
+            self.inventories.clear()
+            self.characterized_inventories.clear()
+            self._perform_parallel_calculations()
+        else:
+            super().calculate()
 
     def _perform_calculations(self):
         """Near copy of `MLCA` class, but includes a loop for all scenarios."""
+        if self.batch_solve:
+            # The demand is identical for every scenario, only the matrices change.
+            demand = self.demand_matrix()
+
         for ps_col in range(self.total):
             self.next_scenario()
+            if self.batch_solve:
+                supply = self.solve_demand_matrix(demand)
+            if self.batch_lcia:
+                # The biosphere matrix may be changed by the scenario
+                cf_biosphere = self.characterized_biosphere()
             for row, func_unit in enumerate(self.func_units):
-                try:
-                    self.lca.redo_lci(func_unit)
-                except:
-                    # bw25 compatibility requires activity id instead of activity key
-                    key = list(func_unit.keys())[0]
-                    self.lca.redo_lci({bd.get_activity(key).id: func_unit[key]})
+                if self.batch_solve:
+                    self._load_supply_array(supply[:, row])
+                else:
+                    self._redo_lci(func_unit)
 
                 self.scaling_factors.update(
                     {(str(func_unit), ps_col): self.lca.supply_array}
@@ -241,15 +373,19 @@ class SuperstructureMLCA(MLCA):
                         ).ravel()
                     }
                 )
-                self.inventories.update({(str(func_unit), ps_col): self.lca.inventory})
+
+                if self.batch_lcia:
+                    (
+                        self.lca_scores[row, :, ps_col],
+                        self.elementary_flow_contributions[row, :, ps_col],
+                        self.process_contributions[row, :, ps_col],
+                    ) = self.batch_lcia_calculation(cf_biosphere)
+                    continue
 
                 for col, cf_matrix in enumerate(self.method_matrices):
                     self.lca.characterization_matrix = cf_matrix
                     self.lca.lcia_calculation()
                     self.lca_scores[row, col, ps_col] = self.lca.score
-                    self.characterized_inventories[
-                        (row, col, ps_col)
-                    ] = self.lca.characterized_inventory.copy()
                     self.elementary_flow_contributions[row, col, ps_col] = np.array(
                         self.lca.characterized_inventory.sum(axis=1)
                     ).ravel()
@@ -257,28 +393,57 @@ class SuperstructureMLCA(MLCA):
                         row, col, ps_col
                     ] = self.lca.characterized_inventory.sum(axis=0)
 
-    def update_lca_calculation_for_sankey(
-        self, scenario_index: int, func_unit: str, method_index: int
-    ):
+    def traversal_lca(
+        self, func_unit_index: int, method_index: int, scenario_index: int = 0
+    ) -> TraversalLCA:
+        """Return the LCA of a single reference flow, impact category and
+        scenario for graph traversal.
+
+        The scenario is applied to the matrices of the LCA object, the
+        returned object holds copies of them so it is not affected when
+        another scenario is applied (e.g. while it is traversed in a thread).
         """
-        Reuses the LCA object to prepare the LCA object for necessary calculations to be made before performing the
-        Graph Traversal calculations
+        self.set_scenario(scenario_index)
+        lca = super().traversal_lca(func_unit_index, method_index)
+        lca.technosphere_matrix = lca.technosphere_matrix.copy()
+        lca.biosphere_matrix = lca.biosphere_matrix.copy()
+        return lca
 
-        @param scenario_index: Index of the Scenario for which the calculation must be performed
-        @param func_unit: The functional unit for which the calculation must be performed
-        @param method_index: Index of the method for which the calculation must be performed
+    def result_keys(self) -> list:
+        return [
+            (str(fu), ps_col) for ps_col in range(self.total) for fu in self.func_units
+        ]
+
+    @staticmethod
+    def check_data(df: pd.DataFrame) -> list:
+        """Check that there is scenario data to calculate, returns the names
+        of the scenarios.
         """
-        self.current = scenario_index
+        assert isinstance(df, pd.DataFrame), (
+            "Check if you have provided at least 1 reference flow, 1 impact category "
+            "and 1 scenario file. "
+        )
+        assert not df.empty, "Cannot run analysis without data."
+        scenario_names = scenario_names_from_df(df)
+        assert len(scenario_names) > 0, "Cannot run analysis without scenarios"
+        return scenario_names
+
+    @classmethod
+    def fingerprint(cls, cs_name: str, df: pd.DataFrame) -> str:
+        """Extends the fingerprint of the parent with the scenario data."""
+        cls.check_data(df)
+        digest = hashlib.sha256(super().fingerprint(cs_name).encode())
+        digest.update(repr((list(df.columns), df.index.to_list())).encode())
+        # Column by column, the values may be memory-mapped
+        for j in range(df.shape[1]):
+            values = df.iloc[:, j].to_numpy(dtype=np.float64)
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()
+
+    def load_result_arrays(self, arrays: dict) -> None:
+        super().load_result_arrays(arrays)
+        # Leave the LCA object in the state of the current scenario.
         self.update_matrices()
-        try:
-            self.lca.redo_lci(func_unit)
-        except:
-            # brightway25 compatibility
-            key = list(func_unit.keys())[0]
-            self.lca.redo_lci({bd.get_activity(key).id: func_unit[key]})
-        self.lca.characterization_matrix = self.method_matrices[method_index]
-        self.lca.lcia_calculation()
-        self.lca.decompose_technosphere()
 
     def get_results_for_method(self, index: int = 0) -> pd.DataFrame:
         """Overrides the parent and returns a dataframe with the scenarios
@@ -287,23 +452,6 @@ class SuperstructureMLCA(MLCA):
         data = self.lca_scores[:, index, :]
         return pd.DataFrame(data, index=self.func_key_list, columns=self.scenario_names)
 
-    def _get_steps_to_index(self, index: int) -> list:
-        """Determine how many steps to take when given the index we want
-         to land on.
-
-        We can only iterate through the presample arrays in one direction, so
-         if we go from 2 to 1 we need to calculate the amount of steps to loop
-         around to 1.
-        """
-        if index < 0:
-            raise ValueError("Negative indexes are not allowed")
-        elif index >= self.total:
-            raise ValueError("Given index is not possible for current scenario dataset")
-        if index < self.current:
-            return [*range(self.current, self.total), *range(index)]
-        else:
-            return list(range(self.current, index))
-
     def lca_scores_to_dataframe(self) -> pd.DataFrame:
         """Returns a dataframe of LCA scores using FU labels as index and
         the product of methods and scenarios as columns.
@@ -325,6 +473,39 @@ class SuperstructureMLCA(MLCA):
         return df
 
 
+def matrix_slots(
+    matrix: sparse.spmatrix, rows: np.ndarray, cols: np.ndarray
+) -> (sparse.csr_matrix, np.ndarray):
+    """Return the matrix in canonical CSR format with an entry (an explicit
+    zero where needed) for every (row, col) pair, and the positions of those
+    entries in the `data` array of the matrix.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    matrix.sum_duplicates()
+    n = matrix.shape[1]
+    wanted = rows.astype(np.int64) * n + cols.astype(np.int64)
+
+    def entry_keys(m: sparse.csr_matrix) -> np.ndarray:
+        rows = np.repeat(np.arange(m.shape[0], dtype=np.int64), np.diff(m.indptr))
+        return rows * n + m.indices
+
+    missing = np.setdiff1d(wanted, entry_keys(matrix))
+    if len(missing):
+        coo = matrix.tocoo()
+        matrix = sparse.csr_matrix(
+            (
+                np.concatenate([coo.data, np.zeros(len(missing))]),
+                (
+                    np.concatenate([coo.row, missing // n]),
+                    np.concatenate([coo.col, missing % n]),
+                ),
+            ),
+            shape=matrix.shape,
+        )
+        matrix.sum_duplicates()
+    return matrix, np.searchsorted(entry_keys(matrix), wanted)
+
+
 class SuperstructureContributions(Contributions):
     mlca: SuperstructureMLCA
 
@@ -348,14 +529,15 @@ class SuperstructureContributions(Contributions):
         return self._build_lca_scores_df(scores)
 
     def _build_contributions(
-        self, data: np.ndarray, index: int, axis: int
+        self, data: ContributionCube, index: int, axis: int
     ) -> np.ndarray:
-        data = data[:, :, self.mlca.current]
-        return super()._build_contributions(data, index, axis)
+        selection = [slice(None), slice(None), self.mlca.current]
+        selection[axis] = index
+        return data[tuple(selection)]
 
     @staticmethod
     def _build_scenario_contributions(
-        data: np.ndarray, fu_index: int, m_index: int
+        data: ContributionCube, fu_index: int, m_index: int
     ) -> np.ndarray:
         return data[fu_index, m_index, :]
 
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import weakref
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from activity_browser import log
+
+from ..errors import WrongFileTypeImportError
+from .dataframe import scenario_columns, scenario_dtype
+from .utils import SUPERSTRUCTURE
+
+
+class ScenarioPackage(object):
+    """A scenario difference file stored in the binary AB scenario package
+    format (.absp).
+
+    The file holds the exchange index table (the superstructure columns,
+    stored column-wise as json) and the scenario values as a column-major
+    float64 array (float32 if they were read with `downcast`), followed by
+    a json header. The values are opened
+    memory-mapped, so a single scenario (column) is read from disk without
+    loading the others.
+
+    The sha256 digest of the index table and the values is stored in the
+    header when the package is written. When it still matches on opening,
+    the package holds exactly the data that passed the scenario checks
+    before it was saved, so the checks can be skipped.
+    """
+
+    SUFFIX = ".absp"
+    MAGIC = b"ABSCNPKG"
+    VERSION = 1
+    # magic, version, header offset, header length
+    PREAMBLE = struct.Struct("<8sIQQ")
+    ALIGNMENT = 64
+    BLOCKSIZE = 2**24
+    TUPLE_COLUMNS = ["from categories", "from key", "to categories", "to key"]
+    DTYPES = {"<f8", "<f4"}
+    # Windows cannot replace a file that is memory-mapped, open packages at
+    # the path are closed first
+    CLOSE_BEFORE_REPLACE = os.name == "nt"
+    _open: "weakref.WeakSet[ScenarioPackage]" = weakref.WeakSet()
+
+    def __init__(self, path: Union[str, Path], header: dict, index: pd.DataFrame):
+        self.path = Path(path)
+        self.header = header
+        self.index = index
+        self.scenarios: List[str] = header["scenarios"]
+        offset, _ = header["values"]
+        self.values = np.memmap(
+            self.path,
+            dtype=header.get("dtype", "<f8"),
+            mode="r",
+            offset=offset,
+            shape=(header["rows"], len(self.scenarios)),
+            order="F",
+        )
+        self._open.add(self)
+
+    def close(self) -> None:
+        """Copy the values into memory and drop the memory-map, so that the
+        file can be replaced.
+        """
+        if isinstance(self.values, np.memmap):
+            self.values = np.array(self.values)
+        self._open.discard(self)
+
+    @classmethod
+    def save(cls, path: Union[str, Path], df: pd.DataFrame) -> "ScenarioPackage":
+        """Write a scenario dataframe in the superstructure format (all of the
+        SUPERSTRUCTURE columns and the scenario columns) to a package.
+
+        The package is written to a temporary file next to `path` which then
+        replaces it, so that an existing (memory-mapped) package at `path` is
+        never truncated. On Windows the open packages at `path` are closed
+        before it is replaced.
+
+        The values are stored as float32 if all of the scenario columns are
+        float32, see `scenario_dtype`.
+        """
+        if df.empty:
+            raise ValueError("Cannot write an empty scenario package.")
+        scenarios = scenario_columns(df)
+        index = json.dumps(
+            {c: df[c].tolist() for c in SUPERSTRUCTURE}, default=list
+        ).encode()
+        dtype = scenario_dtype(df).newbyteorder("<")
+        values = df.loc[:, scenarios].to_numpy(dtype=dtype)
+
+        values_offset = cls.PREAMBLE.size + len(index)
+        values_offset += -values_offset % cls.ALIGNMENT
+        header_offset = values_offset + values.nbytes
+        path = Path(path)
+        fd, temp = tempfile.mkstemp(
+            dir=path.parent, prefix=path.name, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                # The preamble is written once the header length is known
+                f.write(bytes(cls.PREAMBLE.size))
+                f.write(index)
+                f.write(bytes(values_offset - f.tell()))
+                digest = hashlib.sha256(index)
+                for j in range(values.shape[1]):
+                    column = np.ascontiguousarray(values[:, j])
+                    digest.update(column)
+                    f.write(column)
+                header = json.dumps(
+                    {
+                        "scenarios": [str(s) for s in scenarios],
+                        "rows": values.shape[0],
+                        "index": [cls.PREAMBLE.size, len(index)],
+                        "values": [values_offset, values.nbytes],
+                        "dtype": dtype.str,
+                        "sha256": digest.hexdigest(),
+                    }
+                ).encode()
+                f.write(header)
+                f.seek(0)
+                f.write(
+                    cls.PREAMBLE.pack(
+                        cls.MAGIC, cls.VERSION, header_offset, len(header)
+                    )
+                )
+            if cls.CLOSE_BEFORE_REPLACE:
+                cls.close_all(path)
+            os.replace(temp, path)
+        except BaseException:
+            Path(temp).unlink(missing_ok=True)
+            raise
+        return cls.open(path)
+
+    @classmethod
+    def close_all(cls, path: Union[str, Path]) -> None:
+        """Close the open packages of the file at `path`."""
+        path = Path(path).resolve()
+        for package in list(cls._open):
+            if package.path.resolve() == path:
+                package.close()
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "ScenarioPackage":
+        """Open a package, the scenario values are memory-mapped."""
+        with open(path, "rb") as f:
+            preamble = f.read(cls.PREAMBLE.size)
+            if len(preamble) != cls.PREAMBLE.size:
+                raise WrongFileTypeImportError(
+                    "Not an AB scenario package: {}".format(path)
+                )
+            magic, version, offset, length = cls.PREAMBLE.unpack(preamble)
+            if magic != cls.MAGIC:
+                raise WrongFileTypeImportError(
+                    "Not an AB scenario package: {}".format(path)
+                )
+            if version != cls.VERSION:
+                raise WrongFileTypeImportError(
+                    "Unsupported scenario package version {}: {}".format(version, path)
+                )
+            try:
+                f.seek(offset)
+                header = json.loads(f.read(length))
+                offset, length = header["index"]
+                f.seek(offset)
+                columns = json.loads(f.read(length))
+            except (ValueError, KeyError) as e:
+                raise WrongFileTypeImportError(
+                    "Damaged scenario package: {}".format(path)
+                ) from e
+        if header.get("dtype", "<f8") not in cls.DTYPES:
+            raise WrongFileTypeImportError(
+                "Unsupported scenario package values {}: {}".format(
+                    header["dtype"], path
+                )
+            )
+        for c in cls.TUPLE_COLUMNS:
+            columns[c] = [tuple(x) if isinstance(x, list) else x for x in columns[c]]
+        index = pd.DataFrame(columns, columns=SUPERSTRUCTURE)
+        return cls(path, header, index)
+
+    def compute_digest(self) -> str:
+        """Return the sha256 digest of the index table and the values as
+        they are stored on disk.
+        """
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as f:
+            for offset, length in (self.header["index"], self.header["values"]):
+                f.seek(offset)
+                while length > 0:
+                    block = f.read(min(length, self.BLOCKSIZE))
+                    if not block:
+                        break
+                    digest.update(block)
+                    length -= len(block)
+        return digest.hexdigest()
+
+    def verify(self) -> bool:
+        """Check whether the package is unchanged since it was written."""
+        valid = self.compute_digest() == self.header["sha256"]
+        if not valid:
+            log.warning(
+                "Integrity check failed for scenario package {}".format(self.path)
+            )
+        return valid
+
+    def exchange_index(self) -> pd.MultiIndex:
+        """The (input, output, flow) index used throughout the scenario code."""
+        return pd.MultiIndex.from_arrays(
+            [
+                pd.Index(self.index["from key"], tupleize_cols=False),
+                pd.Index(self.index["to key"], tupleize_cols=False),
+                self.index["flow type"],
+            ],
+            names=["input", "output", "flow"],
+        )
+
+    def scenario_frame(self) -> pd.DataFrame:
+        """Return the scenario values as a dataframe with the exchange index,
+        backed by the memory-mapped array.
+        """
+        return pd.DataFrame(
+            self.values,
+            index=self.exchange_index(),
+            columns=pd.Index(self.scenarios),
+            copy=False,
+        )
+
+    def dataframe(self) -> pd.DataFrame:
+        """Return the package in the superstructure format, the scenario
+        columns are backed by the memory-mapped array.
+        """
+        index = self.index.set_axis(self.exchange_index(), axis=0)
+        return pd.concat([index, self.scenario_frame()], axis=1, copy=False)
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import time
+from ast import literal_eval
 
+import numpy as np
 import pandas as pd
 
 from activity_browser import log
@@ -27,6 +29,58 @@ SUPERSTRUCTURE = pd.Index(
     ]
 )
 
+# Matches the string representation of a two element key, e.g. "('db', 'code')"
+KEY_PATTERN = (
+    r"""^\(\s*(?:'([^']*)'|"([^"]*)")\s*,\s*(?:'([^']*)'|"([^"]*)")\s*\)$"""
+)
+
+
+def parse_tuple_strings(column: pd.Series) -> pd.Series:
+    """Convert the string representations of keys and categories in a column
+    to tuples.
+
+    Every distinct value is parsed only once, two element keys with a
+    vectorized split. Other values are evaluated as python literals, values
+    which cannot be evaluated (and values which are not strings) are
+    returned as they are.
+    """
+    codes, uniques = pd.factorize(column)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = uniques.copy()
+    is_str = uniques.map(type).eq(str)
+    keys = uniques[is_str].str.extract(KEY_PATTERN)
+    database, code = keys[0].fillna(keys[1]), keys[2].fillna(keys[3])
+    # Escaped characters are left to the literal evaluation
+    split = code.notna() & ~uniques[is_str].str.contains("\\", regex=False)
+    split = split[split].index
+    parsed[split] = pd.Series(
+        list(zip(database[split], code[split])), index=split, dtype=object
+    )
+
+    def evaluate(x):
+        try:
+            return literal_eval(x)
+        except (ValueError, SyntaxError):
+            return x
+
+    rest = is_str[is_str].index.difference(split)
+    parsed[rest] = uniques[rest].map(evaluate)
+    values = parsed.to_numpy().take(codes)
+    values[codes == -1] = np.nan
+    return pd.Series(values, index=column.index, name=column.name, dtype=object)
+
+
+def downcast_scenario_values(df: pd.DataFrame) -> pd.DataFrame:
+    """Return the dataframe with its numeric scenario columns stored as
+    float32, halving the memory used by the scenario values.
+
+    Columns holding text are left as they are, so that the scenario checks
+    can still report them.
+    """
+    numeric = df.select_dtypes("number").columns
+    scenarios = numeric.difference(SUPERSTRUCTURE, sort=False)
+    return df.astype(dict.fromkeys(scenarios, np.float32), copy=False)
+
 
 def edit_superstructure_for_string(
     superstructure=SUPERSTRUCTURE, sep="<br>", fhighlight=""
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""Calculations of the Activity Browser that run in worker processes.
+
+Importing the `activity_browser` package starts the Qt application and
+patches brightway to emit Qt signals, neither of which may happen in a
+worker process. The packages skip this in worker processes, and this module
+imports nothing but numpy, scipy and brightway itself. Its pools start every
+worker as a fresh interpreter ("spawn"), also on platforms where forking the
+running application is the default.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import bw2calc as bc
+import numpy as np
+from bw2data import projects
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, bicgstab, factorized, spsolve
+from stats_arrays import MCRandomNumberGenerator
+
+
+def process_pool(workers: int, **kwargs) -> ProcessPoolExecutor:
+    """Return a pool of `workers` freshly started worker processes."""
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), **kwargs
+    )
+
+
+def open_project(base_dir: Union[str, Path], project: str) -> None:
+    """Open a project of the given brightway directory read-only."""
+    if Path(projects._base_data_dir) != Path(base_dir):
+        projects.change_base_directories(
+            Path(base_dir), project_name=project, update=False
+        )
+    projects.set_current(project, writable=False)
+
+
+class MonteCarloSampler(object):
+    """Samples and solves the Monte Carlo iterations of a number of reference
+    flows and methods, see `MonteCarloLCA` in the Activity Browser.
+
+    Parameterized exchanges are not sampled here, their recalculated
+    amounts are passed to `calculate_chunk` and inserted at the positions
+    given by the `param_plan`.
+    """
+
+    SETTINGS = (
+        "include_technosphere",
+        "include_biosphere",
+        "include_cfs",
+        "solver",
+        "tolerance",
+    )
+
+    def __init__(self, func_units: list, methods: list):
+        self.func_units = func_units
+        self.rev_fu_index = {i: fu for i, fu in enumerate(self.func_units)}
+        self.methods = methods
+        self.rev_method_index = {i: m for i, m in enumerate(self.methods)}
+
+        self.include_technosphere = True
+        self.include_biosphere = True
+        self.include_cfs = True
+        self.param_plan = {}
+        self.solver = "direct"
+        self.tolerance = 1e-6
+        self.preconditioner: Optional[LinearOperator] = None
+        self.warm_starts = {}
+
+        self.cf_params = {}
+        self.cf_rngs = {}
+        self.tech_rng: Optional[Union[MCRandomNumberGenerator, np.ndarray]] = None
+        self.bio_rng: Optional[Union[MCRandomNumberGenerator, np.ndarray]] = None
+
+        self.lca = bc.LCA(demand=self.func_units_dict, method=self.methods[0])
+
+    @property
+    def func_units_dict(self) -> dict:
+        """Return a dictionary of reference flows (key, demand)."""
+        return {key: 1 for func_unit in self.func_units for key in func_unit}
+
+    def settings(self) -> dict:
+        """Return the settings needed to calculate chunks elsewhere."""
+        return {name: getattr(self, name) for name in self.SETTINGS}
+
+    def load_data(self) -> None:
+        """Constructs the matrices and parameter arrays for all of the matrices
+        that can be altered by uncertainty.
+        """
+        self.lca.load_lci_data()
+
+        self.cf_params = {}
+        if self.lca.lcia:
+            # we need the cf_params of every impact category, because they are of different size
+            for m in self.methods:
+                self.lca.switch_method(m)
+                self.lca.load_lcia_data()
+                self.cf_params[m] = self.lca.cf_params
+
+        (
+            self.lca.activity_dict_rev,
+            self.lca.product_dict_rev,
+            self.lca.biosphere_dict_rev,
+        ) = self.lca.reverse_dict()
+        if self.solver == "iterative":
+            self.preconditioner = factorized_preconditioner(
+                self.lca.technosphere_matrix
+            )
+
+    def build_rngs(self, seed: int) -> None:
+        """Constructs the random number generators for all of the matrices that
+        can be altered by uncertainty, using the given seed.
+
+        If any of these uncertain calculations are not included, the initial
+        amounts of the 'params' matrices are used in place of generating
+        a vector
+        """
+        self.tech_rng = (
+            MCRandomNumberGenerator(self.lca.tech_params, seed=seed)
+            if self.include_technosphere
+            else self.lca.tech_params["amount"].copy()
+        )
+        self.bio_rng = (
+            MCRandomNumberGenerator(self.lca.bio_params, seed=seed)
+            if self.include_biosphere
+            else self.lca.bio_params["amount"].copy()
+        )
+        self.cf_rngs = {
+            m: (
+                MCRandomNumberGenerator(params, seed=seed)
+                if self.include_cfs
+                else params["amount"].copy()
+            )
+            for m, params in self.cf_params.items()
+        }
+
+    def calculate_chunk(
+        self, iterations: int, seed: int, exchange_values: Optional[np.ndarray] = None
+    ) -> dict:
+        """Sample and calculate a number of iterations with generators seeded
+        by the given seed.
+
+        `exchange_values` holds the recalculated amounts of the parameterized
+        exchanges, with a column per iteration.
+
+        Returns a dictionary with the LCA results of the iterations, the
+        sampled vectors (a row per iteration) of the included uncertainties
+        and the solver statistics.
+        """
+        self.build_rngs(seed)
+        # warm starts are not carried over between chunks, so that the results
+        # do not depend on which process calculated the previous chunk
+        self.warm_starts = {}
+        chunk = {
+            "results": np.zeros((iterations, len(self.func_units), len(self.methods))),
+            "samples": {},
+            "solver_stats": list(),
+        }
+        if self.include_technosphere:
+            chunk["samples"]["technosphere"] = np.zeros(
+                (iterations, len(self.lca.tech_params))
+            )
+        if self.include_biosphere:
+            chunk["samples"]["biosphere"] = np.zeros(
+                (iterations, len(self.lca.bio_params))
+            )
+        if self.include_cfs:
+            for m, params in self.cf_params.items():
+                chunk["samples"][m] = np.zeros((iterations, len(params)))
+        samples = chunk["samples"]
+
+        for iteration in range(iterations):
+            tech_vector = (
+                self.tech_rng.next() if self.include_technosphere else self.tech_rng
+            )
+            bio_vector = self.bio_rng.next() if self.include_biosphere else self.bio_rng
+            if exchange_values is not None:
+                # Insert the recalculated exchange amounts at the positions
+                # in the tech_ and bio_params determined by the injection plan
+                plan = self.param_plan
+                values = exchange_values[:, iteration]
+                tech_vector[plan["tech_targets"]] = values[plan["tech_sources"]]
+                bio_vector[plan["bio_targets"]] = values[plan["bio_sources"]]
+
+            self.lca.rebuild_technosphere_matrix(tech_vector)
+            self.lca.rebuild_biosphere_matrix(bio_vector)
+
+            # store sampled values for GSA
+            if "technosphere" in samples:
+                samples["technosphere"][iteration] = tech_vector
+            if "biosphere" in samples:
+                samples["biosphere"][iteration] = bio_vector
+
+            if self.solver == "direct":
+                if not hasattr(self.lca, "demand_array"):
+                    self.lca.build_demand_array()
+                self.lca.lci_calculation()
+
+            # pre-calculating CF vectors enables the use of the SAME CF vector for each FU in a given run
+            cf_vectors = {}
+            for m in self.methods:
+                cf_vectors[m] = (
+                    self.cf_rngs[m].next() if self.include_cfs else self.cf_rngs[m]
+                )
+                if m in samples:
+                    samples[m][iteration] = cf_vectors[m]
+
+            # iterate over FUs
+            for row, func_unit in self.rev_fu_index.items():
+                if self.solver == "iterative":
+                    stats = self.iterative_lci(row, func_unit)
+                    chunk["solver_stats"].append(dict(stats, iteration=iteration))
+                else:
+                    self.lca.redo_lci(func_unit)  # lca calculation
+
+                # iterate over methods
+                for col, m in self.rev_method_index.items():
+                    self.lca.switch_method(m)
+                    self.lca.rebuild_characterization_matrix(cf_vectors[m])
+                    self.lca.lcia_calculation()
+                    chunk["results"][iteration, row, col] = self.lca.score
+        return chunk
+
+    def iterative_lci(self, row: int, func_unit: dict) -> dict:
+        """Solve the current technosphere matrix for a reference flow with
+        a preconditioned iterative solver and load the inventory in the LCA.
+
+        Returns the convergence statistics of the solve.
+        """
+        self.lca.build_demand_array(func_unit)
+        matrix = self.lca.technosphere_matrix
+        demand = self.lca.demand_array
+        x0 = self.warm_starts.get(row)
+        if x0 is None:
+            # the static solution is the best first guess for the sampled matrix
+            x0 = self.preconditioner.matvec(demand)
+
+        counter = []
+        supply, info = krylov_solve(
+            matrix,
+            demand,
+            x0=x0,
+            M=self.preconditioner,
+            tolerance=self.tolerance,
+            callback=counter.append,
+        )
+        converged = info == 0
+        if not converged:
+            supply = spsolve(matrix.tocsc(), demand)
+        residual = np.linalg.norm(demand - matrix @ supply) / np.linalg.norm(demand)
+
+        self.warm_starts[row] = supply
+        self.lca.supply_array = supply
+        self.lca.inventory = self.lca.biosphere_matrix @ sparse.diags(supply)
+        return {
+            "reference flow": row,
+            "krylov iterations": len(counter),
+            "residual": residual,
+            "converged": converged,
+        }
+
+
+def factorized_preconditioner(matrix) -> LinearOperator:
+    """Return the factorization of a sparse matrix as a linear operator that
+    applies its inverse, for use as preconditioner of a Krylov solver.
+    """
+    solve = factorized(sparse.csc_matrix(matrix))
+    return LinearOperator(matrix.shape, matvec=solve, dtype=np.float64)
+
+
+def krylov_solve(matrix, demand, x0, M, tolerance: float, callback=None) -> tuple:
+    """Solve the linear system with BiCGSTAB up to the relative tolerance."""
+    try:
+        return bicgstab(
+            matrix, demand, x0=x0, M=M, rtol=tolerance, atol=0.0, callback=callback
+        )
+    except TypeError:
+        # scipy < 1.12 names the relative tolerance `tol`
+        return bicgstab(
+            matrix, demand, x0=x0, M=M, tol=tolerance, atol=0.0, callback=callback
+        )
+
+
+# The sampler of a Monte Carlo worker process, see `init_monte_carlo_worker`
+_sampler: Optional[MonteCarloSampler] = None
+
+
+def init_monte_carlo_worker(
+    base_dir: Union[str, Path],
+    project: str,
+    func_units: list,
+    methods: list,
+    settings: dict,
+    param_plan: dict,
+) -> None:
+    """Initializer of the Monte Carlo worker processes.
+
+    Opens the project and constructs the `MonteCarloSampler` with the given
+    settings, which calculates all chunks given to the process.
+    """
+    global _sampler
+    open_project(base_dir, project)
+    _sampler = MonteCarloSampler(func_units, methods)
+    for name, value in settings.items():
+        setattr(_sampler, name, value)
+    _sampler.param_plan = param_plan
+    _sampler.load_data()
+
+
+def calculate_monte_carlo_chunk(
+    iterations: int, seed: int, exchange_values: Optional[np.ndarray] = None
+) -> dict:
+    """Entry point of the Monte Carlo worker processes, see
+    `MonteCarloSampler.calculate_chunk`.
+    """
+    return _sampler.calculate_chunk(iterations, seed, exchange_values)
+
+
+def solve_with_factorization(solver: Callable, demand: np.ndarray) -> np.ndarray:
+    """Solve every column of the 2-dimensional `demand` array with the given
+    factorized technosphere `solver`.
+
+    Solvers that cannot handle a 2-dimensional right-hand side (e.g. UMFPACK)
+    are fed column by column, which still reuses the factorization.
+    """
+    try:
+        supply = np.asarray(solver(demand))
+    except (ValueError, TypeError, RuntimeError):
+        supply = None
+    if supply is None or supply.shape != demand.shape:
+        supply = np.column_stack([solver(demand[:, i]) for i in range(demand.shape[1])])
+    return supply
+
+
+def calculate_scenarios(
+    technosphere: sparse.csr_matrix,
+    biosphere: sparse.csr_matrix,
+    tech_slots: np.ndarray,
+    tech_values: np.ndarray,
+    bio_slots: np.ndarray,
+    bio_values: np.ndarray,
+    demand: np.ndarray,
+    cf_vectors: np.ndarray,
+    threshold: float = 0.0,
+) -> tuple:
+    """Calculate a block of scenarios, used by the worker processes of
+    `SuperstructureMLCA`.
+
+    Only plain scipy/numpy objects are passed in and out, so the workers do
+    not need access to the brightway project. The values of a scenario
+    (a column of `tech_values` and `bio_values`) are written straight into
+    the given positions (`tech_slots` and `bio_slots`) of the `data` arrays
+    of the matrices.
+
+    Returns
+    -------
+    Arrays of LCA scores (`func_units`, `methods`, `scenarios`), elementary
+    flow and process contributions as the CSR arrays of `pack_vectors`
+    with a vector per (`func_units`, `methods`, `scenarios`), in that
+    order, and the supply arrays (`technosphere`, `func_units`,
+    `scenarios`). The technosphere flows and inventories follow from the
+    supply arrays and are not sent back.
+
+    """
+    n_fu, n_methods, n_scenarios = demand.shape[1], cf_vectors.shape[0], tech_values.shape[1]
+    scores = np.zeros((n_fu, n_methods, n_scenarios))
+    ef = np.empty((n_fu, n_methods, n_scenarios), dtype=object)
+    pc = np.empty((n_fu, n_methods, n_scenarios), dtype=object)
+    supply = np.zeros((technosphere.shape[0], n_fu, n_scenarios))
+
+    technosphere, biosphere = technosphere.copy(), biosphere.copy()
+    for i in range(n_scenarios):
+        technosphere.data[tech_slots] = tech_values[:, i]
+        biosphere.data[bio_slots] = bio_values[:, i]
+
+        solver = factorized(technosphere.tocsc())
+        supply[:, :, i] = solve_with_factorization(solver, demand)
+        inventory = biosphere @ supply[:, :, i]
+        cf_biosphere = np.asarray(biosphere.T @ cf_vectors.T).T
+
+        scores[:, :, i] = (cf_vectors @ inventory).T
+        # The contributions are only kept sparsely, one reference flow at a time
+        for row in range(n_fu):
+            ef_vectors = sparse_vectors(cf_vectors * inventory[:, row], threshold)
+            pc_vectors = sparse_vectors(cf_biosphere * supply[:, row, i], threshold)
+            for col in range(n_methods):
+                ef[row, col, i] = ef_vectors[col]
+                pc[row, col, i] = pc_vectors[col]
+    return scores, pack_vectors(ef.ravel()), pack_vectors(pc.ravel()), supply
+
+
+def sparse_vectors(values: np.ndarray, threshold: float = 0.0) -> list:
+    """Return the (indices, values) to keep of every row of a 2-dimensional
+    array.
+
+    Zeros are dropped, as are values smaller than `threshold` times the
+    largest absolute value of their row.
+    """
+    vectors = []
+    for vector in values:
+        keep = vector != 0
+        if threshold:
+            absolute = np.abs(vector)
+            keep &= absolute >= threshold * absolute.max(initial=0)
+        indices = np.flatnonzero(keep)
+        vectors.append((indices.astype(np.int32), vector[indices]))
+    return vectors
+
+
+def pack_vectors(vectors) -> dict:
+    """Return a sequence of (indices, values) vectors as the arrays of a CSR
+    matrix with a row per vector.
+    """
+    lengths = [len(indices) for indices, _ in vectors]
+    return {
+        "indptr": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        "indices": np.concatenate(
+            [indices for indices, _ in vectors] or [np.empty(0, np.int32)]
+        ),
+        "data": np.concatenate([data for _, data in vectors] or [np.empty(0)]),
+    }
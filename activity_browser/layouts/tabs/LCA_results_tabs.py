@@ -54,6 +54,7 @@ from ...ui.figures import (
 from ...ui.icons import qicons
 from ...ui.style import header, horizontal_line, vertical_line
 from ...ui.tables import ContributionTable, InventoryTable, LCAResultsTable
+from ...ui.threading import ABThread
 from ...ui.web import SankeyNavigatorWidget
 from ...ui.widgets import CutoffMenu, SwitchComboBox
 from .base import BaseRightTab
@@ -1240,6 +1241,9 @@ class MonteCarloTab(NewAnalysisTab):
 
     def connect_signals(self):
         self.button_run.clicked.connect(self.calculate_mc_lca)
+        self.solver.currentTextChanged.connect(
+            lambda solver: self.tolerance.setEnabled(solver == "iterative")
+        )
         # signals.monte_carlo_ready.connect(self.update_mc)
         # self.combobox_fu.currentIndexChanged.connect(self.update_plot)
         self.combobox_methods.currentIndexChanged.connect(
@@ -1275,6 +1279,30 @@ class MonteCarloTab(NewAnalysisTab):
         )
         self.seed = QLineEdit("")
         self.seed.setFixedWidth(30)
+        self.label_workers = QLabel("Processes:")
+        self.label_workers.setToolTip(
+            "Number of processes used to calculate the iterations. "
+            "The results for a given seed do not depend on this number."
+        )
+        self.workers = QLineEdit("1")
+        self.workers.setFixedWidth(30)
+        self.workers.setValidator(QtGui.QIntValidator(1, 64))
+        self.label_solver = QLabel("Solver:")
+        self.label_solver.setToolTip(
+            "Solve every iteration directly, or iteratively starting from the "
+            "previous solution (faster for large systems)."
+        )
+        self.solver = QComboBox()
+        self.solver.addItems(MonteCarloLCA.SOLVERS)
+        self.label_tolerance = QLabel("Tolerance:")
+        self.label_tolerance.setToolTip(
+            "Relative residual up to which the iterative solver solves, "
+            "iterations that do not reach it are solved directly."
+        )
+        self.tolerance = QLineEdit("1e-6")
+        self.tolerance.setFixedWidth(50)
+        self.tolerance.setValidator(QtGui.QDoubleValidator(0.0, 1.0, 12))
+        self.tolerance.setEnabled(False)
 
         self.hlayout_run = QHBoxLayout()
         self.hlayout_run.addWidget(self.scenario_label)
@@ -1284,6 +1312,12 @@ class MonteCarloTab(NewAnalysisTab):
         self.hlayout_run.addWidget(self.iterations)
         self.hlayout_run.addWidget(self.label_seed)
         self.hlayout_run.addWidget(self.seed)
+        self.hlayout_run.addWidget(self.label_workers)
+        self.hlayout_run.addWidget(self.workers)
+        self.hlayout_run.addWidget(self.label_solver)
+        self.hlayout_run.addWidget(self.solver)
+        self.hlayout_run.addWidget(self.label_tolerance)
+        self.hlayout_run.addWidget(self.tolerance)
         self.hlayout_run.addWidget(self.include_box)
         self.hlayout_run.addStretch(1)
         layout_mc.addLayout(self.hlayout_run)
@@ -1347,6 +1381,15 @@ class MonteCarloTab(NewAnalysisTab):
         self.export_widget.hide()
 
         iterations = int(self.iterations.text())
+        workers = int(self.workers.text() or 1)
+        solver = self.solver.currentText()
+        try:
+            tolerance = float(self.tolerance.text())
+        except ValueError:
+            QMessageBox.warning(
+                self, "Warning", "Tolerance must be a number, e.g. 1e-6."
+            )
+            return
         seed = None
         if self.seed.text():
             log.info("SEED: ", self.seed.text())
@@ -1370,74 +1413,36 @@ class MonteCarloTab(NewAnalysisTab):
             "parameters": self.include_parameters.isChecked(),
         }
 
-        QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
-        try:
-            self.parent.mc.calculate(iterations=iterations, seed=seed, **includes)
-            signals.monte_carlo_finished.emit()
-            self.update_mc()
-        except (
-            InvalidParamsError
-        ) as e:  # This can occur if uncertainty data is missing or otherwise broken
-            # print(e)
-            log.error(error=e)
-            QMessageBox.warning(
-                self, "Could not perform Monte Carlo simulation", str(e)
-            )
+        # The GUI stays responsive, only one simulation runs at a time
+        self.button_run.setEnabled(False)
+        QApplication.setOverrideCursor(QtCore.Qt.BusyCursor)
+        thread = MonteCarloThread(
+            self.parent.mc,
+            iterations=iterations,
+            seed=seed,
+            workers=workers,
+            solver=solver,
+            tolerance=tolerance,
+            **includes,
+        )
+        thread.completed.connect(self.monte_carlo_completed)
+        thread.failed.connect(self.monte_carlo_failed)
+        thread.finished.connect(self.monte_carlo_thread_finished)
+        thread.start()
+
+    @QtCore.Slot(name="monteCarloCompleted")
+    def monte_carlo_completed(self):
+        signals.monte_carlo_finished.emit()
+        self.update_mc()
+
+    @QtCore.Slot(str, name="monteCarloFailed")
+    def monte_carlo_failed(self, message: str):
+        QMessageBox.warning(self, "Could not perform Monte Carlo simulation", message)
+
+    @QtCore.Slot(name="monteCarloThreadFinished")
+    def monte_carlo_thread_finished(self):
         QApplication.restoreOverrideCursor()
-
-        # a threaded way for this - unfortunatley this crashes as:
-        # pypardsio_solver is used for the 'spsolve' and 'factorized' functions. Python crashes on windows if multiple
-        # instances of PyPardisoSolver make calls to the Pardiso library
-        # worker_thread = WorkerThread()
-        # print('Created local worker_thread')
-        # worker_thread.set_mc(self.parent.mc, iterations=iterations)
-        # print('Passed object to thread.')
-        # worker_thread.start()
-        # self.label_running.show()
-
-        #
-
-        # thread = NewCSMCThread() #self.parent.mc
-        # thread.calculation_finished.connect(
-        #     lambda x: print('Calculation finished.'))
-        # thread.start()
-
-        # # give us a thread and start it
-        # thread = QtCore.QThread()
-        # thread.start()
-        #
-        # # create a worker and move it to our extra thread
-        # worker = Worker()
-        # worker.moveToThread(thread)
-
-        # self.parent.mct.start()
-        # self.parent.mct.run(iterations=iterations)
-        # self.parent.mct.finished()
-
-        # objThread = QtCore.QThread()
-        # obj = QObjectMC()  # self.parent.cs_name
-        # obj.moveToThread(objThread)
-        # obj.finished.connect(objThread.quit)
-        # objThread.started.connect(obj.long_running)
-        # # objThread.finished.connect(app.exit)
-        # objThread.finished.connect(
-        #     lambda x: print('Finished Thread!')
-        # )
-        # objThread.start()
-
-        # objThread = QtCore.QThread()
-        # obj = SomeObject()
-        # obj.moveToThread(objThread)
-        # obj.finished.connect(objThread.quit)
-        # objThread.started.connect(obj.long_running)
-        # objThread.finished.connect(
-        #     lambda x: print('Finished Thread!')
-        # )
-        # objThread.start()
-
-        # self.method_selection_widget.show()
-        # self.plot.show()
-        # self.export_widget.show()
+        self.button_run.setEnabled(True)
 
     def configure_scenario(self):
         super().configure_scenario()
@@ -1718,28 +1723,34 @@ class GSATab(NewAnalysisTab):
     #     filename = '_'.join((str(x) for x in fields if x is not None))
 
 
-class MonteCarloWorkerThread(QtCore.QThread):
-    """A worker for Monte Carlo simulations.
+class MonteCarloThread(ABThread):
+    """Calculates a Monte Carlo LCA outside of the GUI thread.
 
-    Unfortunately, pyparadiso does not allow parallel calculations on Windows (crashes).
-    So this is for future reference in case this issue is solved..."""
+    The keyword arguments are passed on to `MonteCarloLCA.calculate`.
+    Running threads are kept alive (in `running`) when their tab is closed.
+    """
 
-    def __init__(self):
-        pass
+    running = set()
+    completed = QtCore.Signal()
+    failed = QtCore.Signal(str)
 
-    def set_mc(self, mc, iterations=20):
+    def __init__(self, mc: MonteCarloLCA, **kwargs):
+        super().__init__()
         self.mc = mc
-        self.iterations = iterations
-
-    def run(self):
-        log.info("Starting new Worker Thread. Iterations:", self.iterations)
-        self.mc.calculate(iterations=self.iterations)
-        # res = bw.GraphTraversal().calculate(self.demand, self.method, self.cutoff, self.max_calc)
-        log.info("in thread {}".format(QtCore.QThread.currentThread()))
-        signals.monte_carlo_ready.emit(self.mc.cs_name)
+        self.kwargs = kwargs
+        self.running.add(self)
+        self.finished.connect(lambda: self.running.discard(self))
 
+    def run_safely(self):
+        try:
+            self.mc.calculate(**self.kwargs)
+        except InvalidParamsError as e:
+            # This can occur if uncertainty data is missing or otherwise broken
+            log.error(error=e)
+            self.failed.emit(str(e))
+            return
+        self.completed.emit()
 
-worker_thread = MonteCarloWorkerThread()
 
 # TODO review if can be removed
 
@@ -12,10 +12,12 @@ from ...bwutils.superstructure import (
     ABCSVImporter,
     ABFeatherImporter,
     ABPopup,
+    ScenarioPackage,
     SuperstructureManager,
     _time_it_,
     edit_superstructure_for_string,
     import_from_excel,
+    scenario_dtype,
     scenario_names_from_df,
     scenario_replace_databases,
 )
@@ -430,6 +432,14 @@ class ScenarioImportPanel(BaseRightTab):
             self.update_stats()
             return
 
+        # a single verified package was checked before it was saved, its
+        # values can stay on disk
+        packages = [t.package for t in self.tables if not t.dataframe.empty]
+        if len(packages) == 1 and packages[0] is not None:
+            self._scenario_dataframe = packages[0].scenario_frame()
+            self.update_stats()
+            return
+
         # check what kind of combination the user wants to do
         kind = self.get_combine_type()
 
@@ -514,7 +524,7 @@ class ScenarioImportPanel(BaseRightTab):
         filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
             parent=self,
             caption="Choose location to save the scenario file",
-            filter="Excel (*.xlsx *.xls);; CSV (*.csv)",
+            filter="Excel (*.xlsx *.xls);; CSV (*.csv);; AB scenario package (*.absp)",
         )
         print("Saving scenario dataframe to file: ", filepath)
         scenarios = self._scenario_dataframe.columns.difference(
@@ -535,6 +545,16 @@ class ScenarioImportPanel(BaseRightTab):
         if filepath.endswith(".xlsx") or filepath.endswith(".xls"):
             savedf.to_excel(filepath, index=False)
             return
+        elif filepath.endswith(ScenarioPackage.SUFFIX):
+            # Exchanges added by merging flows to self are not in any table
+            index = savedf.index.to_frame(index=False).to_numpy()
+            savedf.loc[:, ["from key", "to key", "flow type"]] = index
+            savedf.loc[:, "from database"] = savedf["from key"].str[0]
+            savedf.loc[:, "to database"] = savedf["to key"].str[0]
+            dtype = scenario_dtype(self._scenario_dataframe)
+            savedf = savedf.astype(dict.fromkeys(scenarios, dtype))
+            ScenarioPackage.save(filepath, savedf)
+            return
         elif not filepath.endswith(".csv"):
             filepath += ".csv"
         savedf.to_csv(filepath, index=False, sep=";")
@@ -557,6 +577,8 @@ class ScenarioImportWidget(QtWidgets.QWidget):
         self.remove_btn.setToolTip("Remove this scenario table")
         self.table = ScenarioImportTable(self)
         self.scenario_df = pd.DataFrame(columns=SUPERSTRUCTURE)
+        # The scenario package the data was loaded from, if it was verified
+        self.package = None
 
         layout = QtWidgets.QVBoxLayout()
 
@@ -589,19 +611,38 @@ class ScenarioImportWidget(QtWidgets.QWidget):
                 idx = dialog.import_sheet.currentIndex()
                 file_type_suffix = dialog.path.suffix
                 separator = dialog.field_separator.currentData()
+                downcast = dialog.downcast.isChecked()
                 log.debug("separator == '{}'".format(separator))
                 QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
                 log.info("Loading Scenario file. This may take a while for large files")
                 # Try and read as a superstructure file
                 # Choose a different routine for reading the file dependent on file type
-                if file_type_suffix == ".feather":
-                    df = ABFeatherImporter.read_file(path)
+                package = None
+                if file_type_suffix == ScenarioPackage.SUFFIX:
+                    package = ScenarioPackage.open(path)
+                elif file_type_suffix == ".feather":
+                    df = ABFeatherImporter.read_file(path, downcast=downcast)
                 elif file_type_suffix.startswith(".xls"):
-                    df = import_from_excel(path, idx)
+                    df = import_from_excel(path, idx, downcast=downcast)
                 else:
-                    df = ABCSVImporter.read_file(path, separator=separator)
+                    progress = QtWidgets.QProgressDialog(self)
+                    progress.setWindowTitle("Loading scenario file")
+                    progress.setLabelText("Reading {}".format(path.name))
+                    progress.setCancelButton(None)
+                    progress.setWindowModality(Qt.WindowModal)
+                    try:
+                        df = ABCSVImporter.read_file(
+                            path,
+                            separator=separator,
+                            progress=progress.setValue,
+                            downcast=downcast,
+                        )
+                    finally:
+                        progress.close()
                 # Read in the file as a scenario flow table if the file is arranged as one
-                if len(df.columns.intersection(SUPERSTRUCTURE)) >= 12:
+                if package is not None:
+                    self.sync_package(package)
+                elif len(df.columns.intersection(SUPERSTRUCTURE)) >= 12:
                     if df is None:
                         QtWidgets.QApplication.restoreOverrideCursor()
                         return
@@ -666,6 +707,13 @@ class ScenarioImportWidget(QtWidgets.QWidget):
             except UnalignableScenarioColumnsWarning as e:
                 QtWidgets.QApplication.restoreOverrideCursor()
                 return
+            except WrongFileTypeImportError as e:
+                QtWidgets.QApplication.restoreOverrideCursor()
+                critical = ABPopup.abCritical(
+                    "Wrong file type", str(e), QtWidgets.QPushButton("Cancel")
+                )
+                critical.exec_()
+                return
             self.scenario_name.setText(path.name)
             self.scenario_name.setToolTip(path.name)
             self._parent.save_button(True)
@@ -686,6 +734,23 @@ class ScenarioImportWidget(QtWidgets.QWidget):
         # If we've cancelled the import then we don't want to load the dataframe
         if df.empty:
             return
+        self.package = None
+        self.scenario_df = df
+        cols = scenario_names_from_df(self.scenario_df)
+        self.table.model.sync(cols)
+        self._parent.combined_dataframe()
+
+    @_time_it_
+    def sync_package(self, package: ScenarioPackage) -> None:
+        """Synchronizes the contents of a scenario package. The row-wise checks of
+        `sync_superstructure` are skipped if the package passes its integrity check
+        and all of its databases are present."""
+        df = package.dataframe()
+        dbs = set(df.loc[:, "from database"]).union(df.loc[:, "to database"])
+        if not dbs.issubset(bd.databases) or not package.verify():
+            self.sync_superstructure(df)
+            return
+        self.package = package
         self.scenario_df = df
         cols = scenario_names_from_df(self.scenario_df)
         self.table.model.sync(cols)
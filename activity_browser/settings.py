@@ -110,6 +110,8 @@ class ABSettings(BaseSettings):
             "current_bw_dir": cls.get_default_directory(),
             "custom_bw_dirs": [cls.get_default_directory()],
             "startup_project": cls.get_default_project_name(),
+            "cache_results": True,
+            "scenario_workers": 1,
         }
 
     @property
@@ -158,6 +160,24 @@ class ABSettings(BaseSettings):
         """Sets the startup project to `project`"""
         self.settings.update({"startup_project": project})
 
+    @property
+    def cache_results(self) -> bool:
+        """Whether LCA results are stored on disk to be reused, see `ResultCache`"""
+        return self.settings.get("cache_results", True)
+
+    @cache_results.setter
+    def cache_results(self, cache: bool) -> None:
+        self.settings.update({"cache_results": cache})
+
+    @property
+    def scenario_workers(self) -> int:
+        """The number of processes calculating scenarios, see `SuperstructureMLCA`"""
+        return self.settings.get("scenario_workers", 1)
+
+    @scenario_workers.setter
+    def scenario_workers(self, workers: int) -> None:
+        self.settings.update({"scenario_workers": workers})
+
     @staticmethod
     def get_default_directory() -> str:
         """Returns the default brightway application directory"""
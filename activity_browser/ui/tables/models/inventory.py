@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import datetime
-import functools
 
 import numpy as np
 import pandas as pd
@@ -132,9 +131,12 @@ class ActivitiesBiosphereModel(DragPandasModel):
         TODO: Look at the possibility of using the proxy model to filter instead
         """
         df = self.df_from_metadata(self.database_name)
+        if df.empty:
+            return
         if all((pattern1, pattern2)):
-            mask1 = self.filter_dataframe(df, pattern1)
-            mask2 = self.filter_dataframe(df, pattern2)
+            scores1 = self.search_scores(df, pattern1)
+            scores2 = self.search_scores(df, pattern2)
+            mask1, mask2 = scores1 > 0, scores2 > 0
             # applying the logic
             if logic == "AND":
                 mask = np.logical_and(mask1, mask2)
@@ -142,34 +144,35 @@ class ActivitiesBiosphereModel(DragPandasModel):
                 mask = np.logical_or(mask1, mask2)
             elif logic == "AND NOT":
                 mask = np.logical_and(mask1, ~mask2)
+                scores2 = 0
+            scores = scores1 + scores2
         elif any((pattern1, pattern2)):
-            mask = self.filter_dataframe(df, pattern1 or pattern2)
+            scores = self.search_scores(df, pattern1 or pattern2)
+            mask = scores > 0
         else:
             self.sync(self.database_name)
             return
-        df = df.loc[mask].reset_index(drop=True)
+        # best matches first, keeping the sorting of the dataframe otherwise
+        order = np.argsort(-scores[mask].to_numpy(), kind="stable")
+        df = df.loc[mask].iloc[order].reset_index(drop=True)
         self.sync(self.database_name, df=df)
 
-    def filter_dataframe(self, df: pd.DataFrame, pattern: str) -> pd.Series:
-        """Filter the dataframe returning a mask that is True for all rows
-        where a search string has been found.
+    def search_scores(self, df: pd.DataFrame, pattern: str) -> pd.Series:
+        """Return the score of every row of the dataframe for the search
+        string, 0 for the rows where it has not been found.
 
         It is a "contains" type of search (e.g. "oal" would find "coal").
         It also works for columns that contain tuples (e.g. ('water', 'ocean'),
         and will match on partials i.e. both 'ocean' and 'ean' work.
+        Rows where a field equals the search string score highest, followed
+        by those where a word in a field starts with it.
 
-        An alternative solution would be to use .str.contains, but this does
-        not work for columns containing tuples (https://stackoverflow.com/a/29463757)
+        The matches are looked up in the `SearchIndex` of the database instead
+        of scanning every field of every row.
         """
-        search_columns = (bc.bw_keys_to_AB_names.get(c, c) for c in self.fields)
-        mask = functools.reduce(
-            np.logical_or,
-            [
-                df[col].apply(lambda x: pattern.lower() in str(x).lower())
-                for col in search_columns
-            ],
-        )
-        return mask
+        index = AB_metadata.search_index(self.database_name)
+        scores = index.search(pattern, self.fields)
+        return df["key"].map(scores).fillna(0)
 
     def copy_exchanges_for_SDF(self, proxies: list) -> None:
         if len(proxies) > 1:
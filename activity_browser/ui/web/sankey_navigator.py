@@ -2,7 +2,9 @@
 import json
 import os
 import time
-from typing import List
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, List, Optional
 
 import bw2calc as bc
 import bw2data as bd
@@ -10,8 +12,13 @@ import numpy
 from bw_graph_tools.graph_traversal import Edge as GraphEdge
 from bw_graph_tools.graph_traversal import NewNodeEachVisitGraphTraversal
 from bw_graph_tools.graph_traversal import Node as GraphNode
+
+try:
+    from bw_graph_tools.graph_traversal import CachingSolver
+except ImportError:
+    CachingSolver = None
 from PySide2 import QtWidgets
-from PySide2.QtCore import Slot
+from PySide2.QtCore import Signal, Slot
 from PySide2.QtWidgets import QComboBox
 
 from activity_browser import log, signals
@@ -20,9 +27,8 @@ from activity_browser.mod.bw2data.backends import ActivityDataset
 from activity_browser.utils import STATIC_DIR
 
 from ...bwutils.commontasks import identify_activity_type
-from ...bwutils.superstructure.graph_traversal_with_scenario import (
-    GraphTraversalWithScenario,
-)
+from ...bwutils.multilca import TraversalLCA
+from ..threading import ABThread
 from .base import BaseGraph, BaseNavigatorWidget
 
 # TODO:
@@ -51,12 +57,18 @@ class SankeyNavigatorWidget(BaseNavigatorWidget):
     def __init__(self, cs_name, parent=None):
         super().__init__(parent, css_file="sankey_navigator.css")
 
-        self.cache = {}  # we cache the calculated data to improve responsiveness
+        # we cache the calculated data to improve responsiveness
+        self.cache = SankeyCache()
         self.parent = parent
         self.has_scenarios = self.parent.has_scenarios
         self.cs = cs_name
         self.selected_db = None
         self.has_sankey = False
+        self.traversal_thread = None
+        self.prewarm_thread = None
+        self.cancelled_threads = set()
+        self.queued_traversal = None
+        self.prewarm_jobs = []
         self.func_units = []
         self.methods = []
         self.scenarios = []
@@ -177,6 +189,9 @@ class SankeyNavigatorWidget(BaseNavigatorWidget):
         self.method_cb.blockSignals(True)
 
         self.cs = cs_name or self.cs
+        # the cached graphs are identified by the indexes of the comboboxes
+        self.cancel_traversal()
+        self.cache.clear()
         self.func_units = [
             {bd.get_activity(k): v for k, v in fu.items()}
             for fu in bd.calculation_setups[self.cs]["inv"]
@@ -237,52 +252,163 @@ class SankeyNavigatorWidget(BaseNavigatorWidget):
         # the cutoff, max_calc.
         # together, these are unique.
         cache_key = (demand_index, method_index, scenario_index, cut_off, max_calc)
-        if data := self.cache.get(cache_key, False):
+        self.cancel_traversal()
+        if data := self.cache.get(cache_key):
             # this Sankey is already cached, generate the Sankey with the cached data
             log.debug(f"CACHED sankey for: {demand}, {method}, key: {cache_key}")
-            self.graph.new_graph(data)
+            self.graph.set_json(data["json"])
             self.has_sankey = bool(self.graph.json_data)
             self.send_json()
             return
 
-        start = time.time()
         log.debug(f"CALCULATE sankey for: {demand}, {method}, key: {cache_key}")
         try:
             if scenario_lca:
-                self.parent.mlca.update_lca_calculation_for_sankey(
-                    scenario_index, demand, method_index
-                )
-                data = GraphTraversalWithScenario(self.parent.mlca).calculate(
-                    demand, method, cutoff=cut_off, max_calc=max_calc
+                lca = self.parent.mlca.traversal_lca(
+                    demand_index, method_index, scenario_index
                 )
+            elif demand_index is not None and method_index is not None:
+                # reuse the matrices and factorization of the calculation setup
+                lca = self.parent.mlca.traversal_lca(demand_index, method_index)
             else:
                 fu, data_objs, _ = bd.prepare_lca_inputs(demand=demand, method=method)
                 lca = bc.LCA(demand=fu, data_objs=data_objs)
                 lca.lci()
                 lca.lcia()
-                data = NewNodeEachVisitGraphTraversal.calculate(
-                    lca_object=lca, cutoff=cut_off, max_calc=max_calc
-                )
-
-            # store the metadata from this calculation
-            data["metadata"] = {
-                "lca": lca,
-                "unit": bd.methods[method]["unit"],
-            }
         except (ValueError, ZeroDivisionError) as e:
             QtWidgets.QMessageBox.information(
                 None, "Nonsensical numeric result.", str(e)
             )
-        log.debug(f"Completed graph traversal ({round(time.time() - start, 2)} seconds")
+            return
+
+        # the graph traversal runs in a thread, showing the graph as it grows
+        job = (cache_key, lambda: lca, bd.methods[method]["unit"])
+        self.queued_traversal = ([job], cut_off, max_calc, True)
+        if cache_key[0] is not None:
+            # warm the cache for the neighbouring entries of the comboboxes
+            self.prewarm_jobs = self.neighbour_jobs(lca, cache_key)
+        self.start_next_traversal()
+
+    def start_traversal(
+        self, jobs: list, cut_off: float, max_calc: int, progressive: bool
+    ) -> "SankeyTraversalThread":
+        thread = SankeyTraversalThread(jobs, cut_off, max_calc, progressive)
+        thread.partial.connect(partial(self.traversal_progressed, thread))
+        thread.completed.connect(partial(self.traversal_completed, thread))
+        thread.failed.connect(partial(self.traversal_failed, thread))
+        thread.finished.connect(partial(self.traversal_finished, thread))
+        thread.start()
+        return thread
+
+    def start_next_traversal(self) -> None:
+        """Start the queued graph traversal, or else the cache warming, if no
+        traversal thread is running.
+
+        Only one thread traverses at a time, the traversals share the
+        solutions `bw_graph_tools` memoizes. These are cleared here, in
+        between traversals.
+        """
+        if self.traversal_thread or self.prewarm_thread or self.cancelled_threads:
+            return
+        clear_traversal_solutions()
+        if self.queued_traversal is not None:
+            args, self.queued_traversal = self.queued_traversal, None
+            self.traversal_thread = self.start_traversal(*args)
+        elif self.prewarm_jobs:
+            jobs, self.prewarm_jobs = self.prewarm_jobs, []
+            _, _, _, cut_off, max_calc = jobs[0][0]
+            self.prewarm_thread = self.start_traversal(jobs, cut_off, max_calc, False)
+
+    def neighbour_jobs(self, lca: TraversalLCA, cache_key: tuple) -> list:
+        """Return the traversal jobs for the reference flows and impact
+        categories next to the given one that are not cached yet.
+
+        The LCAs of these share the matrices and factorization of `lca`.
+        """
+        demand_index, method_index, scenario_index, cut_off, max_calc = cache_key
+        jobs = []
+        for d, m in (
+            (demand_index + 1, method_index),
+            (demand_index, method_index + 1),
+            (demand_index - 1, method_index),
+            (demand_index, method_index - 1),
+        ):
+            key = (d, m, scenario_index, cut_off, max_calc)
+            if not (0 <= d < len(self.func_units) and 0 <= m < len(self.methods)):
+                continue
+            if key in self.cache:
+                continue
+            demand = {act.id: amount for act, amount in self.func_units[d].items()}
+            make_lca = partial(
+                TraversalLCA, lca, demand, self.parent.mlca.method_matrices[m]
+            )
+            jobs.append((key, make_lca, bd.methods[self.methods[m]]["unit"]))
+        return jobs
+
+    def cancel_traversal(self) -> None:
+        """Stop the running graph traversal and cache warming, if any.
 
-        # cache the generated Sankey data
-        self.cache[cache_key] = data
+        The threads are not waited for: they are disconnected, stop at their
+        next calculation and their results are dropped. They are kept in
+        `cancelled_threads` until they have finished, the next traversal
+        only starts after that.
+        """
+        self.queued_traversal = None
+        self.prewarm_jobs = []
+        for thread in (self.traversal_thread, self.prewarm_thread):
+            if thread is not None:
+                thread.requestInterruption()
+                for signal in (thread.partial, thread.completed, thread.failed):
+                    signal.disconnect()
+                self.cancelled_threads.add(thread)
+        self.traversal_thread = None
+        self.prewarm_thread = None
+
+    def traversal_progressed(self, thread: "SankeyTraversalThread", json_data: str):
+        """Show the graph traversed so far."""
+        if thread is not self.traversal_thread:
+            return
+        self.graph.json_data = json_data
+        self.has_sankey = True
+        self.send_json()
+
+    def traversal_completed(
+        self,
+        thread: "SankeyTraversalThread",
+        cache_key: tuple,
+        json_data: str,
+        metadata: dict,
+    ):
+        if thread in self.cancelled_threads:
+            # emitted before the thread was cancelled
+            return
+        # cache the generated Sankey data, random graphs have no unique key
+        if cache_key[0] is not None:
+            self.cache.put(cache_key, dict(metadata, json=json_data))
+        if thread is not self.traversal_thread:
+            return
+        log.debug(
+            f"Completed graph traversal ({round(metadata['duration'], 2)} seconds)"
+        )
 
         # generate the new Sankey
-        self.graph.new_graph(data)
+        self.graph.set_json(json_data)
         self.has_sankey = bool(self.graph.json_data)
         self.send_json()
 
+    def traversal_failed(self, thread: "SankeyTraversalThread", message: str):
+        if thread is not self.traversal_thread:
+            return
+        QtWidgets.QMessageBox.information(None, "Nonsensical numeric result.", message)
+
+    def traversal_finished(self, thread: "SankeyTraversalThread"):
+        self.cancelled_threads.discard(thread)
+        if thread is self.traversal_thread:
+            self.traversal_thread = None
+        elif thread is self.prewarm_thread:
+            self.prewarm_thread = None
+        self.start_next_traversal()
+
     def set_database(self, name):
         """Saves the currently selected database for graphing a random activity"""
         self.selected_db = name
@@ -300,6 +426,193 @@ class SankeyNavigatorWidget(BaseNavigatorWidget):
             )
 
 
+class TraversalCancelled(Exception):
+    """The graph traversal was cancelled."""
+
+    pass
+
+
+class ProgressiveGraphTraversal(NewNodeEachVisitGraphTraversal):
+    """Graph traversal that reports a preview of a large graph.
+
+    When `max_calc` is over `PROGRESSIVE` calculations, the graph is first
+    traversed with the public `calculate` up to `PREVIEW` calculations and
+    the observer is called with the nodes, edges and flows of this preview,
+    before the whole graph is traversed. The observer returns False to
+    cancel the traversal.
+
+    The preview is traversed again as part of the whole graph, so it adds
+    at most `PREVIEW` calculations. Smaller graphs are traversed at once.
+    """
+
+    PREVIEW = 50
+    PROGRESSIVE = 200
+
+    @classmethod
+    def calculate_observed(
+        cls, lca_object, observer: Callable, max_calc: int, **kwargs
+    ) -> dict:
+        max_calc = int(max_calc)
+        if max_calc > cls.PROGRESSIVE:
+            data = cls.calculate(lca_object=lca_object, max_calc=cls.PREVIEW, **kwargs)
+            if data["calculation_count"] < cls.PREVIEW:
+                # the whole graph was traversed
+                return data
+            if not observer(data["nodes"], data["edges"], data["flows"]):
+                raise TraversalCancelled
+        return cls.calculate(lca_object=lca_object, max_calc=max_calc, **kwargs)
+
+
+class SankeyTraversalThread(ABThread):
+    """Traverses the supply chain graphs of a list of jobs, can be cancelled
+    with `requestInterruption`.
+
+    Every job is a tuple of the cache key, a callable returning the LCA
+    object to traverse and the unit of the impact category. When
+    `progressive`, the graph data is also emitted as it grows.
+
+    The interruption is checked before every calculation of the traversal,
+    see `interruptible`.
+    """
+
+    partial = Signal(str)
+    completed = Signal(object, str, object)
+    failed = Signal(str)
+
+    def __init__(
+        self,
+        jobs: list,
+        cut_off: float,
+        max_calc: int,
+        progressive: bool = True,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.jobs = jobs
+        self.cut_off = cut_off
+        self.max_calc = max_calc
+        self.progressive = progressive
+        self.metadata = None
+
+    def run_safely(self):
+        jobs, self.jobs = self.jobs, []
+        for cache_key, make_lca, unit in jobs:
+            if self.isInterruptionRequested():
+                return
+            start = time.time()
+            lca = None
+            try:
+                lca = self.interruptible(make_lca())
+                self.metadata = {"lca": lca, "unit": unit}
+                data = ProgressiveGraphTraversal.calculate_observed(
+                    lca,
+                    self.observe,
+                    cutoff=self.cut_off,
+                    max_calc=self.max_calc,
+                )
+                data["metadata"] = self.metadata
+                json_data = Graph.get_json_data(data)
+            except TraversalCancelled:
+                return
+            except (ValueError, ZeroDivisionError) as e:
+                self.failed.emit(str(e))
+                continue
+            finally:
+                if lca is not None:
+                    vars(lca).pop("solve_linear_system", None)
+                # do not keep the LCA alive
+                self.metadata = None
+            metadata = {
+                "unit": unit,
+                "score": lca.score,
+                "calculation_count": data["calculation_count"],
+                "duration": time.time() - start,
+            }
+            del data, lca
+            self.completed.emit(cache_key, json_data, metadata)
+
+    def interruptible(self, lca):
+        """Check for an interruption before every solve of the LCA object,
+        the traversal then stops with `TraversalCancelled`.
+
+        The check is removed again when the job is done.
+        """
+        solve = lca.solve_linear_system
+
+        def solve_linear_system():
+            if self.isInterruptionRequested():
+                raise TraversalCancelled
+            return solve()
+
+        lca.solve_linear_system = solve_linear_system
+        return lca
+
+    def observe(self, nodes: dict, edges: list, flows: list) -> bool:
+        if self.isInterruptionRequested():
+            return False
+        if self.progressive:
+            data = {
+                "nodes": dict(nodes),
+                "edges": list(edges),
+                "metadata": self.metadata,
+            }
+            self.partial.emit(Graph.get_json_data(data))
+        return not self.isInterruptionRequested()
+
+
+def clear_traversal_solutions() -> None:
+    """Clear the solutions the `bw_graph_tools` traversal memoizes, which
+    keep the LCA objects they were solved with alive.
+
+    The memoized solutions are shared by all traversals, only clear them
+    when no traversal is running.
+    """
+    clear = getattr(getattr(CachingSolver, "calculate", None), "cache_clear", None)
+    if clear is not None:
+        clear()
+
+
+class SankeyCache(object):
+    """Least-recently-used cache of Sankey graphs.
+
+    Only the graph JSON and a few numbers describing the calculation are
+    kept, at most `maxsize` graphs and `maxchars` characters of JSON.
+    """
+
+    def __init__(self, maxsize: int = 100, maxchars: int = 50_000_000):
+        self.maxsize = maxsize
+        self.maxchars = maxchars
+        self.chars = 0
+        self._cache = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[dict]:
+        if key not in self._cache:
+            return None
+        self._cache.move_to_end(key)
+        return self._cache[key]
+
+    def put(self, key: tuple, entry: dict) -> None:
+        if key in self._cache:
+            self.chars -= len(self._cache.pop(key)["json"])
+        self._cache[key] = entry
+        self.chars += len(entry["json"])
+        while len(self._cache) > 1 and (
+            len(self._cache) > self.maxsize or self.chars > self.maxchars
+        ):
+            _, dropped = self._cache.popitem(last=False)
+            self.chars -= len(dropped["json"])
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._cache
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self.chars = 0
+
+
 def convert_numpy_types(obj) -> int | float | list:
     """Converts numpy types into serializable types"""
     if isinstance(obj, numpy.integer):
@@ -338,7 +651,10 @@ class Graph(BaseGraph):
     """
 
     def new_graph(self, data):
-        self.json_data = Graph.get_json_data(data)
+        self.set_json(Graph.get_json_data(data))
+
+    def set_json(self, json_data: str) -> None:
+        self.json_data = json_data
         self.update()
 
     @staticmethod
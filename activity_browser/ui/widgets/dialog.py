@@ -167,6 +167,7 @@ class ExcelReadDialog(QtWidgets.QDialog):
         ".tar",
         ".csv",
         ".feather",
+        ".absp",
     }
 
     def __init__(self, parent=None):
@@ -211,6 +212,13 @@ class ExcelReadDialog(QtWidgets.QDialog):
         self.csv_separator.setLayout(self.csv_option)
         self.csv_separator.setVisible(False)
 
+        self.downcast = QtWidgets.QCheckBox("Store scenario values as 32-bit floats")
+        self.downcast.setToolTip(
+            "Halves the memory used by the scenario values, these keep about"
+            " 7 significant digits"
+        )
+        self.downcast.setVisible(False)
+
         self.complete = False
 
         self.buttons = QtWidgets.QDialogButtonBox(
@@ -225,6 +233,7 @@ class ExcelReadDialog(QtWidgets.QDialog):
         grid.addWidget(self.path)
         grid.addWidget(self.excel_sheet)
         grid.addWidget(self.csv_separator)
+        grid.addWidget(self.downcast)
 
         input_box = QtWidgets.QGroupBox(self)
         input_box.setStyleSheet(style_group_box.border_title)
@@ -238,7 +247,7 @@ class ExcelReadDialog(QtWidgets.QDialog):
         path, _ = QtWidgets.QFileDialog.getOpenFileName(
             parent=self,
             caption="Select scenario template file",
-            filter="Excel (*.xlsx);; feather (*.feather);; CSV and Archived (*.csv *.zip *.tar *.bz2 *.gz *.xz);; All Files (*.*)",
+            filter="Excel (*.xlsx);; feather (*.feather);; CSV and Archived (*.csv *.zip *.tar *.bz2 *.gz *.xz);; AB scenario package (*.absp);; All Files (*.*)",
             selectedFilter="All Files (*.*)",
         )
         if path:
@@ -275,6 +284,8 @@ class ExcelReadDialog(QtWidgets.QDialog):
         else:
             self.csv_separator.setVisible(False)
             self.excel_sheet.setVisible(False)
+        # Scenario packages store the values as they were saved
+        self.downcast.setVisible(self.complete and self.path.suffix != ".absp")
         self.buttons.button(QtWidgets.QDialogButtonBox.Ok).setEnabled(self.complete)
 
 
@@ -42,6 +42,10 @@ class SettingsWizard(QtWidgets.QWizard):
             ab_settings.startup_project = new_startup_project
             log.info("Saved startup project as: ", new_startup_project)
 
+        # calculations
+        ab_settings.cache_results = self.field("cache_results")
+        ab_settings.scenario_workers = self.field("scenario_workers")
+
         ab_settings.write_settings()
         projects.change_base_directories(Path(field))
 
@@ -89,8 +93,31 @@ class SettingsPage(QtWidgets.QWizardPage):
 
         self.startup_groupbox.setLayout(self.startup_layout)
 
+        # Calculation options
+        self.cache_results_checkbox = QtWidgets.QCheckBox(
+            "Store LCA results on disk to reuse them"
+        )
+        self.cache_results_checkbox.setChecked(ab_settings.cache_results)
+        self.registerField("cache_results", self.cache_results_checkbox)
+        self.scenario_workers_spinbox = QtWidgets.QSpinBox()
+        self.scenario_workers_spinbox.setRange(1, os.cpu_count() or 1)
+        self.scenario_workers_spinbox.setValue(ab_settings.scenario_workers)
+        self.scenario_workers_spinbox.setToolTip(
+            "The number of processes that calculate the scenarios of a scenario LCA"
+        )
+        self.registerField("scenario_workers", self.scenario_workers_spinbox)
+        self.calculation_groupbox = QtWidgets.QGroupBox("Calculation Options")
+        self.calculation_layout = QtWidgets.QGridLayout()
+        self.calculation_layout.addWidget(self.cache_results_checkbox, 0, 0, 1, 2)
+        self.calculation_layout.addWidget(
+            QtWidgets.QLabel("Scenario worker processes: "), 1, 0
+        )
+        self.calculation_layout.addWidget(self.scenario_workers_spinbox, 1, 1)
+        self.calculation_groupbox.setLayout(self.calculation_layout)
+
         self.layout = QtWidgets.QVBoxLayout()
         self.layout.addWidget(self.startup_groupbox)
+        self.layout.addWidget(self.calculation_groupbox)
         self.layout.addStretch()
         self.layout.addWidget(self.restore_defaults_button)
         self.setLayout(self.layout)
@@ -99,6 +126,8 @@ class SettingsPage(QtWidgets.QWizardPage):
 
         # signals
         self.startup_project_combobox.currentIndexChanged.connect(self.changed)
+        self.cache_results_checkbox.toggled.connect(self.changed)
+        self.scenario_workers_spinbox.valueChanged.connect(self.changed)
         self.bwdir_browse_button.clicked.connect(self.bwdir_browse)
         self.bwdir_remove_button.clicked.connect(self.bwdir_remove)
         self.bwdir.currentTextChanged.connect(self.bwdir_change)
@@ -126,6 +155,8 @@ class SettingsPage(QtWidgets.QWizardPage):
         self.startup_project_combobox.setCurrentText(
             ab_settings.get_default_project_name()
         )
+        self.cache_results_checkbox.setChecked(True)
+        self.scenario_workers_spinbox.setValue(1)
 
     def bwdir_remove(self):
         """
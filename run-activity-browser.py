@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import importlib
+import multiprocessing
 import os
 import sys
 
@@ -87,4 +88,6 @@ def show_splash_screen():
 
 
 if __name__ == "__main__":
+    # worker processes of a frozen build start through this script as well
+    multiprocessing.freeze_support()
     show_splash_screen()
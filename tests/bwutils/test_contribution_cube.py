@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from activity_browser.bwutils.multilca import ContributionCube
+
+
+def pack_rows(cube: ContributionCube, columns: list) -> dict:
+    """Return the CSR arrays of the vectors in the given columns of the
+    second axis, in the order `set_arrays` expects them.
+    """
+    selection = ContributionCube((cube.shape[0], len(columns), cube.shape[-1]))
+    selection[...] = cube[:, columns]
+    return selection.to_arrays()
+
+
+def test_contribution_cube():
+    """The sparse cube reads and writes like the dense array it replaces."""
+    rng = np.random.default_rng(4)
+    dense = np.zeros((3, 2, 4, 25))
+    cube = ContributionCube(dense.shape)
+
+    values = rng.normal(size=(2, 4, 25)) * (rng.random((2, 4, 25)) > 0.5)
+    dense[1] = values
+    cube[1] = values
+    dense[0, 1, 2] = values[0, 0]
+    cube[0, 1, 2] = values[0, 0]
+    dense[2, :, 3] = 0.5
+    cube[2, :, 3] = 0.5
+
+    assert np.array_equal(cube.toarray(), dense)
+    assert np.array_equal(cube[:, 1], dense[:, 1])
+    assert np.array_equal(cube[..., 3], dense[:, :, 3])
+    assert np.array_equal(cube[0, 1, 2], dense[0, 1, 2])
+    assert cube.nnz == np.count_nonzero(dense)
+    with pytest.raises(IndexError):
+        cube[0, 0, 0, 0]
+
+
+def test_contribution_cube_reads_after_writes():
+    """Reads see the writes made after earlier reads."""
+    cube = ContributionCube((2, 3, 6))
+    assert not cube[1].any()
+    cube[1, 2] = np.arange(6)
+    assert np.array_equal(cube[1, 2], np.arange(6))
+    cube.set_arrays((0, [0, 1]), **ContributionCube((2, 6), threshold=0).to_arrays())
+    part = ContributionCube((1, 6))
+    part[0] = np.ones(6)
+    cube.set_arrays((0, 2), **part.to_arrays())
+    assert np.array_equal(cube[0, 2], np.ones(6))
+    cube.load_arrays(**ContributionCube(cube.shape).to_arrays())
+    assert cube.nnz == 0 and not cube.toarray().any()
+
+
+def test_contribution_cube_threshold():
+    cube = ContributionCube((1, 4), threshold=0.1)
+    cube[0] = [10.0, -0.5, 2.0, 0.0]
+    assert np.array_equal(cube[0], [10.0, 0.0, 2.0, 0.0])
+
+
+def test_contribution_cube_arrays():
+    """The cube survives a round trip through its CSR arrays."""
+    rng = np.random.default_rng(5)
+    cube = ContributionCube((2, 3, 10))
+    cube[...] = rng.normal(size=(2, 3, 10)) * (rng.random((2, 3, 10)) > 0.5)
+
+    copy = ContributionCube(cube.shape)
+    copy.load_arrays(**cube.to_arrays())
+    assert np.array_equal(copy.toarray(), cube.toarray())
+
+    part = ContributionCube(cube.shape)
+    part.set_arrays((slice(None), 1), **ContributionCube((2, 10)).to_arrays())
+    part.set_arrays((slice(None), [0, 2]), **pack_rows(cube, [0, 2]))
+    expected = cube.toarray()
+    expected[:, 1] = 0
+    assert np.array_equal(part.toarray(), expected)
+
+    with pytest.raises(ValueError):
+        copy.load_arrays(**ContributionCube((1, 10)).to_arrays())
+    with pytest.raises(ValueError):
+        part.set_arrays(0, **cube.to_arrays())
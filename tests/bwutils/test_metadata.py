@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pandas as pd
+import pytest
+from bw2data import Database, databases, get_activity, projects
+
+from activity_browser.bwutils.metadata import MetaDataStore, SearchIndex
+
+
+def activity_rows() -> list:
+    """Rows in the layout of the `MetaDataStore.query_metadata` query."""
+    isic = [("ISIC rev.4 ecoinvent", "0111:Growing of cereals")]
+    return [
+        (1, "db", "a", "coal mining", "hard coal", "GLO", "process", {"unit": "kg"}),
+        (2, "db", "b", "coal power", "electricity", "DE", "process", {"unit": "kWh"}),
+        (
+            3,
+            "db",
+            "c",
+            "wheat production",
+            "wheat",
+            "CH",
+            "process",
+            {"unit": "kg", "classifications": isic, "comment": "not read"},
+        ),
+        (4, "db", "d", "Carbon dioxide", None, None, "emission", {"categories": ["a"]}),
+    ]
+
+
+@pytest.fixture()
+def metadata_setup(bw2test, ab_app):
+    """A project with a technosphere and a biosphere database."""
+    projects.set_current("metadata_test")
+    Database("md_bio").write(
+        {
+            ("md_bio", "co2"): {
+                "name": "Carbon dioxide",
+                "type": "emission",
+                "unit": "kg",
+                "categories": ("air",),
+            }
+        }
+    )
+    Database("md_tech").write(
+        {
+            ("md_tech", code): {
+                "name": name,
+                "reference product": name,
+                "location": location,
+                "unit": "kg",
+                "comment": "not in the metadata",
+                "exchanges": [],
+            }
+            for code, name, location in [
+                ("a", "coal mining", "GLO"),
+                ("b", "coal power", "DE"),
+                ("c", "wheat production", "CH"),
+            ]
+        }
+    )
+    return MetaDataStore()
+
+
+def test_metadata_frame():
+    """Only the listed fields are read, repeated values are categoricals."""
+    df = MetaDataStore.metadata_frame(activity_rows())
+    assert df.index.tolist() == [("db", "a"), ("db", "b"), ("db", "c"), ("db", "d")]
+    assert df["key"].tolist() == df.index.tolist()
+    assert df["id"].tolist() == [1, 2, 3, 4]
+    assert df["unit"].tolist() == ["kg", "kWh", "kg", ""]
+    assert df["categories"].tolist() == ["", "", "", ("a",)]
+    assert df["location"].tolist() == ["GLO", "DE", "CH", ""]
+    isic = df["ISIC rev.4 ecoinvent"].tolist()
+    assert isic == ["", "", "0111:Growing of cereals", ""]
+    assert "comment" not in df and "classifications" not in df
+    for col in MetaDataStore.CATEGORICAL:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+    assert MetaDataStore.plain(df)["unit"].dtype == object
+    assert MetaDataStore.metadata_frame([]).empty
+
+
+def test_search_index():
+    """Matches are scored by how well the pattern fits, updates are found."""
+    df = MetaDataStore.metadata_frame(activity_rows())
+    index = SearchIndex(df)
+    assert index.search("coal", ["name"]) == {("db", "a"): 2, ("db", "b"): 2}
+    assert index.search("oal", ["name"]) == {("db", "a"): 1, ("db", "b"): 1}
+    assert index.search("wheat", ["reference product"]) == {("db", "c"): 3}
+    assert index.search("0111", ["ISIC rev.4 ecoinvent"]) == {("db", "c"): 2}
+    # The best match over the fields counts
+    assert index.search("de", ["name", "location"]) == {("db", "b"): 3, ("db", "d"): 1}
+    assert index.search("coal", ["comment"]) == {}
+
+    # 'b' is changed, 'a' is deleted
+    changed = MetaDataStore.metadata_frame(
+        [(2, "db", "b", "wind power", "electricity", "DE", "process", {})]
+    )
+    index.update([("db", "a"), ("db", "b")], changed)
+    assert index.search("coal", ["name"]) == {}
+    assert index.search("wind", ["name"]) == {("db", "b"): 2}
+    index.build([(key, index.texts[doc]) for key, doc in index.positions.items()])
+    assert index.search("wind", ["name"]) == {("db", "b"): 2}
+    assert len(index.keys) == 3
+
+
+def test_add_metadata(metadata_setup):
+    store = metadata_setup
+    store.add_metadata(["md_tech", "md_bio"])
+    df = store.dataframe
+    assert len(df) == 4 and store.databases == {"md_tech", "md_bio"}
+    assert "comment" not in df
+    assert df.loc[("md_bio", "co2"), "categories"] == ("air",)
+    activity = get_activity(("md_tech", "b"))
+    assert store.keys_from_ids([activity.id, -1]) == [("md_tech", "b"), None]
+    with pytest.raises(ValueError):
+        store.add_metadata(["no such database"])
+
+
+def test_pending_updates(metadata_setup):
+    """Updates are collected and applied together when the data is read."""
+    store = metadata_setup
+    store.add_metadata(["md_tech"])
+    id_index = store.id_index
+
+    activity = get_activity(("md_tech", "a"))
+    activity["name"] = "lignite mining"
+    activity.save()
+    new = Database("md_tech").new_activity(code="d", name="new", unit="kg")
+    new.save()
+    get_activity(("md_tech", "b")).delete()
+    for key in [("md_tech", "a"), ("md_tech", "d"), ("md_tech", "b")]:
+        store.update_metadata(key)
+    # An activity of a database that was not added yet brings its database
+    store.update_metadata(("md_bio", "co2"))
+    assert len(store._pending) == 4
+    assert store._dataframe.loc[("md_tech", "a"), "name"] == "coal mining"
+
+    df = store.dataframe
+    assert not store._pending
+    assert df.loc[("md_tech", "a"), "name"] == "lignite mining"
+    assert ("md_tech", "d") in df.index and ("md_tech", "b") not in df.index
+    assert "md_bio" in store.databases and ("md_bio", "co2") in df.index
+    assert store.id_index is not id_index
+    assert store.keys_from_ids([new.id]) == [("md_tech", "d")]
+
+
+def test_snapshots(metadata_setup, monkeypatch):
+    """A database is read from its snapshot until it is modified."""
+    metadata_setup.add_metadata(["md_tech"])
+    path = MetaDataStore.snapshot_path("md_tech")
+    assert os.path.isfile(path)
+    expected = metadata_setup.dataframe
+
+    def query(condition):
+        raise AssertionError("The snapshot should have been used.")
+
+    with monkeypatch.context() as m:
+        m.setattr(MetaDataStore, "query_metadata", staticmethod(query))
+        store = MetaDataStore()
+        store.add_metadata(["md_tech"])
+        pd.testing.assert_frame_equal(store.dataframe, expected)
+
+    databases.set_modified("md_tech")
+    store = MetaDataStore()
+    assert store.load_snapshot("md_tech") is None
+    with open(path, "wb") as f:
+        f.write(b"damaged")
+    assert store.load_snapshot("md_tech") is None
+    store.add_metadata(["md_tech"])
+    assert store.load_snapshot("md_tech") is not None
+
+
+def test_search_index_updates(metadata_setup):
+    """The search index of a database follows the updates of the metadata."""
+    store = metadata_setup
+    store.add_metadata(["md_tech"])
+    index = store.search_index("md_tech")
+    assert store.search_index("md_tech") is index
+    assert set(index.search("coal", ["name"])) == {("md_tech", "a"), ("md_tech", "b")}
+
+    activity = get_activity(("md_tech", "c"))
+    activity["name"] = "coal washing"
+    activity.save()
+    store.update_metadata(activity.key)
+    assert set(store.search_index("md_tech").search("coal", ["name"])) == {
+        ("md_tech", "a"),
+        ("md_tech", "b"),
+        ("md_tech", "c"),
+    }
+
+
+def test_labels(metadata_setup):
+    """Labels are joined per key and refreshed when the metadata changes."""
+    store = metadata_setup
+    store.add_metadata(["md_tech"])
+    keys = [("md_tech", "b"), ("md_tech", "missing"), ("md_tech", "a")]
+    assert store.get_labels(keys, ["name", "location"]) == [
+        "coal power | DE",
+        None,
+        "coal mining | GLO",
+    ]
+    assert store.get_labels(keys[:1], ["name", "no field"], ", ") == ["coal power, nan"]
+    assert store.get_labels(keys[:1], []) == [""]
+
+    activity = get_activity(("md_tech", "b"))
+    activity["location"] = "FR"
+    activity.save()
+    store.update_metadata(activity.key)
+    assert store.get_labels(keys[:1], ["name", "location"]) == ["coal power | FR"]
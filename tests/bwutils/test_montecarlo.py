@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from bw2data import Database, Method, calculation_setups, projects
+
+from activity_browser.bwutils import MonteCarloLCA
+
+
+@pytest.fixture()
+def mc_setup(bw2test, ab_app):
+    """A project with uncertain technosphere, biosphere and characterization
+    values and a calculation setup of two reference flows.
+    """
+    projects.set_current("monte_carlo_test")
+    Database("mc_bio").write(
+        {
+            ("mc_bio", "co2"): {"name": "CO2", "type": "emission", "unit": "kg"},
+            ("mc_bio", "ch4"): {"name": "CH4", "type": "emission", "unit": "kg"},
+        }
+    )
+
+    def lognormal(amount: float) -> dict:
+        return {"uncertainty type": 2, "loc": np.log(amount), "scale": 0.2}
+
+    Database("mc_tech").write(
+        {
+            ("mc_tech", "a"): {
+                "name": "a",
+                "unit": "kg",
+                "exchanges": [
+                    {"input": ("mc_tech", "a"), "amount": 1, "type": "production"},
+                    {
+                        "input": ("mc_tech", "b"),
+                        "amount": 0.5,
+                        "type": "technosphere",
+                        **lognormal(0.5),
+                    },
+                    {
+                        "input": ("mc_bio", "co2"),
+                        "amount": 2,
+                        "type": "biosphere",
+                        **lognormal(2),
+                    },
+                ],
+            },
+            ("mc_tech", "b"): {
+                "name": "b",
+                "unit": "kg",
+                "exchanges": [
+                    {"input": ("mc_tech", "b"), "amount": 1, "type": "production"},
+                    {
+                        "input": ("mc_bio", "ch4"),
+                        "amount": 0.1,
+                        "type": "biosphere",
+                        **lognormal(0.1),
+                    },
+                ],
+            },
+        }
+    )
+    method = ("mc", "climate")
+    Method(method).write(
+        [
+            (("mc_bio", "co2"), 1.0),
+            (("mc_bio", "ch4"), {"amount": 28.0, **lognormal(28.0)}),
+        ]
+    )
+    calculation_setups["mc_test"] = {
+        "inv": [{("mc_tech", "a"): 1}, {("mc_tech", "b"): 2}],
+        "ia": [method],
+    }
+    return "mc_test"
+
+
+def test_monte_carlo_workers(mc_setup):
+    """A seeded run gives identical results for any number of workers."""
+    iterations = 2 * MonteCarloLCA.CHUNK_SIZE + 10
+    results = []
+    for workers in (1, 2, 3):
+        mc = MonteCarloLCA(mc_setup)
+        mc.calculate(iterations=iterations, seed=11, workers=workers)
+        results.append(mc.results)
+    assert results[0].shape == (iterations, 2, 1)
+    assert len(np.unique(results[0][:, 0, 0])) == iterations
+    assert np.array_equal(results[0], results[1])
+    assert np.array_equal(results[0], results[2])
+
+    mc = MonteCarloLCA(mc_setup)
+    mc.calculate(iterations=iterations, seed=12, workers=2)
+    assert not np.array_equal(results[0], mc.results)
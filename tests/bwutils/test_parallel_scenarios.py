@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from activity_browser.bwutils.multilca import ContributionCube
+from activity_browser.bwutils.superstructure.mlca import SuperstructureMLCA
+
+
+def scenario_lca(workers: int, scenarios: int = 5) -> SuperstructureMLCA:
+    """Return a SuperstructureMLCA of a small random system with scenario
+    values for a few technosphere, production and biosphere exchanges,
+    without a project.
+    """
+    rng = np.random.default_rng(6)
+    n, b = 25, 8
+    inputs = sparse.random(n, n, density=0.1, random_state=6) * -0.1
+    technosphere = (sparse.eye(n) + inputs).tocsr()
+    biosphere = sparse.random(b, n, density=0.3, random_state=7).tocsr()
+
+    mlca = SuperstructureMLCA.__new__(SuperstructureMLCA)
+    mlca.func_units = [{("db", "0"): 1.0}, {("db", "3"): 2.0}]
+    mlca.cf_vectors = rng.random((2, b))
+    mlca.total, mlca.workers = scenarios, workers
+    mlca._current_index, mlca._matrices_scenario = 0, None
+    mlca.lca = SimpleNamespace(
+        technosphere_matrix=technosphere,
+        biosphere_matrix=biosphere,
+        product_dict={("db", str(i)): i for i in range(n)},
+    )
+    mlca.default_technosphere_matrix = technosphere.copy()
+    mlca.default_biosphere_matrix = biosphere.copy()
+    mlca.defaults = {
+        "technosphere": "default_technosphere_matrix",
+        "production": "default_technosphere_matrix",
+        "biosphere": "default_biosphere_matrix",
+    }
+    exchanges = [
+        (1, 0, "technosphere", 1),
+        (4, 2, "technosphere", 1),
+        (5, 5, "production", 0),
+        (2, 0, "biosphere", 0),
+        (6, 9, "biosphere", 0),
+    ]
+    mlca.indices = [(None, None, kind) for _, _, kind, _ in exchanges]
+    mlca.matrix_indices = np.array(
+        [(r, c, t) for r, c, _, t in exchanges],
+        dtype=[("row", np.uint32), ("col", np.uint32), ("type", np.uint8)],
+    )
+    mlca.values = np.abs(rng.normal(size=(len(exchanges), scenarios))) * 0.2
+    mlca.values[2] += 1.0
+    mlca.values[0, 1] = np.nan
+    mlca.prepare_scenario_slots()
+
+    shape = (len(mlca.func_units), len(mlca.cf_vectors), scenarios)
+    mlca.lca_scores = np.zeros(shape)
+    mlca.elementary_flow_contributions = ContributionCube(shape + (b,))
+    mlca.process_contributions = ContributionCube(shape + (n,))
+    mlca.scaling_factors, mlca.technosphere_flows, mlca.inventory = {}, {}, {}
+    return mlca
+
+
+def test_parallel_scenarios():
+    """The results do not depend on the number of worker processes, and
+    match applying and solving every scenario.
+    """
+    single, double = scenario_lca(workers=1), scenario_lca(workers=2)
+    single._perform_parallel_calculations()
+    double._perform_parallel_calculations()
+
+    assert np.array_equal(single.lca_scores, double.lca_scores)
+    for name in ("elementary_flow_contributions", "process_contributions"):
+        assert np.array_equal(
+            getattr(single, name).toarray(), getattr(double, name).toarray()
+        )
+    for name in ("scaling_factors", "technosphere_flows", "inventory"):
+        first, second = getattr(single, name), getattr(double, name)
+        assert first.keys() == second.keys()
+        assert all(np.array_equal(first[k], second[k]) for k in first)
+
+    demand = single.demand_matrix()
+    for i in range(single.total):
+        a = single.scenario_matrix("technosphere_matrix", i)
+        bio = single.scenario_biosphere_matrix(i)
+        for row, func_unit in enumerate(single.func_units):
+            supply = spsolve(a.tocsc(), demand[:, row])
+            key = (str(func_unit), i)
+            assert np.allclose(single.scaling_factors[key], supply)
+            assert np.allclose(single.technosphere_flows[key], supply * a.diagonal())
+            assert np.allclose(single.inventory[key], bio @ supply)
+            scores = single.cf_vectors @ bio @ supply
+            assert np.allclose(single.lca_scores[row, :, i], scores)
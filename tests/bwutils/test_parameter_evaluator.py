@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from bw2data import Database, get_activity, parameters, projects
+
+from activity_browser.bwutils.manager import (
+    MonteCarloParameterManager,
+    ParameterEvaluator,
+    ParameterManager,
+)
+
+
+def lognormal(amount: float) -> dict:
+    return {"uncertainty type": 2, "loc": np.log(amount), "scale": 0.3}
+
+
+@pytest.fixture()
+def parameter_setup(bw2test, ab_app):
+    """A project whose exchange formulas depend on activity parameters, that
+    depend on database parameters, that depend on project parameters.
+    """
+    projects.set_current("parameter_evaluator_test")
+    Database("pe_bio").write(
+        {("pe_bio", "co2"): {"name": "CO2", "type": "emission", "unit": "kg"}}
+    )
+    Database("pe_tech").write(
+        {
+            ("pe_tech", "x"): {
+                "name": "x",
+                "unit": "kg",
+                "exchanges": [
+                    {"input": ("pe_tech", "x"), "amount": 1, "type": "production"},
+                    {
+                        "input": ("pe_tech", "y"),
+                        "amount": 1,
+                        "type": "technosphere",
+                        "formula": "e * 2",
+                    },
+                    {
+                        "input": ("pe_bio", "co2"),
+                        "amount": 1,
+                        "type": "biosphere",
+                        # min() does not work on arrays, it runs per sample
+                        "formula": "min(e, c) + f",
+                    },
+                ],
+            },
+            ("pe_tech", "y"): {
+                "name": "y",
+                "unit": "kg",
+                "exchanges": [
+                    {"input": ("pe_tech", "y"), "amount": 1, "type": "production"},
+                ],
+            },
+        }
+    )
+    parameters.new_project_parameters(
+        [
+            {"name": "a", "amount": 2, **lognormal(2)},
+            # Defined before the parameter it depends on
+            {"name": "b0", "amount": 0, "formula": "b * 2"},
+            {"name": "b", "amount": 6, "formula": "a * 3"},
+        ]
+    )
+    parameters.new_database_parameters(
+        [
+            {"name": "c", "amount": 7, "formula": "b0 + 1"},
+            {"name": "d", "amount": 0.5, **lognormal(0.5)},
+        ],
+        "pe_tech",
+    )
+    parameters.new_activity_parameters(
+        [
+            {
+                "name": "e",
+                "amount": 1,
+                "formula": "c * d + a",
+                "database": "pe_tech",
+                "code": "x",
+            },
+            {
+                "name": "f",
+                "amount": 0.1,
+                "database": "pe_tech",
+                "code": "x",
+                **lognormal(0.1),
+            },
+        ],
+        "pe_group",
+    )
+    parameters.add_exchanges_to_group("pe_group", get_activity(("pe_tech", "x")))
+    parameters.recalculate()
+
+
+def test_evaluator_matches_manager(parameter_setup):
+    """Evaluating the current amounts gives the amounts of `calculate`."""
+    manager = ParameterManager()
+    evaluator = ParameterEvaluator(manager.initial, manager.parameters)
+    amounts = np.array([p.amount for p in manager.parameters])
+    expected = manager.calculate()
+    assert len(expected) == 2
+    assert np.allclose(evaluator.evaluate(amounts)[:, 0], expected)
+
+
+def test_evaluator_order(parameter_setup):
+    """Every formula is evaluated after the formulas it refers to."""
+    manager = ParameterManager()
+    evaluator = ParameterEvaluator(manager.initial, manager.parameters)
+    position = {node: i for i, node in enumerate(evaluator.order)}
+    for node in evaluator.order:
+        for ref in evaluator.references[node].values():
+            if evaluator.formulas[ref] is not None:
+                assert position[ref] < position[node]
+    assert set(evaluator.exchanges) <= set(evaluator.order)
+
+
+def test_next_chunk(parameter_setup):
+    """The amounts of a chunk match `calculate` for every iteration."""
+    iterations = 6
+    manager = MonteCarloParameterManager(seed=3)
+    amounts, values = manager.next_chunk(iterations)
+    assert amounts.shape == (len(manager.parameters), iterations)
+    assert values.shape == (len(manager.indices), iterations)
+    # The uncertain parameters are sampled, the formulas keep their amount
+    names = [p.name for p in manager.parameters]
+    assert len(np.unique(amounts[names.index("a")])) == iterations
+    assert len(np.unique(amounts[names.index("f")])) == iterations
+
+    for i in range(iterations):
+        reference = ParameterManager()
+        reference.parameters.update(amounts[:, i])
+        assert np.allclose(values[:, i], reference.calculate())
+
+    # The manager is left at the last iteration
+    assert np.allclose(
+        [p.amount for p in manager.parameters], amounts[:, iterations - 1]
+    )
+    assert np.allclose(manager.calculate(), values[:, iterations - 1])
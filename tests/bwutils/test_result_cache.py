@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from bw2data import Database, Method, calculation_setups, get_activity, projects
+
+from activity_browser.bwutils import MLCA, SuperstructureMLCA
+from activity_browser.bwutils.result_cache import ResultCache
+
+
+@pytest.fixture()
+def cache_setup(bw2test, ab_app):
+    """A project with a small system and a calculation setup for it."""
+    projects.set_current("result_cache_test")
+    Database("rc_bio").write(
+        {("rc_bio", "co2"): {"name": "CO2", "type": "emission", "unit": "kg"}}
+    )
+    Database("rc_tech").write(
+        {
+            ("rc_tech", "a"): {
+                "name": "a",
+                "unit": "kg",
+                "exchanges": [
+                    {"input": ("rc_tech", "a"), "amount": 1, "type": "production"},
+                    {"input": ("rc_tech", "b"), "amount": 0.5, "type": "technosphere"},
+                    {"input": ("rc_bio", "co2"), "amount": 2, "type": "biosphere"},
+                ],
+            },
+            ("rc_tech", "b"): {
+                "name": "b",
+                "unit": "kg",
+                "exchanges": [
+                    {"input": ("rc_tech", "b"), "amount": 1, "type": "production"},
+                    {"input": ("rc_bio", "co2"), "amount": 3, "type": "biosphere"},
+                ],
+            },
+        }
+    )
+    Method(("rc", "climate")).write([(("rc_bio", "co2"), 1.0)])
+    calculation_setups["rc_test"] = {
+        "inv": [{("rc_tech", "a"): 1}, {("rc_tech", "b"): 1}],
+        "ia": [("rc", "climate")],
+    }
+    return "rc_test"
+
+
+def stored_results(size: int) -> SimpleNamespace:
+    """An object with incompressible results of about `size` bytes."""
+    values = np.random.default_rng(size).random(size // 8)
+    return SimpleNamespace(
+        result_arrays=lambda: {"lca_scores": values},
+        load_result_arrays=lambda arrays: None,
+    )
+
+
+def test_result_cache_round_trip(cache_setup, tmp_path):
+    """Loaded results match the calculated results, inventories included."""
+    mlca = MLCA(cache_setup)
+    mlca.calculate()
+    cache = ResultCache(str(tmp_path))
+    key = MLCA.fingerprint(cache_setup)
+    assert not cache.load(MLCA(cache_setup), key)
+    cache.store(mlca, key)
+
+    loaded = MLCA(cache_setup)
+    assert cache.load(loaded, key)
+    assert np.array_equal(loaded.lca_scores, mlca.lca_scores)
+    for name in MLCA.RESULT_CUBES:
+        stored, calculated = getattr(loaded, name), getattr(mlca, name)
+        assert np.array_equal(stored.toarray(), calculated.toarray())
+    for name in MLCA.RESULT_DICTS:
+        stored, calculated = getattr(loaded, name), getattr(mlca, name)
+        assert stored.keys() == calculated.keys()
+        assert all(np.array_equal(stored[k], calculated[k]) for k in stored)
+    for key in mlca.result_keys():
+        stored, calculated = loaded.inventories[key], mlca.inventories[key]
+        assert np.allclose(stored.toarray(), calculated.toarray())
+    index = (1, 0)
+    assert np.allclose(
+        loaded.characterized_inventories[index].toarray(),
+        mlca.characterized_inventories[index].toarray(),
+    )
+
+
+def test_result_cache_invalid(tmp_path):
+    """Results that cannot be read are removed."""
+    cache = ResultCache(str(tmp_path))
+    cache.store(stored_results(800), "bad")
+    with open(cache.path("bad"), "rb") as f:
+        truncated = f.read()[:400]
+    for content in (truncated, b"not a zip file", b""):
+        with open(cache.path("bad"), "wb") as f:
+            f.write(content)
+        assert not cache.load(stored_results(80), "bad")
+        assert not os.path.exists(cache.path("bad"))
+
+
+def test_result_cache_fingerprint(cache_setup):
+    """The fingerprint changes with the data, methods and scenarios."""
+    fingerprint = MLCA.fingerprint(cache_setup)
+    assert MLCA.fingerprint(cache_setup) == fingerprint
+
+    exchange = next(iter(get_activity(("rc_tech", "a")).biosphere()))
+    exchange["amount"] = 4
+    exchange.save()
+    changed = MLCA.fingerprint(cache_setup)
+    assert changed != fingerprint
+
+    Method(("rc", "climate")).write([(("rc_bio", "co2"), 2.0)])
+    assert MLCA.fingerprint(cache_setup) not in (fingerprint, changed)
+
+    df = pd.DataFrame(
+        {"scenario 1": [0.5], "scenario 2": [0.7]},
+        index=pd.MultiIndex.from_tuples(
+            [(("rc_tech", "b"), ("rc_tech", "a"), "technosphere")]
+        ),
+    )
+    scenario = SuperstructureMLCA.fingerprint(cache_setup, df)
+    assert scenario != MLCA.fingerprint(cache_setup)
+    df.iloc[0, 1] = 0.8
+    assert SuperstructureMLCA.fingerprint(cache_setup, df) != scenario
+    renamed = df.rename(columns={"scenario 2": "scenario 3"})
+    assert SuperstructureMLCA.fingerprint(
+        cache_setup, renamed
+    ) != SuperstructureMLCA.fingerprint(cache_setup, df)
+
+
+def test_result_cache_prune(tmp_path):
+    """The least recently used results beyond the size limit are removed."""
+    size = 8000
+    cache = ResultCache(str(tmp_path), maxbytes=int(2.5 * size))
+    cache.store(stored_results(size), "first")
+    cache.store(stored_results(size), "second")
+    past = time.time() - 100
+    os.utime(cache.path("first"), (past, past))
+    os.utime(cache.path("second"), (past + 10, past + 10))
+
+    # Loading marks the results as used
+    assert cache.load(stored_results(size), "first")
+    cache.store(stored_results(size), "third")
+    assert os.path.exists(cache.path("first"))
+    assert not os.path.exists(cache.path("second"))
+    assert os.path.exists(cache.path("third"))
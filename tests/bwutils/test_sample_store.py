@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import gc
+import os
+
+import numpy as np
+
+from activity_browser.bwutils.montecarlo import SampleStore
+
+
+def sampled_vectors(iterations: int, length: int) -> np.ndarray:
+    """Return vectors whose values identify their iteration and position."""
+    return np.arange(iterations)[:, np.newaxis] + np.arange(length) / 1000
+
+
+def test_sample_store_round_trip(tmp_path):
+    """Stored vectors are read back per position for all iterations."""
+    store = SampleStore(6, directory=str(tmp_path))
+    vectors = sampled_vectors(6, 4)
+    store.create("technosphere", 4)
+    store.create(("method", 1), 2)
+    assert "technosphere" in store and ("method", 1) in store
+    assert "biosphere" not in store
+
+    store.write("technosphere", 0, vectors)
+    store.write(("method", 1), 0, vectors[:, :2] * 2)
+    assert np.array_equal(store.columns("technosphere", [3, 1]), vectors[:, [3, 1]])
+    assert np.array_equal(store.columns(("method", 1), 1), vectors[:, 1] * 2)
+    assert isinstance(store.columns("technosphere", [0]), np.ndarray)
+    # The arrays are stored column-major, so a column is contiguous on disk
+    assert store.arrays["technosphere"].flags.f_contiguous
+    assert os.path.dirname(store.path) == str(tmp_path)
+
+
+def test_sample_store_chunks(tmp_path):
+    """Chunks of iterations can be written in any order."""
+    store = SampleStore(10, directory=str(tmp_path))
+    vectors = sampled_vectors(10, 3)
+    store.create("biosphere", 3)
+    for first in (8, 0, 4):
+        store.write("biosphere", first, vectors[first : first + 4])
+    assert np.array_equal(store.columns("biosphere", [0, 1, 2]), vectors)
+
+
+def test_sample_store_cleanup(tmp_path):
+    """The files are removed on closing and when the store is collected."""
+    store = SampleStore(2, directory=str(tmp_path))
+    store.create("technosphere", 5)
+    path = store.path
+    assert os.listdir(path)
+    store.close()
+    assert not os.path.exists(path) and not store.arrays
+    # Closing twice does nothing
+    store.close()
+
+    store = SampleStore(2, directory=str(tmp_path))
+    store.create("technosphere", 5)
+    path = store.path
+    del store
+    gc.collect()
+    assert not os.path.exists(path)
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from ast import literal_eval
+
+import numpy as np
+import pandas as pd
+
+from activity_browser.bwutils.superstructure.dataframe import scenario_dtype
+from activity_browser.bwutils.superstructure.file_imports import ABCSVImporter
+from activity_browser.bwutils.superstructure.package import ScenarioPackage
+from activity_browser.bwutils.superstructure.utils import (
+    SUPERSTRUCTURE,
+    parse_tuple_strings,
+)
+
+
+def convert_tuple_str(x):
+    """The conversion used for the key columns before `parse_tuple_strings`."""
+    try:
+        return literal_eval(x)
+    except (ValueError, SyntaxError):
+        return x
+
+
+def exchange_rows(n: int) -> pd.DataFrame:
+    """Return the superstructure columns of `n` technosphere exchanges."""
+    inputs = [("db", "input {}".format(i)) for i in range(n)]
+    return pd.DataFrame(
+        {
+            "from activity name": [k[1] for k in inputs],
+            "from reference product": [k[1] for k in inputs],
+            "from location": ["GLO"] * n,
+            "from categories": [np.nan] * n,
+            "from database": ["db"] * n,
+            "from key": inputs,
+            "to activity name": ["output"] * n,
+            "to reference product": ["output"] * n,
+            "to location": ["GLO"] * n,
+            "to categories": [np.nan] * n,
+            "to database": ["db"] * n,
+            "to key": [("db", "output")] * n,
+            "flow type": ["technosphere"] * n,
+        }
+    )
+
+
+def test_csv_downcast(tmp_path):
+    """Downcast csv files hold float32 scenario columns, text is kept."""
+    df = exchange_rows(7)
+    df["low"] = np.linspace(0.1, 0.7, 7)
+    df["high"] = np.arange(7)
+    df["text"] = ["1", "2", "x", "4", "5", "6", "7"]
+    path = tmp_path / "scenarios.csv.gz"
+    df.to_csv(path, sep=";", index=False)
+
+    ABCSVImporter.CHUNKSIZE, chunksize = 3, ABCSVImporter.CHUNKSIZE
+    try:
+        full = ABCSVImporter.read_file(path)
+        small = ABCSVImporter.read_file(path, downcast=True)
+    finally:
+        ABCSVImporter.CHUNKSIZE = chunksize
+    assert full["low"].dtype == np.float64
+    assert small["low"].dtype == np.float32 and small["high"].dtype == np.float32
+    assert small["text"].dtype == object
+    assert np.allclose(small["low"], full["low"])
+    assert small["from key"].tolist() == df["from key"].tolist()
+    assert scenario_dtype(small) == np.float64
+    assert scenario_dtype(small.drop(columns="text")) == np.float32
+
+
+def test_scenario_package_float32(tmp_path):
+    """float32 scenario values are stored and memory-mapped as float32."""
+    df = exchange_rows(5)
+    df["scenario 1"] = np.linspace(1, 2, 5, dtype=np.float32)
+    df["scenario 2"] = np.array([0.5, np.nan, 1.5, 2.5, 3.5], dtype=np.float32)
+    path = tmp_path / "scenarios.absp"
+
+    package = ScenarioPackage.save(path, df)
+    assert package.header["dtype"] == "<f4"
+    assert package.values.dtype == np.float32 and package.verify()
+    assert np.array_equal(
+        package.values, df[["scenario 1", "scenario 2"]].to_numpy(), equal_nan=True
+    )
+    assert scenario_dtype(package.scenario_frame()) == np.float32
+    assert package.dataframe().loc[:, SUPERSTRUCTURE].shape == (5, 13)
+
+    # A mix of float32 and float64 is stored as float64
+    df["scenario 2"] = df["scenario 2"].astype(np.float64)
+    package = ScenarioPackage.save(path, df)
+    assert package.values.dtype == np.float64
+
+    # Packages without a dtype in the header hold float64 values
+    del package.header["dtype"]
+    assert ScenarioPackage(path, package.header, package.index).values.dtype == (
+        np.float64
+    )
+
+
+def test_parse_tuple_strings():
+    """Parsing matches evaluating every value as a python literal."""
+    column = pd.Series(
+        [
+            "('db', 'code')",
+            '("db", "code 2")',
+            "( 'db' ,'code' )",
+            "('db', 'it\\'s')",
+            "('air', 'urban')",
+            "('air',)",
+            "not a key",
+            "('db', 'a', 'b')",
+            "",
+            np.nan,
+            "('db', 'code')",
+        ]
+    )
+    parsed = parse_tuple_strings(column)
+    expected = column.map(convert_tuple_str)
+    assert parsed.index.equals(column.index)
+    for value, other in zip(parsed, expected):
+        if isinstance(other, float):
+            assert np.isnan(value)
+        else:
+            assert value == other and type(value) is type(other)
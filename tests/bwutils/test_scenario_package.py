@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from activity_browser.bwutils.errors import WrongFileTypeImportError
+from activity_browser.bwutils.superstructure.package import ScenarioPackage
+from activity_browser.bwutils.superstructure.utils import SUPERSTRUCTURE
+
+
+def package_frame() -> pd.DataFrame:
+    """Return a small scenario file to store in a package."""
+    df = pd.DataFrame(
+        {
+            "from activity name": ["a", "b", "c", "d"],
+            "from reference product": ["a", "b", "c", "d"],
+            "from location": ["GLO"] * 4,
+            "from categories": [np.nan, np.nan, ("air",), np.nan],
+            "from database": ["db", "db", "bio", "db"],
+            "from key": [("db", "a"), ("db", "b"), ("bio", "c"), ("db", "d")],
+            "to activity name": ["e"] * 4,
+            "to reference product": ["e"] * 4,
+            "to location": ["GLO"] * 4,
+            "to categories": [np.nan] * 4,
+            "to database": ["db"] * 4,
+            "to key": [("db", "e")] * 4,
+            "flow type": ["technosphere", "production", "biosphere", "technosphere"],
+        }
+    )
+    df["scenario 1"] = [1.0, 2.0, 3.0, 4.0]
+    df["scenario 2"] = [0.5, 1.5, np.nan, -4.0]
+    return df
+
+
+def test_scenario_package(tmp_path):
+    """A package holds the data it was saved with and detects changes."""
+    df = package_frame()
+    path = tmp_path / "scenarios.absp"
+    package = ScenarioPackage.save(path, df)
+    assert package.verify()
+
+    frame = package.dataframe()
+    assert frame.columns.tolist() == df.columns.tolist()
+    assert frame.loc[:, SUPERSTRUCTURE].reset_index(drop=True).equals(
+        df.loc[:, SUPERSTRUCTURE]
+    )
+    assert np.array_equal(
+        package.values, df[["scenario 1", "scenario 2"]].to_numpy(), equal_nan=True
+    )
+    assert package.exchange_index()[0] == (("db", "a"), ("db", "e"), "technosphere")
+
+    # Saving over the package replaces it, the open package is unaffected
+    df["scenario 1"] = 0.0
+    other = ScenarioPackage.save(path, df)
+    assert other.verify() and np.all(other.values[:, 0] == 0.0)
+    assert np.array_equal(package.values[:, 0], [1.0, 2.0, 3.0, 4.0])
+
+    # A changed value is detected by the digest
+    offset, _ = other.header["values"]
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(np.float64(42.0).tobytes())
+    assert not ScenarioPackage.open(path).verify()
+
+
+def test_scenario_package_close(tmp_path, monkeypatch):
+    """Open packages are closed before the file is replaced on Windows."""
+    df = package_frame()
+    path = tmp_path / "scenarios.absp"
+    package = ScenarioPackage.save(path, df)
+    elsewhere = ScenarioPackage.save(tmp_path / "other.absp", df)
+    assert isinstance(package.values, np.memmap)
+
+    monkeypatch.setattr(ScenarioPackage, "CLOSE_BEFORE_REPLACE", True)
+    df["scenario 1"] = 0.0
+    other = ScenarioPackage.save(path, df)
+    assert not isinstance(package.values, np.memmap)
+    assert package not in ScenarioPackage._open
+    assert np.array_equal(package.values[:, 0], [1.0, 2.0, 3.0, 4.0])
+    assert isinstance(elsewhere.values, np.memmap) and other.verify()
+
+
+def test_scenario_package_invalid(tmp_path):
+    path = tmp_path / "scenarios.absp"
+    path.write_bytes(b"not a scenario package at all")
+    with pytest.raises(WrongFileTypeImportError):
+        ScenarioPackage.open(path)
+    with pytest.raises(ValueError):
+        ScenarioPackage.save(path, package_frame().iloc[0:0])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from activity_browser.bwutils.superstructure.mlca import matrix_slots
+from activity_browser.bwutils.workers import calculate_scenarios
+
+
+def lil_write(matrix: sparse.spmatrix, rows, cols, values) -> sparse.csr_matrix:
+    """Write the values into the matrix the way scenarios used to be applied."""
+    matrix = matrix.tolil()
+    matrix[rows, cols] = values
+    return matrix.tocsr()
+
+
+def test_matrix_slots():
+    """Writing into the slots matches writing the entries of the matrix."""
+    rng = np.random.default_rng(1)
+    matrix = sparse.random(20, 20, density=0.2, random_state=1).tocsr()
+    pairs = rng.choice(400, size=40, replace=False)
+    rows, cols = pairs // 20, pairs % 20
+    values = rng.normal(size=40)
+
+    patched, slots = matrix_slots(matrix, rows, cols)
+    assert np.array_equal(patched.toarray(), matrix.toarray())
+    patched.data[slots] = values
+    assert np.array_equal(
+        patched.toarray(), lil_write(matrix, rows, cols, values).toarray()
+    )
+
+
+def test_calculate_scenarios():
+    """The scenario worker matches applying and solving every scenario."""
+    rng = np.random.default_rng(2)
+    n, b, scenarios = 15, 6, 3
+    inputs = sparse.random(n, n, density=0.15, random_state=2) * -0.1
+    technosphere = (sparse.eye(n) + inputs).tocsr()
+    biosphere = sparse.random(b, n, density=0.4, random_state=3).tocsr()
+    cf_vectors = rng.random((2, b))
+    demand = np.zeros((n, 2))
+    demand[0, 0], demand[4, 1] = 1.0, 3.0
+
+    tech_rows, tech_cols = np.array([1, 2, 5]), np.array([0, 3, 5])
+    tech_values = np.vstack(
+        [-rng.random((2, scenarios)) * 0.1, np.full(scenarios, 2.0)]
+    )
+    bio_rows, bio_cols = np.array([0, 3]), np.array([1, 1])
+    bio_values = rng.random((2, scenarios))
+    technosphere, tech_slots = matrix_slots(technosphere, tech_rows, tech_cols)
+    biosphere, bio_slots = matrix_slots(biosphere, bio_rows, bio_cols)
+
+    scores, ef, pc, supply = calculate_scenarios(
+        technosphere,
+        biosphere,
+        tech_slots,
+        tech_values,
+        bio_slots,
+        bio_values,
+        demand,
+        cf_vectors,
+    )
+    ef = sparse.csr_matrix(
+        (ef["data"], ef["indices"], ef["indptr"]), shape=(2 * 2 * scenarios, b)
+    ).toarray().reshape(2, 2, scenarios, b)
+    pc = sparse.csr_matrix(
+        (pc["data"], pc["indices"], pc["indptr"]), shape=(2 * 2 * scenarios, n)
+    ).toarray().reshape(2, 2, scenarios, n)
+
+    for i in range(scenarios):
+        a = lil_write(technosphere, tech_rows, tech_cols, tech_values[:, i])
+        bio = lil_write(biosphere, bio_rows, bio_cols, bio_values[:, i])
+        for fu in range(2):
+            supply_array = spsolve(a, demand[:, fu])
+            assert np.allclose(supply[:, fu, i], supply_array)
+            for m, cfs in enumerate(cf_vectors):
+                characterized = sparse.diags(cfs) @ bio @ sparse.diags(supply_array)
+                assert np.isclose(scores[fu, m, i], characterized.sum())
+                assert np.allclose(ef[fu, m, i], characterized.sum(axis=1).A1)
+                assert np.allclose(pc[fu, m, i], characterized.sum(axis=0).A1)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from activity_browser.bwutils.errors import (
+    ActivityProductionValueError,
+    IncompatibleDatabaseNamingError,
+)
+from activity_browser.bwutils.superstructure.file_imports import ABFileImporter
+
+
+def validation_frame() -> pd.DataFrame:
+    """Return a small scenario file in the superstructure format to validate."""
+    df = pd.DataFrame(
+        {
+            "from activity name": ["a", "b", "c", "d"],
+            "from reference product": ["a", "b", "c", "d"],
+            "from location": ["GLO"] * 4,
+            "from categories": [np.nan, np.nan, ("air",), np.nan],
+            "from database": ["db", "db", "bio", "db"],
+            "from key": [("db", "a"), ("db", "b"), ("bio", "c"), ("db", "d")],
+            "to activity name": ["e"] * 4,
+            "to reference product": ["e"] * 4,
+            "to location": ["GLO"] * 4,
+            "to categories": [np.nan] * 4,
+            "to database": ["db"] * 4,
+            "to key": [("db", "e")] * 4,
+            "flow type": ["technosphere", "production", "biosphere", "technosphere"],
+        }
+    )
+    df["scenario 1"] = [1.0, 2.0, 3.0, 4.0]
+    df["scenario 2"] = [0.5, 1.5, np.nan, -4.0]
+    return df
+
+
+def test_validate():
+    """The report holds exactly the problems the separate checks found."""
+    df = validation_frame()
+    df["from key"] = [str(k) for k in df["from key"]]
+    df["to key"] = [str(k) for k in df["to key"]]
+    df.loc[0, "from database"] = "other"
+    df.loc[1, "scenario 2"] = 0.0
+    df.loc[3, "flow type"] = np.nan
+    df["scenario 3"] = ["1", "#DIV/0!", "x", "2"]
+    scenarios = ["scenario 1", "scenario 2", "scenario 3"]
+
+    report = ABFileImporter.validate(df, scenario_names=scenarios)
+    found = set(zip(report["from activity name"], report["column"], report["issue"]))
+
+    expected = set()
+    for i, row in df.iterrows():
+        name = row["from activity name"]
+        for side in ("from", "to"):
+            if row[f"{side} database"] != row[f"{side} key"].split(",")[0][2:-1]:
+                expected.add((name, f"{side} key", "database mismatch"))
+        for field in list(ABFileImporter.ABScenarioColumnsErrorIfNA) + scenarios:
+            if pd.isna(row[field]):
+                expected.add((name, field, "missing value"))
+        for scenario in scenarios:
+            value = row[scenario]
+            if row["flow type"] == "production" and value == 0:
+                expected.add((name, scenario, "zero production"))
+            if value in ("#DIV/0!", "#VALUE!"):
+                expected.add((name, scenario, "calculation error"))
+            elif isinstance(value, str) and pd.isna(pd.to_numeric(value, "coerce")):
+                expected.add((name, scenario, "non-numeric value"))
+    assert found == expected
+    assert len(report) == len(expected)
+
+    with pytest.raises(IncompatibleDatabaseNamingError):
+        ABFileImporter.raise_for_issues(report)
+    with pytest.raises(ActivityProductionValueError):
+        ABFileImporter.production_process_check(df, scenarios)
+    valid = validation_frame().dropna(subset=scenarios[:2])
+    assert ABFileImporter.validate(valid).empty
+
+
+def test_value_issue_rows():
+    """The rows with value issues are found by position, so duplicate index
+    labels do not flag the valid rows sharing a label.
+    """
+    df = validation_frame().set_index(pd.Index([0, 0, 1, 1]))
+    df["scenario 3"] = ["1", "#DIV/0!", "2", "x"]
+    scenarios = ["scenario 1", "scenario 3"]
+    rows = ABFileImporter.value_issue_rows(df, scenarios)
+    assert rows.tolist() == [False, True, False, True]
+    assert len(ABFileImporter.value_issues(df, scenarios)) == 2
+    assert not ABFileImporter.value_issue_rows(df, ["scenario 1"]).any()
+
+
+def test_issue_report_missing_names():
+    """Activity names that are not in the data are reported as missing."""
+    df = validation_frame().drop(columns="to activity name")
+    report = ABFileImporter.production_issues(df, ["scenario 1"])
+    assert report.empty
+    df.loc[1, "scenario 1"] = 0.0
+    report = ABFileImporter.production_issues(df, ["scenario 1"])
+    assert report["from activity name"].tolist() == ["b"]
+    assert report["to activity name"].isna().all()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from bw2analyzer import ContributionAnalysis
+
+from activity_browser.bwutils.multilca import top_contributions
+
+
+@pytest.mark.parametrize(
+    "limit, limit_type", [(5, "number"), (50, "number"), (0.05, "percent")]
+)
+def test_top_contributions(limit, limit_type):
+    """The selection matches `ContributionAnalysis.sort_array` per row."""
+    rng = np.random.default_rng(3)
+    # distinct absolute values, so `sort_array` has no ties to order
+    contributions = rng.permutation(np.arange(1, 241)).reshape(4, 3, 20) / 7
+    contributions *= rng.choice([-1, 1], size=contributions.shape)
+
+    indices, selected = top_contributions(contributions, limit, limit_type)
+    for idx in np.ndindex(contributions.shape[:-1]):
+        expected = ContributionAnalysis().sort_array(
+            contributions[idx], limit=limit, limit_type=limit_type
+        )
+        chosen = indices[idx][selected[idx]]
+        assert np.array_equal(chosen, expected[:, 1].astype(int))
+        assert np.array_equal(contributions[idx][chosen], expected[:, 0])
+
+
+@pytest.mark.parametrize(
+    "limit, limit_type, expected",
+    [
+        (3, "number", [3, 5, 1]),
+        (5, "number", [3, 5, 1, 0, 7]),
+        (8, "number", [3, 5, 1, 0, 7, 6, 4, 2]),
+        (0.1, "percent", [3, 5, 1, 0]),
+    ],
+)
+def test_top_contributions_ties(limit, limit_type, expected):
+    """Equal contributions are ordered from the highest to the lowest index,
+    like a stable sort of `sort_array` would.
+    """
+    contributions = np.array([1.0, -1.0, 0.0, 2.0, 0.0, 1.0, 0.5, 0.5])
+    indices, selected = top_contributions(
+        np.tile(contributions, (2, 1)), limit, limit_type
+    )
+    for row in range(2):
+        assert indices[row][selected[row]].tolist() == expected
+
+
+def test_top_contributions_invalid():
+    with pytest.raises(ValueError):
+        top_contributions(np.ones((2, 3)), 2, "percent")
+    with pytest.raises(ValueError):
+        top_contributions(np.ones((2, 3)), 2, "unknown")
@@ -38,6 +38,8 @@ def test_ab_default_keys(ab_settings):
         "current_bw_dir",
         "custom_bw_dirs",
         "startup_project",
+        "cache_results",
+        "scenario_workers",
     }.symmetric_difference(defaults)
 
 
@@ -52,6 +54,20 @@ def test_ab_edit_settings(ab_settings):
     assert ab_settings.custom_bw_dir != ABSettings.get_default_directory()
 
 
+def test_ab_cache_results(ab_settings):
+    """Results are stored by default, storing can be turned off."""
+    assert ab_settings.cache_results
+    ab_settings.cache_results = False
+    assert not ab_settings.cache_results
+
+
+def test_ab_scenario_workers(ab_settings):
+    """Scenarios are calculated in the app process by default."""
+    assert ab_settings.scenario_workers == 1
+    ab_settings.scenario_workers = 4
+    assert ab_settings.scenario_workers == 4
+
+
 def test_ab_unknown_startup(ab_settings):
     """Alter the startup project with an unknown project, assert that it
     was not altered because the project does not exist.
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from stats_arrays.errors import InvalidParamsError
+
+from activity_browser.layouts.tabs.LCA_results_tabs import MonteCarloThread
+
+
+class RecordingMonteCarlo(object):
+    """Stands in for a `MonteCarloLCA`, records how it is calculated."""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.kwargs = None
+        self.thread = None
+
+    def calculate(self, **kwargs):
+        self.kwargs = kwargs
+        self.thread = threading.get_ident()
+        if self.error is not None:
+            raise self.error
+
+
+def test_monte_carlo_thread(qtbot):
+    """The simulation runs outside of the GUI thread."""
+    mc = RecordingMonteCarlo()
+    thread = MonteCarloThread(mc, iterations=10, seed=3, workers=2)
+    assert thread in MonteCarloThread.running
+    with qtbot.waitSignal(thread.completed):
+        thread.start()
+    assert thread.wait(5000)
+    assert mc.kwargs == {"iterations": 10, "seed": 3, "workers": 2}
+    assert mc.thread != threading.get_ident()
+    qtbot.waitUntil(lambda: thread not in MonteCarloThread.running)
+
+
+def test_monte_carlo_thread_failed(qtbot):
+    """Broken uncertainty data is reported instead of completing."""
+    thread = MonteCarloThread(RecordingMonteCarlo(InvalidParamsError("broken")))
+    completed = []
+    thread.completed.connect(lambda: completed.append(True))
+    with qtbot.waitSignal(thread.failed) as blocker:
+        thread.start()
+    assert thread.wait(5000)
+    assert blocker.args == ["broken"] and not completed
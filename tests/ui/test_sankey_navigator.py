@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from activity_browser.ui.web.sankey_navigator import (
+    Graph,
+    ProgressiveGraphTraversal,
+    SankeyCache,
+    SankeyTraversalThread,
+    TraversalCancelled,
+)
+
+
+def fake_traversal(monkeypatch, size: int, delay: float = 0.0) -> list:
+    """Replace the graph traversal by one over a graph of `size` nodes that
+    solves the LCA object once per node, returns the `max_calc` of every
+    traversal.
+    """
+    calls = []
+
+    def calculate(cls, lca_object, max_calc, **kwargs):
+        calls.append(max_calc)
+        count = 0
+        while count < min(size, max_calc):
+            lca_object.solve_linear_system()
+            count += 1
+            time.sleep(delay)
+        return {
+            "nodes": {i: i for i in range(count)},
+            "edges": [],
+            "flows": [],
+            "calculation_count": count,
+        }
+
+    monkeypatch.setattr(ProgressiveGraphTraversal, "calculate", classmethod(calculate))
+    monkeypatch.setattr(Graph, "get_json_data", staticmethod(lambda data: "{}"))
+    return calls
+
+
+class CountingLCA(object):
+    """Counts the solves of the traversal."""
+
+    score = 1.0
+
+    def __init__(self):
+        self.solves = 0
+
+    def solve_linear_system(self):
+        self.solves += 1
+
+
+def test_sankey_cache():
+    """The least recently used graphs are dropped beyond the limits."""
+    cache = SankeyCache(maxsize=3, maxchars=10)
+    for key in "abc":
+        cache.put(key, {"json": "xx"})
+    assert cache.get("a") == {"json": "xx"}
+    cache.put("d", {"json": "xx"})
+    assert "b" not in cache and len(cache) == 3
+
+    cache.put("a", {"json": "xxxxxx"})
+    assert cache.chars == 10 and len(cache) == 3
+    cache.put("e", {"json": "x"})
+    assert "c" not in cache and cache.chars == 9
+
+    # a single graph is kept, however large
+    cache.put("f", {"json": "x" * 20})
+    assert len(cache) == 1 and cache.get("f") is not None
+    assert cache.get("a") is None
+    cache.clear()
+    assert len(cache) == 0 and cache.chars == 0
+
+
+@pytest.mark.parametrize(
+    "size, max_calc, expected",
+    [
+        (1000, 100, [100]),
+        (1000, 500, [ProgressiveGraphTraversal.PREVIEW, 500]),
+        (10, 500, [ProgressiveGraphTraversal.PREVIEW]),
+    ],
+)
+def test_progressive_traversal(monkeypatch, size, max_calc, expected):
+    """Only large traversals are previewed, and only once."""
+    calls = fake_traversal(monkeypatch, size)
+    previews = []
+    data = ProgressiveGraphTraversal.calculate_observed(
+        CountingLCA(),
+        lambda nodes, edges, flows: previews.append(len(nodes)) or True,
+        max_calc=max_calc,
+    )
+    assert calls == expected
+    assert previews == [expected[0]] * (len(expected) - 1)
+    assert data["calculation_count"] == min(size, max_calc)
+
+
+def test_progressive_traversal_cancel(monkeypatch):
+    fake_traversal(monkeypatch, 1000)
+    with pytest.raises(TraversalCancelled):
+        ProgressiveGraphTraversal.calculate_observed(
+            CountingLCA(), lambda nodes, edges, flows: False, max_calc=500
+        )
+
+
+def test_traversal_thread(qtbot, monkeypatch):
+    fake_traversal(monkeypatch, 20)
+    lca = CountingLCA()
+    thread = SankeyTraversalThread([("key", lambda: lca, "kg")], 0.05, 100)
+    with qtbot.waitSignal(thread.completed) as blocker:
+        thread.start()
+    key, _, metadata = blocker.args
+    assert key == "key" and metadata["calculation_count"] == 20
+    assert thread.wait(5000)
+    assert lca.solves == 20
+    # the interruption check is removed from the LCA object
+    assert "solve_linear_system" not in vars(lca)
+
+
+def test_traversal_thread_cancel(qtbot, monkeypatch):
+    """A cancelled traversal stops at its next calculation."""
+    fake_traversal(monkeypatch, 10_000, delay=0.001)
+    lca = CountingLCA()
+    thread = SankeyTraversalThread([("key", lambda: lca, "kg")], 0.05, 1000)
+    completed = []
+    thread.completed.connect(lambda *args: completed.append(args))
+    thread.start()
+    qtbot.waitUntil(lambda: lca.solves > 5)
+    thread.requestInterruption()
+    assert thread.wait(5000)
+    assert not completed
+    assert lca.solves < 200